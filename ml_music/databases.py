@@ -0,0 +1,79 @@
+"""
+Database profiles of ml_music project.
+
+`sqlite` tunes SQLite for concurrent requests: WAL lets readers run next
+to the writer, synchronous=NORMAL only syncs at checkpoints (still safe
+against corruption in WAL mode), IMMEDIATE transactions take the write
+lock up front, so writers wait in the busy timeout instead of failing
+with "database is locked", and mmap/cache sizes keep hot pages in memory.
+
+`postgresql` keeps connections open between requests and checks them
+before reuse; it needs the `psycopg` package.
+"""
+
+import os
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -32000,  # KiB
+    'temp_store': 'MEMORY',
+}
+SQLITE_TIMEOUT = 20  # seconds a writer waits for the lock
+CONN_MAX_AGE = 600  # seconds
+
+
+def sqlite_default(path):
+    """SQLite with default journaling, as in development settings"""
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': path,
+    }
+
+
+def sqlite(path, conn_max_age=CONN_MAX_AGE):
+    """SQLite tuned for concurrent requests"""
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': path,
+        'CONN_MAX_AGE': conn_max_age,
+        'OPTIONS': {
+            'init_command': ';'.join(f'PRAGMA {name}={value}'
+                                     for name, value in SQLITE_PRAGMAS.items()),
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': SQLITE_TIMEOUT,
+        },
+    }
+
+
+def postgresql(name, user='', password='', host='', port='', conn_max_age=CONN_MAX_AGE): # pylint: disable=R0913,R0917
+    """PostgreSQL with persistent connections"""
+    return {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': name,
+        'USER': user,
+        'PASSWORD': password,
+        'HOST': host,
+        'PORT': port,
+        'CONN_MAX_AGE': conn_max_age,
+        'CONN_HEALTH_CHECKS': True,
+    }
+
+
+def postgresql_from_environment():
+    """PostgreSQL profile of POSTGRES_* environment variables"""
+    return postgresql(
+        os.environ.get('POSTGRES_DB', 'ml_music'),
+        os.environ.get('POSTGRES_USER', ''),
+        os.environ.get('POSTGRES_PASSWORD', ''),
+        os.environ.get('POSTGRES_HOST', ''),
+        os.environ.get('POSTGRES_PORT', ''),
+    )
+
+
+def from_environment(base_dir):
+    """Profile chosen by ML_MUSIC_DATABASE: 'sqlite' (SQLITE_PATH) or 'postgresql'"""
+    if os.environ.get('ML_MUSIC_DATABASE', 'sqlite') == 'postgresql':
+        return postgresql_from_environment()
+    return sqlite(os.environ.get('SQLITE_PATH', base_dir / 'db.sqlite3'))
@@ -134,6 +134,126 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
 
+# uploads are named by content hash and deduplicated, see player/storage.py
+STORAGES = {
+    'default': {'BACKEND': 'player.storage.ContentAddressedStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+# Track streaming
+# Set to 'X-Accel-Redirect' (nginx) or 'X-Sendfile' (Apache, lighttpd) to let the
+# front web server deliver mp3 files; None streams them from Django itself.
+TRACK_STREAM_ACCEL_HEADER = None
+# nginx internal location mapped to MEDIA_ROOT, used with X-Accel-Redirect
+TRACK_STREAM_ACCEL_PREFIX = '/protected-media/'
+TRACK_STREAM_CHUNK_SIZE = 64 * 1024
+
+# Track duration
+# Read mp3 durations in a background task instead of during Track.save();
+# needs `manage.py run_workers`, otherwise durations stay 0
+TRACK_DURATION_IN_BACKGROUND = False
+
+# Track waveform and loudness analysis
+# Analyse new mp3 files in a background task; needs `manage.py run_workers`.
+# When disabled, tracks are analysed by `manage.py analyse_tracks`
+TRACK_ANALYSIS_ON_UPLOAD = False
+TRACK_WAVEFORM_POINTS = 800
+TRACK_LOUDNESS_TARGET = -14.0  # LUFS
+TRACK_WAVEFORM_MAX_AGE = 86400  # seconds, clients revalidate with ETag afterwards
+
+# Background tasks, run by `manage.py run_workers`
+TASK_MAX_ATTEMPTS = 5
+TASK_RETRY_DELAY = 30  # seconds, doubled after every failed attempt
+TASK_VISIBILITY_TIMEOUT = 300  # seconds before a claimed task is given to another worker
+TASK_BATCH_SIZE = 10
+TASK_POLL_INTERVAL = 1  # seconds
+
+# Email outbox, see user_manager/outbox.py
+OUTBOX_BATCH_SIZE = 50  # emails sent over one SMTP connection
+OUTBOX_FLUSH_DELAY = 2  # seconds to collect more emails before a send
+OUTBOX_MAX_ATTEMPTS = 6
+OUTBOX_RETRY_DELAY = 60  # seconds, doubled after every failed attempt
+OUTBOX_LOCK_TIMEOUT = 300  # seconds before emails of a crashed sender are claimed again
+
+# Play counts
+# Plays are buffered per process and written in one batch when either limit is hit
+PLAY_COUNT_FLUSH_SIZE = 500
+PLAY_COUNT_FLUSH_INTERVAL = 5  # seconds
+# Batches which failed to be written wait here for `manage.py flush_play_counts`
+PLAY_COUNT_SPOOL_DIR = BASE_DIR / 'var' / 'play_counts'
+
+# Trending charts, see player/charts.py
+CHART_HALF_LIFE = 7 * 24 * 3600  # seconds after which a play counts half
+CHART_SIZE = 50
+CHART_SIDE_SIZE = 10  # top artists and genres next to the global chart
+CHART_REBASE_HALF_LIVES = 256  # move the epoch before weights overflow
+CHART_PRUNE_SCORE = 1e-3  # rows decayed below this many plays are dropped on rebase
+
+# Home page
+HOME_FEED_TRACKS_PER_GENRE = 8
+HOME_FEED_ALBUMS = 20
+HOME_FEED_CACHE_TIMEOUT = 600  # seconds
+
+# Image thumbnails: size name -> bounding square in pixels
+THUMBNAIL_SIZES = {
+    'icon': 80,
+    'admin': 100,
+    'card': 300,
+    'cover': 600,
+}
+THUMBNAIL_FORMAT = 'WEBP'  # or 'JPEG' for clients without WebP support
+THUMBNAIL_QUALITY = 80
+
+# Playlist sidebar
+PLAYLIST_SIDEBAR_CACHE_TIMEOUT = 600  # seconds
+
+# Play queue
+PLAY_QUEUE_PAGE_SIZE = 100
+PLAY_QUEUE_MAX_PAGE_SIZE = 500
+
+# Playlist track order, see player/playlist_tracks.py
+PLAYLIST_POSITION_GAP = 1024  # between positions of appended tracks
+PLAYLIST_EDIT_MAX_TRACKS = 1000  # tracks in one append/insert/remove/move request
+
+# Playlist form pickers
+AUTOCOMPLETE_PAGE_SIZE = 20
+AUTOCOMPLETE_MAX_PAGE_SIZE = 50
+
+# Similar tracks, see player/similarity.py
+SIMILARITY_INDEX_DIR = BASE_DIR / 'var' / 'similarity'
+SIMILARITY_DIMENSIONS = 256
+SIMILARITY_WEIGHTS = {  # of feature groups in track vectors
+    'genre': 1.0,
+    'artist': 2.0,
+    'album': 1.5,
+    'playlist': 1.5,
+    'audio': 0.3,
+}
+SIMILARITY_BATCH_SIZE = 2000  # tracks vectorised at once
+SIMILARITY_OVERFETCH = 3  # candidates per result, unpublished ones are dropped
+SIMILARITY_PAGE_SIZE = 10
+SIMILARITY_MAX_PAGE_SIZE = 50
+
+# Recommended tracks, see player/recommender.py, trained by `manage.py train_recommender`
+RECOMMENDER_DIR = BASE_DIR / 'var' / 'recommender'
+RECOMMENDER_WEIGHTS = {  # strength of an interaction with a track of a playlist
+    'owner': 1.0,
+    'added_user': 0.5,
+}
+RECOMMENDER_FACTORS = 32
+RECOMMENDER_ITERATIONS = 15
+RECOMMENDER_REGULARIZATION = 0.05
+RECOMMENDER_ALPHA = 20.0  # confidence = 1 + alpha * strength
+RECOMMENDER_CG_STEPS = 3  # conjugate gradient steps per half-iteration
+RECOMMENDER_CHUNK_SIZE = 50000  # interactions solved at once
+RECOMMENDER_SHELF_SIZE = 12
+RECOMMENDER_OVERFETCH = 1.5  # candidates per shelf track, unpublished ones are dropped
+RECOMMENDER_CACHE_TIMEOUT = 3600  # seconds
+
+# Search
+# Maximum number of ranked tracks returned by the search index
+SEARCH_RESULTS_LIMIT = 500
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -0,0 +1,27 @@
+"""
+Production settings for ml_music project.
+
+Use with DJANGO_SETTINGS_MODULE=ml_music.settings_production. The database
+profile is chosen by environment variables, see ml_music/databases.py.
+"""
+import os
+
+from .settings import *  # pylint: disable=W0401,W0614
+from . import databases
+
+DEBUG = False
+
+DATABASES = {
+    'default': databases.from_environment(BASE_DIR),
+}
+
+# Cache shared by all worker processes. The home feed, playlist sidebars,
+# recommendation shelves and thumbnail urls are invalidated by signal handlers
+# of the process which made the change, so a per-process cache would keep
+# serving stale entries in the other workers.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_DIR', str(BASE_DIR / 'var' / 'cache')),
+    }
+}
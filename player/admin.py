@@ -3,7 +3,8 @@
 from django.contrib import admin
 from django.utils.safestring import mark_safe
 
-from .models import Artist, Genre, Track, Album, Playlist
+from . import thumbnails
+from .models import Artist, Genre, Track, Album, Playlist, PlaylistTrack
 
 #rename admin-panel
 admin.site.site_header = "ML Music admin-panel"
@@ -27,7 +28,8 @@ class TrackAdmin(admin.ModelAdmin):
     def track_logo(self, track: Track):
         """Display for viewing track logo"""
         if track.logo:
-            return mark_safe(f"<img src='{track.logo.url}' width='50px' />")
+            url = thumbnails.thumbnail_url(track.logo, 'admin')
+            return mark_safe(f"<img src='{url}' width='50px' />")
         return mark_safe("")
 
     @admin.action(description="Make published status")
@@ -64,7 +66,8 @@ class ArtistAdmin(admin.ModelAdmin):
     def artist_logo(self, artist: Artist):
         """Display for viewing artist logo"""
         if artist.logo:
-            return mark_safe(f"<img src='{artist.logo.url}' width='50px' />")
+            url = thumbnails.thumbnail_url(artist.logo, 'admin')
+            return mark_safe(f"<img src='{url}' width='50px' />")
         return mark_safe("")
 
     @admin.action(description="Make confirmed status")
@@ -96,7 +99,8 @@ class AlbumAdmin(admin.ModelAdmin):
     def album_logo(self, album: Album):
         """Display for viewing album logo"""
         if album.logo:
-            return mark_safe(f"<img src='{album.logo.url}' width='50px' />")
+            url = thumbnails.thumbnail_url(album.logo, 'admin')
+            return mark_safe(f"<img src='{url}' width='50px' />")
         return mark_safe("")
 
     @admin.action(description="Make published status")
@@ -109,9 +113,16 @@ class AlbumAdmin(admin.ModelAdmin):
         """Action for setting unpublished status in admin panel"""
         queryset.update(is_published=Album.Status.UNRELEASED)
 
+class PlaylistTrackInline(admin.TabularInline):
+    """Ordered tracks of playlist in admin panel"""
+    model = PlaylistTrack
+    raw_id_fields = ['track']
+    ordering = ['position', 'id']
+    extra = 0
+
 class PlaylistAdmin(admin.ModelAdmin):
     """class for changing viewing of playlist in admin panel"""
-    filter_horizontal = ['tracks']
+    inlines = [PlaylistTrackInline]
     list_display = ('playlist_logo','id', 'name', 'owner', 'time_created', 'is_public')
     list_display_links = ('playlist_logo', 'id', 'name')
     list_filter = ('is_public', 'owner__username')
@@ -126,7 +137,8 @@ class PlaylistAdmin(admin.ModelAdmin):
     def playlist_logo(self, playlist: Playlist):
         """Display for viewing playlist logo"""
         if playlist.logo:
-            return mark_safe(f"<img src='{playlist.logo.url}' width='50px' />")
+            url = thumbnails.thumbnail_url(playlist.logo, 'admin')
+            return mark_safe(f"<img src='{url}' width='50px' />")
         return mark_safe("")
 
     @admin.action(description="Make published status")
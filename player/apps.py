@@ -7,3 +7,7 @@ class PlayerConfig(AppConfig):
 
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'player'
+
+    def ready(self):
+        """Connecting signal handlers"""
+        from . import signals  # pylint: disable=C0415,W0611
@@ -0,0 +1,69 @@
+"""Module with denormalised artist -> tracks membership
+
+`ArtistTrack` holds one row per (artist, track, role) for the main author
+and every featured author, so "all tracks of an artist" is a single lookup
+on the unique (artist, track, role) index instead of an OR over the
+`featured_authors` join followed by DISTINCT. Rows are rebuilt per track by
+signal handlers and by `bulk_create` callers, which send no signals.
+"""
+from django.db import transaction
+
+from .models import ArtistTrack, Track
+
+
+def memberships(track_ids):
+    """Unsaved ArtistTrack rows of tracks according to their current authors"""
+    rows = [
+        ArtistTrack(artist_id=artist_id, track_id=track_id, role=ArtistTrack.Role.MAIN)
+        for track_id, artist_id in Track.objects.filter(id__in=track_ids)
+        .values_list('id', 'main_author_id')
+    ]
+    rows += [
+        ArtistTrack(artist_id=artist_id, track_id=track_id, role=ArtistTrack.Role.FEATURED)
+        for track_id, artist_id in Track.featured_authors.through.objects # pylint: disable=E1101
+        .filter(track_id__in=track_ids).values_list('track_id', 'artist_id')
+    ]
+    return rows
+
+
+def sync_track_ids(track_ids):
+    """Rebuild membership rows of tracks"""
+    track_ids = list(track_ids)
+    if not track_ids:
+        return
+    with transaction.atomic():
+        ArtistTrack.objects.filter(track_id__in=track_ids).delete()
+        ArtistTrack.objects.bulk_create(memberships(track_ids), ignore_conflicts=True)
+
+
+def rebuild(chunk_size=2000):
+    """Rebuild membership of every track, returns the number of tracks"""
+    count = 0
+    with transaction.atomic():
+        ArtistTrack.objects.all().delete()
+        track_ids = Track.objects.order_by('id').values_list('id', flat=True)
+        chunk = []
+        for track_id in track_ids.iterator(chunk_size=chunk_size):
+            chunk.append(track_id)
+            if len(chunk) >= chunk_size:
+                ArtistTrack.objects.bulk_create(memberships(chunk), ignore_conflicts=True)
+                count += len(chunk)
+                chunk = []
+        if chunk:
+            ArtistTrack.objects.bulk_create(memberships(chunk), ignore_conflicts=True)
+            count += len(chunk)
+    return count
+
+
+def track_ids_of(artist, role=None):
+    """Subquery of ids of tracks where artist is an author (in role, if given)"""
+    links = ArtistTrack.objects.filter(artist=artist)
+    if role is not None:
+        links = links.filter(role=role)
+    return links.values('track_id')
+
+
+def tracks_of(artist, queryset=None):
+    """Tracks of artist as main or featured author, without duplicates"""
+    queryset = Track.published.all() if queryset is None else queryset
+    return queryset.filter(id__in=track_ids_of(artist))
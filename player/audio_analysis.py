@@ -0,0 +1,197 @@
+"""Module with waveform and loudness analysis of track audio
+
+Analysis produces a fixed number of peak values (uint8, 0..255) for drawing
+a waveform and an integrated loudness in LUFS with the replay gain needed
+to reach TRACK_LOUDNESS_TARGET.
+
+When an `ffmpeg` binary is available the mp3 is decoded to mono PCM once
+and measured exactly (gated loudness as in EBU R128, without K-weighting).
+Otherwise the mp3 frames are parsed in pure Python: every Layer III
+granule carries a `global_gain` (quantizer step, 1.5 dB per unit), which is
+used as an estimate of the signal level without decoding. Such estimates
+give the waveform shape and a relative loudness only. The method is stored
+with the result, so estimates can be recomputed once a decoder is present.
+
+The functions work on file paths, return plain values and do not need
+Django, so the backfill and the track import can run them in a process pool.
+"""
+import shutil
+import subprocess
+
+import numpy as np
+from mutagen.mp3 import MP3
+
+PCM_RATE = 11025
+BLOCK_SECONDS = 0.4  # loudness gating block
+ABSOLUTE_GATE = -70.0  # LUFS
+RELATIVE_GATE = -10.0  # LU below the ungated loudness
+GRANULE_SAMPLES = 576
+
+METHOD_PCM = 'pcm'
+METHOD_FRAMES = 'frames'
+
+BITRATES = {  # kbit/s by bitrate index, Layer III
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+SAMPLE_RATES = {
+    1: [44100, 48000, 32000],
+    2: [22050, 24000, 16000],
+    2.5: [11025, 12000, 8000],
+}
+VERSIONS = {0b11: 1, 0b10: 2, 0b00: 2.5}
+
+
+def read_mp3_duration(mp3_path):
+    """Duration of mp3 file in whole seconds"""
+    return int(MP3(mp3_path).info.length)
+
+
+def skip_id3(data):
+    """Offset of audio after a leading ID3v2 tag"""
+    if data[:3] != b'ID3' or len(data) < 10:
+        return 0
+    size = 0
+    for byte in data[6:10]:
+        size = (size << 7) | (byte & 0x7f)
+    return 10 + size
+
+
+def read_bits(data, bit_offset, count):
+    """Unsigned integer of count bits starting at bit_offset"""
+    value = 0
+    for index in range(bit_offset, bit_offset + count):
+        value = (value << 1) | ((data[index >> 3] >> (7 - (index & 7))) & 1)
+    return value
+
+
+def parse_frame_header(data, offset):
+    """(frame length, version, channels, sample rate, side info offset) or None"""
+    if offset + 4 > len(data) or data[offset] != 0xff or data[offset + 1] & 0xe0 != 0xe0:
+        return None
+    header = int.from_bytes(data[offset:offset + 4], 'big')
+    version = VERSIONS.get((header >> 19) & 0b11)
+    layer = (header >> 17) & 0b11
+    bitrate_index = (header >> 12) & 0xf
+    rate_index = (header >> 10) & 0b11
+    if version is None or layer != 0b01 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+
+    bitrate = BITRATES[1 if version == 1 else 2][bitrate_index] * 1000
+    sample_rate = SAMPLE_RATES[version][rate_index]
+    padding = (header >> 9) & 1
+    channels = 1 if (header >> 6) & 0b11 == 0b11 else 2
+    has_crc = not (header >> 16) & 1
+    length = (144 if version == 1 else 72) * bitrate // sample_rate + padding
+    return length, version, channels, sample_rate, offset + 4 + (2 if has_crc else 0)
+
+
+def frame_gains(data):
+    """(array of global_gain per granule, sample rate) of Layer III frames"""
+    gains = []
+    sample_rate = None
+    offset = skip_id3(data)
+    while offset + 4 <= len(data):
+        frame = parse_frame_header(data, offset)
+        if frame is None:
+            offset += 1  # resynchronise
+            continue
+        length, version, channels, sample_rate, side_info = frame
+        if offset + length > len(data):
+            break
+
+        if version == 1:
+            base = 9 + (5 if channels == 1 else 3) + 4 * channels
+            granules, block = 2, 59
+        else:
+            base = 8 + (1 if channels == 1 else 2)
+            granules, block = 1, 63
+        for granule in range(granules):
+            # global_gain follows part2_3_length (12 bits) and big_values (9 bits)
+            offsets = [side_info * 8 + base + (granule * channels + channel) * block + 21
+                       for channel in range(channels)]
+            gains.append(max(read_bits(data, bit_offset, 8) for bit_offset in offsets))
+        offset += length
+    return np.array(gains, dtype=np.float64), sample_rate
+
+
+def block_powers(power, samples_per_value, block_seconds, sample_rate):
+    """Mean power of consecutive gating blocks"""
+    per_block = max(int(block_seconds * sample_rate / samples_per_value), 1)
+    count = len(power) // per_block
+    if count == 0:
+        return power.mean(keepdims=True) if len(power) else power
+    return power[:count * per_block].reshape(count, per_block).mean(axis=1)
+
+
+def integrated_loudness(blocks):
+    """Gated loudness in LUFS of block mean powers, None for silence"""
+    with np.errstate(divide='ignore'):
+        loudness = -0.691 + 10 * np.log10(blocks)
+    gated = blocks[loudness > ABSOLUTE_GATE]
+    if not gated.size:
+        return None
+    relative_gate = -0.691 + 10 * np.log10(gated.mean()) + RELATIVE_GATE
+    with np.errstate(divide='ignore'):
+        gated = gated[-0.691 + 10 * np.log10(gated) > relative_gate]
+    return float(-0.691 + 10 * np.log10(gated.mean()))
+
+
+def downsample_peaks(levels, points):
+    """uint8 bytes of maximal level (0..1) in points equal buckets"""
+    if not levels.size:
+        return b''
+    buckets = np.array_split(levels, min(points, len(levels)))
+    peaks = np.array([bucket.max() for bucket in buckets])
+    return np.clip(np.rint(peaks * 255), 0, 255).astype(np.uint8).tobytes()
+
+
+def decode_pcm(path, rate=PCM_RATE):
+    """Mono float samples in -1..1 decoded by ffmpeg, None without ffmpeg"""
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None:
+        return None
+    result = subprocess.run(
+        [ffmpeg, '-v', 'error', '-i', path, '-f', 's16le', '-ac', '1', '-ar', str(rate), '-'],
+        capture_output=True, check=True,
+    )
+    return np.frombuffer(result.stdout, dtype='<i2').astype(np.float32) / 32768
+
+
+def analyse_samples(samples, rate, points):
+    """Analysis of decoded mono samples"""
+    return {
+        'peaks': downsample_peaks(np.abs(samples), points),
+        'loudness': integrated_loudness(block_powers(samples.astype(np.float64) ** 2, 1,
+                                                     BLOCK_SECONDS, rate)),
+        'method': METHOD_PCM,
+    }
+
+
+def analyse_frames(data, points):
+    """Analysis estimated from global gains of mp3 frames"""
+    gains, sample_rate = frame_gains(data)
+    if not gains.size:
+        raise ValueError("No MPEG Layer III frames found")
+    # quantizer step relative to full scale, 2 ** (1/4) per unit of gain
+    levels = np.minimum(2 ** ((gains - 210) / 4), 1.0)
+    return {
+        'peaks': downsample_peaks(levels / levels.max(), points),
+        'loudness': integrated_loudness(block_powers(levels ** 2, GRANULE_SAMPLES,
+                                                     BLOCK_SECONDS, sample_rate)),
+        'method': METHOD_FRAMES,
+    }
+
+
+def analyse_file(path, points=800, use_decoder=True):
+    """{'peaks': bytes, 'loudness': float or None, 'method': str} of an mp3 file"""
+    samples = decode_pcm(path) if use_decoder else None
+    if samples is not None:
+        return analyse_samples(samples, PCM_RATE, points)
+    with open(path, 'rb') as file:
+        return analyse_frames(file.read(), points)
+
+
+def replay_gain(loudness, target):
+    """Gain in dB bringing loudness to target"""
+    return None if loudness is None else round(target - loudness, 2)
@@ -0,0 +1,47 @@
+"""Module with autocomplete results of the playlist form pickers
+
+Pickers of tracks and users load candidates page by page as JSON instead
+of rendering the whole catalogue into the form. Results are
+`{'id': ..., 'text': ...}` dicts; tracks are searched with the search
+index and users by username prefix, both paginated with cursors.
+"""
+from django.contrib.auth import get_user_model
+
+from . import search_index
+from .models import Track
+from .pagination import KeysetPaginator, SequencePaginator
+
+
+def result(obj):
+    """JSON-serializable picker option"""
+    return {'id': obj.pk, 'text': str(obj)}
+
+
+def track_results(query, cursor=None, limit=20):
+    """{'results': [...], 'next_cursor': ...} of tracks matching query, all tracks by id without it
+
+    Raises pagination.InvalidCursor.
+    """
+    tracks = Track.objects.select_related('main_author')
+    if not query:
+        page = KeysetPaginator(tracks, ('id',), limit).page(cursor)
+        return {'results': [result(track) for track in page], 'next_cursor': page.next_cursor}
+
+    page = SequencePaginator(search_index.search_track_ids(query), limit).page(cursor)
+    found = tracks.in_bulk(page.object_list)
+    return {
+        'results': [result(found[pk]) for pk in page if pk in found],
+        'next_cursor': page.next_cursor,
+    }
+
+
+def user_results(user, query, cursor=None, limit=20):
+    """{'results': [...], 'next_cursor': ...} of other users whose username starts with query
+
+    Raises pagination.InvalidCursor.
+    """
+    users = get_user_model().objects.exclude(pk=user.pk)
+    if query:
+        users = users.filter(username__istartswith=query)
+    page = KeysetPaginator(users, ('username',), limit).page(cursor)
+    return {'results': [result(other) for other in page], 'next_cursor': page.next_cursor}
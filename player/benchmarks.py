@@ -0,0 +1,214 @@
+"""Module with query-count and latency benchmarks of player views
+
+`seed_catalogue` fills the database with a synthetic catalogue and
+`run_benchmarks` requests every player and auth view through the test
+client, recording query count, total SQL time and p50/p95 latency. The
+report is a plain dict, so it can be dumped to JSON and diffed between
+releases; `check_budgets` compares it with the query budgets below.
+"""
+import math
+import random
+import statistics
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+
+from . import artist_tracks, search_index
+from .models import Album, Artist, Genre, Playlist, PlaylistTrack, Track
+
+BENCHMARK_PASSWORD = 'benchmark-password'
+
+# Maximal number of queries per request on a warm cache, for any catalogue size
+VIEW_BUDGETS = {
+    'home': 3,
+    'artist': 7,
+    'album': 7,
+    'playlist': 8,
+    'search': 5,
+    'login_page': 0,
+    'login_submit': 6,
+    'register_page': 0,
+}
+
+DEFAULT_SIZES = {
+    'artists': 50,
+    'tracks': 2000,
+    'albums': 100,
+    'playlists': 50,
+    'users': 20,
+}
+
+WORDS = ['night', 'ночь', 'river', 'город', 'light', 'весна', 'storm', 'море', 'dream', 'огонь']
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of values"""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+def seed_catalogue(sizes=None, seed=0, batch_size=2000):  # pylint: disable=R0914
+    """Bulk insert synthetic catalogue, returns dict of objects used by scenarios"""
+    sizes = {**DEFAULT_SIZES, **(sizes or {})}
+    rnd = random.Random(seed)
+    tag = f'{seed}-{rnd.randrange(10 ** 9)}'
+
+    genre = Genre.objects.create(name=f'Benchmark {tag}')
+    artists = Artist.objects.bulk_create(
+        Artist(name=' '.join(rnd.sample(WORDS, 2)), slug=f'benchmark-{tag}-{i}',
+               genre=genre, logo='artists/benchmark.jpg')
+        for i in range(max(sizes['artists'], 1))
+    )
+
+    tracks = []
+    while len(tracks) < sizes['tracks']:
+        count = min(batch_size, sizes['tracks'] - len(tracks))
+        tracks += Track.objects.bulk_create(
+            Track(name=' '.join(rnd.sample(WORDS, rnd.randint(1, 3))),
+                  main_author=rnd.choice(artists), genre=genre,
+                  logo='tracks_logo/benchmark.jpg', mp3='tracks/benchmark.mp3',
+                  duration=rnd.randint(60, 400), play_count=rnd.randint(0, 10_000))
+            for _ in range(count)
+        )
+    # bulk_create does not send post_save signals
+    artist_tracks.sync_track_ids(track.pk for track in tracks)
+    search_index.index_track_ids(track.pk for track in tracks)
+
+    albums = Album.objects.bulk_create(
+        Album(name=f'Album {i}', slug=f'benchmark-{tag}-{i}', main_author=rnd.choice(artists),
+              genre=genre, logo='playlists/benchmark.jpg')
+        for i in range(max(sizes['albums'], 1))
+    )
+    album_tracks = Album.tracks.through # pylint: disable=E1101
+    album_tracks.objects.bulk_create(
+        album_tracks(album_id=album.pk, track_id=track.pk)
+        for album in albums
+        for track in rnd.sample(tracks, min(12, len(tracks)))
+    )
+
+    user_model = get_user_model()
+    user = user_model.objects.create_user(username=f'benchmark-{tag}',
+                                          password=BENCHMARK_PASSWORD)
+    users = [user] + user_model.objects.bulk_create(
+        user_model(username=f'benchmark-{tag}-{i}') for i in range(sizes['users'] - 1)
+    )
+    playlists = Playlist.objects.bulk_create(
+        Playlist(name=f'Playlist {i}', slug=f'benchmark-{tag}-{i}',
+                 owner=users[i % len(users)], logo='playlists/benchmark.jpg')
+        for i in range(max(sizes['playlists'], 1))
+    )
+    PlaylistTrack.objects.bulk_create(
+        PlaylistTrack(playlist_id=playlist.pk, track_id=track.pk,
+                      position=(index + 1) * settings.PLAYLIST_POSITION_GAP)
+        for playlist in playlists
+        for index, track in enumerate(rnd.sample(tracks, min(30, len(tracks))))
+    )
+    added_users = Playlist.added_users.through # pylint: disable=E1101
+    added_users.objects.bulk_create(
+        added_users(playlist_id=playlist.pk, playeruser_id=user.pk)
+        for playlist in playlists[1::2]
+    )
+
+    return {
+        'user': user,
+        'artist': Artist.objects.get(pk=Counter(
+            track.main_author_id for track in tracks).most_common(1)[0][0]),
+        'album': albums[0],
+        'playlist': playlists[0],
+        'query': WORDS[0],
+    }
+
+
+def scenarios(catalogue):
+    """(name, method, url, data, logged in) of every benchmarked request"""
+    album = catalogue['album']
+    return [
+        ('home', 'get', reverse('main'), None, True),
+        ('artist', 'get', catalogue['artist'].get_absolute_url(), None, True),
+        ('album', 'get', reverse('show_album', kwargs={
+            'artist_slug': album.main_author.slug, 'album_slug': album.slug}), None, True),
+        ('playlist', 'get', catalogue['playlist'].get_absolute_url(), None, True),
+        ('search', 'get', reverse('search_tracks'), {'query': catalogue['query']}, True),
+        ('login_page', 'get', reverse('login'), None, False),
+        ('login_submit', 'post', reverse('login'), {
+            'username': catalogue['user'].username, 'password': BENCHMARK_PASSWORD}, False),
+        ('register_page', 'get', reverse('register'), None, False),
+    ]
+
+
+class QueryTimer: # pylint: disable=R0903
+    """Database execute wrapper counting queries and their total time"""
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.count += 1
+
+
+def measure(client, method, url, data=None, repeat=5):
+    """Query count, SQL time and latency of repeated request"""
+    latencies = []
+    sql_times = []
+    query_counts = []
+    status_code = None
+    for _ in range(repeat):
+        timer = QueryTimer()
+        with connection.execute_wrapper(timer):
+            start = time.perf_counter()
+            response = getattr(client, method)(url, data)
+            latencies.append((time.perf_counter() - start) * 1000)
+        status_code = response.status_code
+        query_counts.append(timer.count)
+        sql_times.append(timer.seconds * 1000)
+
+    return {
+        'status': status_code,
+        'queries': max(query_counts),
+        'sql_ms': round(statistics.median(sql_times), 3),
+        'p50_ms': round(percentile(latencies, 0.5), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+    }
+
+
+def run_benchmarks(catalogue, repeat=5, warmup=True):
+    """{view name: measurements} for all scenarios"""
+    report = {}
+    for name, method, url, data, logged_in in scenarios(catalogue):
+        client = Client()
+        if logged_in:
+            client.force_login(catalogue['user'])
+        if warmup:
+            # warm caches so budgets describe the steady state
+            getattr(client, method)(url, data)
+        report[name] = measure(client, method, url, data, repeat)
+    return report
+
+
+def check_budgets(report, budgets=None):
+    """Messages about views exceeding their query budget"""
+    budgets = VIEW_BUDGETS if budgets is None else budgets
+    return [
+        f"{name}: {result['queries']} queries, budget {budgets[name]}"
+        for name, result in report.items()
+        if name in budgets and result['queries'] > budgets[name]
+    ]
+
+
+def compare_reports(previous, current):
+    """{view name: {metric: (previous, current)}} of views present in both reports"""
+    return {
+        name: {metric: (previous[name].get(metric), value)
+               for metric, value in result.items() if metric != 'status'}
+        for name, result in current.items() if name in previous
+    }
@@ -0,0 +1,146 @@
+"""Module with trending charts of tracks, artists and genres
+
+Scores decay exponentially with CHART_HALF_LIFE, but stored scores never
+have to be decayed: they use forward decay. A play at time t adds
+2 ** ((t - epoch) / half-life) to the score, so newer plays weigh more,
+and the current score is the stored one times 2 ** (-(now - epoch) /
+half-life). That factor is the same for every row, so the order of stored
+scores is the order of current ones and a chart is an index range scan of
+`ChartScore` by score, with no recomputation from raw history.
+
+Plays arrive in the batches written by player/play_counts.py. Every batch
+is one time bucket: its plays are weighted at the time of the write,
+summed per track, main artist and genre, and added to the scores with one
+UPDATE per kind. When weights grow past 2 ** CHART_REBASE_HALF_LIVES, the
+epoch moves to the present; this is the only write to all rows, and it
+drops rows which decayed below CHART_PRUNE_SCORE.
+"""
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (
+    Case, Exists, F, FloatField, IntegerField, OuterRef, Subquery, Value, When
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Artist, ChartEpoch, ChartScore, Genre, Track
+
+UPDATE_BATCH_SIZE = 250  # objects per UPDATE ... CASE statement
+
+
+def half_lives(since, now):
+    """Number of half-lives between since and now"""
+    return (now - since).total_seconds() / settings.CHART_HALF_LIFE
+
+
+def locked_epoch(now):
+    """Epoch row locked until the end of the transaction, created at now"""
+    epoch = ChartEpoch.objects.select_for_update().order_by('pk').first()
+    if epoch is None:
+        epoch = ChartEpoch.objects.create(epoch=now)
+    return epoch
+
+
+def rebase(epoch, now):
+    """Move epoch to now, rescaling all scores and dropping decayed ones"""
+    factor = 2 ** -half_lives(epoch.epoch, now)
+    ChartScore.objects.update(score=F('score') * factor)
+    ChartScore.objects.filter(score__lt=settings.CHART_PRUNE_SCORE).delete()
+    epoch.epoch = now
+    epoch.save(update_fields=['epoch'])
+
+
+def add_scores(kind, increments, genres=None):
+    """Add {object id: increment} to scores of kind, creating missing rows"""
+    ids = list(increments)
+    for start in range(0, len(ids), UPDATE_BATCH_SIZE):
+        batch = ids[start:start + UPDATE_BATCH_SIZE]
+        ChartScore.objects.bulk_create(
+            [ChartScore(kind=kind, object_id=pk) for pk in batch], ignore_conflicts=True
+        )
+        changes = {'score': F('score') + Case(
+            *[When(object_id=pk, then=Value(increments[pk])) for pk in batch],
+            default=Value(0.0), output_field=FloatField(),
+        )}
+        if genres is not None:
+            # tracks may change genre, the latest one is kept
+            changes['genre_id'] = Case(
+                *[When(object_id=pk, then=Value(genres[pk])) for pk in batch],
+                default=F('genre_id'), output_field=IntegerField(),
+            )
+        ChartScore.objects.filter(kind=kind, object_id__in=batch).update(**changes)
+
+
+@transaction.atomic
+def record(counts, now=None):
+    """Add {track_id: plays} played at now to track, artist and genre scores"""
+    now = now or timezone.now()
+    epoch = locked_epoch(now)
+    if half_lives(epoch.epoch, now) > settings.CHART_REBASE_HALF_LIVES:
+        rebase(epoch, now)
+    weight = 2 ** half_lives(epoch.epoch, now)
+
+    increments = {kind: Counter() for kind in ChartScore.Kind}
+    genres = {}
+    for pk, artist_id, genre_id in (Track.objects.filter(pk__in=list(counts))
+                                    .values_list('id', 'main_author_id', 'genre_id')):
+        score = counts[pk] * weight
+        increments[ChartScore.Kind.TRACK][pk] += score
+        increments[ChartScore.Kind.ARTIST][artist_id] += score
+        increments[ChartScore.Kind.GENRE][genre_id] += score
+        genres[pk] = genre_id
+
+    for kind, kind_increments in increments.items():
+        add_scores(kind, kind_increments,
+                   genres if kind == ChartScore.Kind.TRACK else None)
+
+
+def current_factor(now=None):
+    """Factor turning stored scores into current ones, None before the first play"""
+    epoch = ChartEpoch.objects.order_by('pk').values_list('epoch', flat=True).first()
+    if epoch is None:
+        return None
+    return 2 ** -half_lives(epoch, now or timezone.now())
+
+
+def top(kind, limit=None, genre=None):
+    """[(object id, current score)] of the best scored objects of kind"""
+    factor = current_factor()
+    if factor is None:
+        return []
+    scores = ChartScore.objects.filter(kind=kind)
+    if kind == ChartScore.Kind.TRACK:
+        # checked per row while walking the score index, stops at the limit
+        scores = scores.filter(Exists(Track.published.filter(pk=OuterRef('object_id'))))
+        if genre is not None:
+            scores = scores.filter(genre=genre)
+    rows = scores.order_by('-score', 'object_id').values_list('object_id', 'score')
+    return [(pk, score * factor) for pk, score in rows[:limit or settings.CHART_SIZE]]
+
+
+def with_trend(tracks):
+    """Tracks annotated with `trend`, their stored chart score (0 without plays)"""
+    scores = ChartScore.objects.filter(kind=ChartScore.Kind.TRACK, object_id=OuterRef('id'))
+    return tracks.annotate(trend=Coalesce(Subquery(scores.values('score')[:1]), Value(0.0)))
+
+
+def top_track_ids(genre=None, limit=None):
+    """Ids of the best scored published tracks, of genre when given"""
+    return [pk for pk, _ in top(ChartScore.Kind.TRACK, limit, genre)]
+
+
+def chart(genre=None):
+    """Template data of the track chart (of genre) and of top artists and genres"""
+    track_ids = top_track_ids(genre)
+    tracks = (Track.objects.select_related('main_author', 'genre')
+              .prefetch_related('featured_authors').in_bulk(track_ids))
+    context = {'tracks': [tracks[pk] for pk in track_ids if pk in tracks]}
+    if genre is None:
+        for key, model, kind in (('artists', Artist, ChartScore.Kind.ARTIST),
+                                 ('genres', Genre, ChartScore.Kind.GENRE)):
+            ids = [pk for pk, _ in top(kind, settings.CHART_SIDE_SIZE)]
+            objects = model.objects.in_bulk(ids)
+            context[key] = [objects[pk] for pk in ids if pk in objects]
+    return context
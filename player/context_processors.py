@@ -1,19 +1,29 @@
 """Module with Context Processors"""
-from .models import Playlist
+from django.utils.functional import SimpleLazyObject
+
+from . import playlist_sidebar
+
+
+def get_sidebar(request):
+    """Cached playlist sidebar, computed once per request"""
+    if not hasattr(request, '_playlist_sidebar'):
+        request._playlist_sidebar = playlist_sidebar.get(request.user)  # pylint: disable=W0212
+    return request._playlist_sidebar  # pylint: disable=W0212
 
 def get_owned_playlists(request):
     """Function to get all playlists owned by current user"""
-    return Playlist.objects.filter(owner=request.user)
+    return get_sidebar(request)['owned_playlists']
 
 def get_added_playlists(request):
     """Function to get all playlists added by current user"""
-    return Playlist.objects.filter(added_users=request.user)
+    return get_sidebar(request)['added_playlists']
 
 def user_playlists(request):
     """Function to get all playlists with current user"""
     if request.user.is_authenticated:
+        # lazy, so pages without the sidebar do not touch the cache
         return {
-            "owned_playlists": get_owned_playlists(request),
-            "added_playlists": get_added_playlists(request),
+            "owned_playlists": SimpleLazyObject(lambda: get_owned_playlists(request)),
+            "added_playlists": SimpleLazyObject(lambda: get_added_playlists(request)),
         }
     return {}
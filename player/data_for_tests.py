@@ -1,5 +1,7 @@
 """ module with debug functions """
-from django.core.paginator import Paginator
+from django.db.models import QuerySet
+
+from .pagination import InvalidCursor, KeysetPaginator, SequencePaginator
 
 lowermenu_buttons = [
     {'name': 'Legal', 'url': 'legal'},
@@ -14,8 +16,17 @@ def get_title_by_infoslug(info_slug):
     """ При помощи url в словаре lower_buttons ищет name"""
     return next((item['name'] for item in lowermenu_buttons if item['url'] == info_slug), None)
 
-def get_page_obj(request, tracks):
-    """Getting tracks for player"""
-    paginator = Paginator(tracks, 1)
-    page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+def get_page_obj(request, tracks, ordering=('id',)):
+    """Getting track for player by cursor, without COUNT and OFFSET queries
+
+    Querysets are paginated by keyset over `ordering`, already ordered
+    sequences (ranked search results) by position.
+    """
+    if isinstance(tracks, QuerySet) and ordering:
+        paginator = KeysetPaginator(tracks, ordering, 1)
+    else:
+        paginator = SequencePaginator(tracks, 1)
+    try:
+        return paginator.page(request.GET.get('cursor'))
+    except InvalidCursor:
+        return paginator.page()
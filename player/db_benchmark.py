@@ -0,0 +1,137 @@
+"""Module with write throughput benchmark of database profiles
+
+Every writer thread opens its own connection and repeats what a request
+does to the session table: insert a new session, then update an existing
+one, each statement in its own transaction (autocommit). The table is a
+copy of `django_session` created and dropped by the benchmark, SQLite
+profiles run on temporary database files, so neither touches real data.
+
+Reported per profile: writes per second, p50/p95 latency of a write and
+errors such as "database is locked".
+"""
+import random
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.db.utils import load_backend
+from django.utils import timezone
+
+from ml_music import databases
+from .benchmarks import percentile
+
+TABLE = 'benchmark_session'
+ALIAS = 'write_benchmark'
+
+
+def sqlite_profiles(directory):
+    """Profiles to compare on temporary SQLite files"""
+    return {
+        'sqlite-default': databases.sqlite_default(f'{directory}/default.sqlite3'),
+        'sqlite-wal': databases.sqlite(f'{directory}/wal.sqlite3'),
+    }
+
+
+def connect(profile):
+    """New connection wrapper of profile, not registered in DATABASES"""
+    settings_dict = connections.configure_settings({
+        DEFAULT_DB_ALIAS: dict(connections.settings[DEFAULT_DB_ALIAS]),
+        ALIAS: dict(profile),
+    })[ALIAS]
+    return load_backend(settings_dict['ENGINE']).DatabaseWrapper(settings_dict, ALIAS)
+
+
+def create_table(connection):
+    """Session-like table of the benchmark"""
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+        cursor.execute(f'CREATE TABLE {TABLE} (session_key varchar(40) PRIMARY KEY, '
+                       'session_data text NOT NULL, expire_date timestamp NOT NULL)')
+        cursor.execute(f'CREATE INDEX {TABLE}_expire ON {TABLE} (expire_date)')
+
+
+def drop_table(connection):
+    """Remove table of the benchmark"""
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+def writer(profile, index, operations, barrier, latencies, errors):  # pylint: disable=R0913,R0914,R0917
+    """Thread body: insert and update sessions over its own connection"""
+    rnd = random.Random(index)
+    keys = []
+    connection = connect(profile)
+    try:
+        connection.ensure_connection()
+        barrier.wait()
+        for operation in range(operations):
+            key = f'{index:06d}-{operation:08d}'
+            expire = timezone.now() + timedelta(days=14)
+            statements = [(f'INSERT INTO {TABLE} VALUES (%s, %s, %s)',
+                           [key, 'x' * 200, expire])]
+            if keys:
+                statements.append((f'UPDATE {TABLE} SET session_data = %s, expire_date = %s '
+                                   'WHERE session_key = %s',
+                                   ['y' * 200, expire, rnd.choice(keys)]))
+            keys.append(key)
+            for sql, params in statements:
+                started = time.perf_counter()
+                try:
+                    with connection.cursor() as cursor:
+                        cursor.execute(sql, params)
+                except DatabaseError as exc:
+                    errors.append(str(exc))
+                else:
+                    latencies.append(time.perf_counter() - started)
+    finally:
+        connection.close()
+
+
+def run_profile(profile, writers, operations):
+    """Report of concurrent writers against profile"""
+    connection = connect(profile)
+    try:
+        create_table(connection)
+        latencies, errors = [], []
+        barrier = threading.Barrier(writers + 1)
+        threads = [threading.Thread(target=writer,
+                                    args=(profile, index, operations, barrier, latencies, errors))
+                   for index in range(writers)]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        seconds = time.perf_counter() - started
+        drop_table(connection)
+    finally:
+        connection.close()
+
+    return {
+        'writers': writers,
+        'writes': len(latencies),
+        'errors': len(errors),
+        'seconds': round(seconds, 3),
+        'writes_per_second': round(len(latencies) / seconds, 1) if seconds else 0,
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 2) if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2) if latencies else None,
+        'first_error': errors[0] if errors else None,
+    }
+
+
+def run_benchmark(profiles=None, writers=(1, 8, 32), operations=200):
+    """{profile name: [report per number of writers]}, SQLite profiles by default"""
+    directory = None
+    if profiles is None:
+        directory = tempfile.mkdtemp(prefix='ml_music_db_benchmark_')
+        profiles = sqlite_profiles(directory)
+    try:
+        return {name: [run_profile(profile, count, operations) for count in writers]
+                for name, profile in profiles.items()}
+    finally:
+        if directory:
+            shutil.rmtree(directory, ignore_errors=True)
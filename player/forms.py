@@ -1,14 +1,24 @@
 """Forms Module"""
 from django import forms
-from .models import Playlist, PlayerUser
+from . import playlist_tracks
+from .models import Playlist, PlayerUser, Track
+from .widgets import AutocompleteSelectMultiple
 
 
 class PlaylistForm(forms.ModelForm): # pylint: disable=R0903
     """Playlist Form"""
+    # not a model field of the form: positions are written by playlist_tracks
+    tracks = forms.ModelMultipleChoiceField(
+        queryset=Track.objects.select_related('main_author'), required=False,
+        widget=AutocompleteSelectMultiple('autocomplete_tracks', attrs={
+            'class': 'track-select-container',
+        }, placeholder='Поиск треков...'),
+    )
+
     class Meta: # pylint: disable=R0903
         """Meta Class"""
         model = Playlist
-        fields = ['name', 'logo', 'is_public', 'added_users', 'tracks']
+        fields = ['name', 'logo', 'is_public', 'added_users']
         widgets = {
             'name': forms.TextInput(attrs={
                 'class': 'spotify-input',
@@ -18,12 +28,10 @@ class PlaylistForm(forms.ModelForm): # pylint: disable=R0903
                 'accept': 'image/*',
                 'class': 'hidden-input'
             }),
-            'added_users': forms.SelectMultiple(attrs={
+            # only chosen ids are rendered, candidates come from JSON endpoints
+            'added_users': AutocompleteSelectMultiple('autocomplete_users', attrs={
                 'class': 'spotify-select'
-            }),
-            'tracks': forms.CheckboxSelectMultiple(attrs={
-                'class': 'track-select-container',
-            }),
+            }, placeholder='Поиск пользователей...'),
             'is_public': forms.CheckboxInput(attrs={
                 'class': 'toggle-checkbox',
             })
@@ -33,6 +41,8 @@ class PlaylistForm(forms.ModelForm): # pylint: disable=R0903
         user = kwargs.pop('user', None)
         super().__init__(*args, **kwargs)
         self.fields['logo'].required = False
+        if self.instance.pk:
+            self.initial['tracks'] = playlist_tracks.track_ids(self.instance)
         if user:
             self.fields['added_users'].queryset = PlayerUser.objects.exclude(id=user.id)
             self.instance.owner = user
@@ -49,8 +59,34 @@ class PlaylistForm(forms.ModelForm): # pylint: disable=R0903
                 raise forms.ValidationError("У вас уже есть плейлист с таким названияем")
         return name
 
+    def clean_tracks(self):
+        """Chosen tracks in the submitted order"""
+        chosen = {str(track.pk): track for track in self.cleaned_data['tracks']}
+        submitted = self.fields['tracks'].widget.value_from_datadict(
+            self.data, self.files, self.add_prefix('tracks')
+        )
+        return [chosen[pk] for pk in dict.fromkeys(map(str, submitted)) if pk in chosen]
+
     def clean(self):
         cleaned_data = super().clean()
         if not cleaned_data.get('tracks'):
             self.add_error('tracks', 'Выберите хотя бы один трек')
         return cleaned_data
+
+    def save(self, commit=True):
+        """Saving playlist with its tracks, kept tracks keep their positions"""
+        playlist = super().save(commit)
+        if commit:
+            self.save_tracks()
+        else:
+            save_m2m = self.save_m2m
+
+            def save_m2m_and_tracks():
+                save_m2m()
+                self.save_tracks()
+            self.save_m2m = save_m2m_and_tracks # pylint: disable=W0201
+        return playlist
+
+    def save_tracks(self):
+        """Saving tracks of the saved playlist in the submitted order"""
+        playlist_tracks.replace(self.instance, [track.pk for track in self.cleaned_data['tracks']])
@@ -0,0 +1,69 @@
+"""Module with generation-numbered NumPy arrays shared between processes
+
+The similarity index and the recommender model are stored as
+`<name>-<generation>.npy` files next to a `meta.json` naming the current
+generation. Writers create the files of a new generation and atomically
+replace `meta.json`; readers memory-map the files it names and reopen
+them when its mtime changes, so processes share the arrays through the
+page cache and never see a generation which is still being written.
+"""
+import json
+import os
+
+import numpy as np
+
+META_NAME = 'meta.json'
+
+_loaded = {}  # path of meta.json -> (mtime, loaded object)
+
+
+def read_meta(directory):
+    """meta.json in directory, None when there is none"""
+    try:
+        with open(os.path.join(directory, META_NAME), encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def write_meta(directory, meta):
+    """Atomically replace meta.json, readers pick the new generation up"""
+    path = os.path.join(directory, META_NAME)
+    with open(f'{path}.tmp', 'w', encoding='utf-8') as file:
+        json.dump(meta, file)
+    os.replace(f'{path}.tmp', path)
+
+
+def array_path(directory, name, generation):
+    """Path of array name of generation"""
+    return os.path.join(directory, f'{name}-{generation}.npy')
+
+
+def load_array(directory, name, generation, mode='r'):
+    """Memory-mapped array name of generation"""
+    return np.load(array_path(directory, name, generation), mmap_mode=mode)
+
+
+def remove_generations(directory, keep):
+    """Delete files of generations other than keep, open maps stay valid"""
+    for name in os.listdir(directory):
+        stem, _, extension = name.rpartition('.')
+        if extension == 'npy' and '-' in stem and stem.rsplit('-', 1)[1] != str(keep):
+            os.remove(os.path.join(directory, name))
+
+
+def load_current(directory, factory):
+    """factory(directory, meta) of the current generation, reused until meta.json
+    changes, None when there is no generation yet"""
+    path = os.path.join(directory, META_NAME)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    cached = _loaded.get(path)
+    if cached is None or cached[0] != mtime:
+        meta = read_meta(directory)
+        if meta is None:
+            return None
+        cached = _loaded[path] = (mtime, factory(directory, meta))
+    return cached[1]
@@ -0,0 +1,65 @@
+"""Module with cached home page feed
+
+The feed holds the latest albums and the top tracks of every genre, both
+bounded by settings. It is stored in the cache under a versioned key; the
+version is bumped by signal handlers whenever tracks, albums, artists or
+genres change, so stale feeds are never read again and expire on their own.
+The cache must be shared by all worker processes (see CACHES in
+ml_music/settings_production.py), otherwise only the process which handled
+the change sees the new version.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from .models import Album, Genre, Track
+
+VERSION_KEY = 'player:home_feed:version'
+
+
+def get_version():
+    """Current feed version"""
+    return cache.get_or_set(VERSION_KEY, 1, timeout=None)
+
+
+def invalidate():
+    """Make cached feeds unreachable"""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, timeout=None)
+
+
+def build():
+    """Query bounded feed: {'albums': [...], 'tracks_by_genre': {genre: [...]}}"""
+    top_tracks = (
+        Track.published.select_related('main_author', 'genre')
+        .annotate(genre_rank=Window(
+            RowNumber(),
+            partition_by=F('genre_id'),
+            order_by=[F('play_count').desc(), F('id').asc()],
+        ))
+        .filter(genre_rank__lte=settings.HOME_FEED_TRACKS_PER_GENRE)
+        .order_by('genre_id', 'genre_rank')
+    )
+    tracks_by_genre = {genre: [] for genre in Genre.objects.order_by('id')}
+    tracks_by_genre_id = {genre.id: tracks for genre, tracks in tracks_by_genre.items()}
+    for track in top_tracks:
+        tracks_by_genre_id[track.genre_id].append(track)
+
+    return {
+        'albums': list(Album.objects.select_related('main_author')
+                       [:settings.HOME_FEED_ALBUMS]),
+        'tracks_by_genre': tracks_by_genre,
+    }
+
+
+def get():
+    """Feed from cache, built on miss"""
+    key = f'player:home_feed:{get_version()}'
+    feed = cache.get(key)
+    if feed is None:
+        feed = build()
+        cache.set(key, feed, settings.HOME_FEED_CACHE_TIMEOUT)
+    return feed
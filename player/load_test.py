@@ -0,0 +1,220 @@
+"""Module with load test of concurrent track streams under WSGI and ASGI
+
+Both handlers are driven in-process with the same slow clients: every
+client sleeps `client_delay` seconds after each received chunk, as a
+mobile client on a poor connection would. The WSGI handler runs in a pool
+of `threads` threads, like a threaded WSGI server, so a stream holds its
+thread until the client has read the last chunk. The ASGI handler runs
+all streams on one event loop, like a single uvicorn worker, with Django's
+ASGIHandler. Clients arrive
+evenly over `ramp` seconds; time to first byte is counted from arrival,
+so it includes waiting for a free WSGI thread.
+
+Reported per mode: wall time, time to first byte, peak number of threads
+and errors. Sockets and HTTP parsing are not part of the measurement.
+"""
+import asyncio
+import io
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.test import Client
+from django.urls import reverse
+
+from .benchmarks import percentile
+from .models import Artist, Genre, Track
+
+MODES = ('wsgi', 'asgi')
+
+
+class ThreadSampler:
+    """Background thread recording the peak number of live threads"""
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, threading.active_count())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+def create_fixture(size):
+    """Committed published track with a size-byte file and a logged in user"""
+    tag = uuid.uuid4().hex[:8]
+    genre = Genre.objects.create(name=f'Load test {tag}')
+    artist = Artist.objects.create(name=f'Load test {tag}', slug=f'load-test-{tag}', genre=genre)
+    # bulk_create skips Track.save, so no duration or analysis tasks are queued
+    track, = Track.objects.bulk_create([Track(
+        name=f'Load test {tag}', main_author=artist, genre=genre,
+        mp3=default_storage.save(f'tracks/load-test-{tag}.mp3', ContentFile(os.urandom(size))),
+    )])
+    user = get_user_model().objects.create_user(username=f'load-test-{tag}',
+                                                password=uuid.uuid4().hex)
+    client = Client()
+    client.force_login(user)
+    return {
+        'track': track, 'artist': artist, 'genre': genre, 'user': user, 'client': client,
+        'path': reverse('stream_track', kwargs={'track_id': track.pk}),
+        'cookie': f'{settings.SESSION_COOKIE_NAME}='
+                  f'{client.cookies[settings.SESSION_COOKIE_NAME].value}',
+    }
+
+
+def delete_fixture(fixture):
+    """Remove objects and file of create_fixture"""
+    fixture['client'].logout()
+    Track.objects.get(pk=fixture['track'].pk).delete()
+    fixture['artist'].delete()
+    fixture['genre'].delete()
+    fixture['user'].delete()
+
+
+def wsgi_stream(handler, path, cookie, client_delay, arrival):
+    """(status, time to first byte, bytes) of one slow WSGI client"""
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '',
+        'SERVER_NAME': 'testserver', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'testserver', 'HTTP_COOKIE': cookie,
+        'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr, 'wsgi.multithread': True, 'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    statuses = []
+    body = handler(environ, lambda status, headers, exc_info=None: statuses.append(status))
+    first_byte, received = None, 0
+    try:
+        for chunk in body:
+            if first_byte is None:
+                first_byte = time.perf_counter() - arrival
+            received += len(chunk)
+            time.sleep(client_delay)
+    finally:
+        body.close()
+    return int(statuses[0].split()[0]), first_byte, received
+
+
+async def asgi_stream(application, path, cookie, client_delay, delay):
+    """(status, time to first byte, bytes) of one slow ASGI client"""
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': 'GET', 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+        'query_string': b'', 'root_path': '',
+        'headers': [(b'host', b'testserver'), (b'cookie', cookie.encode())],
+        'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+    }
+    finished = asyncio.Event()
+    requested = False
+    result = {'status': None, 'first_byte': None, 'received': 0}
+    await asyncio.sleep(delay)
+    started = time.perf_counter()
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await finished.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            result['status'] = message['status']
+            return
+        if result['first_byte'] is None:
+            result['first_byte'] = time.perf_counter() - started
+        result['received'] += len(message.get('body', b''))
+        if message.get('more_body'):
+            await asyncio.sleep(client_delay)
+        else:
+            finished.set()
+
+    await application(scope, receive, send)
+    finished.set()
+    return result['status'], result['first_byte'], result['received']
+
+
+def summary(mode, results, seconds, peak_threads, expected_bytes):
+    """Report of one mode"""
+    first_bytes = [first_byte for status, first_byte, received in results
+                   if status == 200 and received == expected_bytes]
+    return {
+        'mode': mode,
+        'streams': len(results),
+        'completed': len(first_bytes),
+        'errors': len(results) - len(first_bytes),
+        'seconds': round(seconds, 3),
+        'streams_per_second': round(len(first_bytes) / seconds, 1) if seconds else 0,
+        'ttfb_p50_ms': round(percentile(first_bytes, 0.5) * 1000, 1) if first_bytes else None,
+        'ttfb_p95_ms': round(percentile(first_bytes, 0.95) * 1000, 1) if first_bytes else None,
+        'peak_threads': peak_threads,
+    }
+
+
+def run_wsgi(fixture, streams, threads, client_delay, size, ramp): # pylint: disable=R0913,R0917
+    """Serve streams slow clients with a pool of threads"""
+    handler = WSGIHandler()
+    with ThreadSampler() as sampler, ThreadPoolExecutor(max_workers=threads) as pool:
+        started = time.perf_counter()
+        futures = []
+        for index in range(streams):
+            arrival = started + ramp * index / streams
+            time.sleep(max(arrival - time.perf_counter(), 0))
+            futures.append(pool.submit(wsgi_stream, handler, fixture['path'],
+                                       fixture['cookie'], client_delay, arrival))
+        results = [future.result() for future in futures]
+        seconds = time.perf_counter() - started
+    return summary('wsgi', results, seconds, sampler.peak, size)
+
+
+def run_asgi(fixture, streams, client_delay, size, ramp):
+    """Serve streams slow clients on one event loop"""
+    application = ASGIHandler()
+
+    async def run_all():
+        return await asyncio.gather(*[
+            asgi_stream(application, fixture['path'], fixture['cookie'], client_delay,
+                        ramp * index / streams)
+            for index in range(streams)
+        ])
+
+    with ThreadSampler() as sampler:
+        started = time.perf_counter()
+        results = asyncio.run(run_all())
+        seconds = time.perf_counter() - started
+    return summary('asgi', results, seconds, sampler.peak, size)
+
+
+def run_load_test(streams=1000, threads=32, client_delay=0.05, size=512 * 1024, # pylint: disable=R0913,R0917
+                  ramp=0.0, modes=MODES):
+    """Reports of the modes for the same track, file and clients"""
+    fixture = create_fixture(size)
+    try:
+        reports = []
+        for mode in modes:
+            if mode == 'wsgi':
+                reports.append(run_wsgi(fixture, streams, threads, client_delay, size, ramp))
+            else:
+                reports.append(run_asgi(fixture, streams, client_delay, size, ramp))
+        return reports
+    finally:
+        delete_fixture(fixture)
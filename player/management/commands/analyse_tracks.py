@@ -0,0 +1,29 @@
+"""
+Django management command computing waveform and loudness of tracks.
+"""
+
+import os
+
+from django.core.management.base import BaseCommand
+from player import track_analysis
+
+
+class Command(BaseCommand):
+    """Command to backfill TrackAnalysis of tracks."""
+
+    help = "Расчёт волновой формы и громкости треков"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=os.cpu_count() or 1,
+                            help="Количество процессов")
+        parser.add_argument("--force", action="store_true",
+                            help="Пересчитать уже проанализированные треки")
+
+    def handle(self, *args, **kwargs):
+        tracks = track_analysis.tracks_to_analyse(kwargs["force"])
+        analysed = track_analysis.analyse_tracks(tracks, kwargs["processes"])
+        self.stdout.write(  # pylint: disable=no-member
+            self.style.SUCCESS(  # pylint: disable=E1101
+                f"Проанализировано треков: {analysed} из {len(tracks)}"
+            )
+        )
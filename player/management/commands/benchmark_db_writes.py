@@ -0,0 +1,51 @@
+"""
+Django management command measuring write throughput of database profiles.
+
+SQLite profiles (default journaling and the production WAL profile) run on
+temporary files. The PostgreSQL profile is measured with --postgresql, on
+the database given by POSTGRES_* variables, in a table created and dropped
+by the benchmark.
+"""
+
+import json
+
+from django.core.management.base import BaseCommand
+from ml_music import databases
+from player import db_benchmark
+
+
+class Command(BaseCommand):
+    """Command to benchmark concurrent writes of database profiles."""
+
+    help = "Замер скорости записи при одновременных соединениях для профилей базы данных"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--writers", type=int, nargs="+", default=[1, 8, 32],
+                            help="Количество одновременных соединений")
+        parser.add_argument("--operations", type=int, default=200,
+                            help="Операций на соединение")
+        parser.add_argument("--postgresql", action="store_true",
+                            help="Также замерить профиль PostgreSQL")
+        parser.add_argument("--output", help="Путь к JSON-отчёту")
+
+    def handle(self, *args, **kwargs):
+        reports = db_benchmark.run_benchmark(writers=kwargs["writers"],
+                                             operations=kwargs["operations"])
+        if kwargs["postgresql"]:
+            reports.update(db_benchmark.run_benchmark(
+                {'postgresql': databases.postgresql_from_environment()},
+                kwargs["writers"], kwargs["operations"]
+            ))
+
+        for name, results in reports.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))  # pylint: disable=E1101
+            for result in results:
+                self.stdout.write(  # pylint: disable=no-member
+                    f"  соединений {result['writers']:3}   {result['writes_per_second']:9.1f} зап/с"
+                    f"   p50 {result['p50_ms']} ms   p95 {result['p95_ms']} ms"
+                    f"   ошибок {result['errors']}"
+                )
+
+        if kwargs["output"]:
+            with open(kwargs["output"], "w", encoding="utf-8") as file:
+                json.dump(reports, file, indent=2, ensure_ascii=False)
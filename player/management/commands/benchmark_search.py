@@ -0,0 +1,121 @@
+"""
+Django management command comparing indexed search with the icontains lookup.
+
+A synthetic catalogue is written inside a transaction which is rolled back
+at the end, so run it against a development copy of the database: on SQLite
+the database stays locked for writing while the benchmark runs.
+"""
+
+import random
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from pytils.translit import translify
+
+from player import search_index
+from player.models import Artist, Genre, Track
+
+CYRILLIC_SYLLABLES = ['ка', 'ро', 'ми', 'ла', 'ту', 'не', 'шо', 'да', 'лю', 'ци', 'фер', 'ночь']
+LATIN_SYLLABLES = ['ka', 'lo', 'mi', 'ra', 'tu', 'ne', 'sho', 'da', 've', 'li', 'ster', 'night']
+
+
+def make_vocabulary(rnd, size=3000):
+    """Pseudo-words in both alphabets"""
+    words = set()
+    while len(words) < size:
+        syllables = CYRILLIC_SYLLABLES if rnd.random() < 0.5 else LATIN_SYLLABLES
+        words.add(''.join(rnd.choice(syllables) for _ in range(rnd.randint(2, 4))))
+    return sorted(words)
+
+
+def timed(func, repeat):
+    """Median run time of func in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+class Command(BaseCommand):
+    """Command to benchmark track search."""
+
+    help = "Сравнение поиска по индексу и через icontains на синтетическом каталоге"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+",
+                            default=[10_000, 100_000, 1_000_000], help="Размеры каталога")
+        parser.add_argument("--repeat", type=int, default=5, help="Повторов на запрос")
+        parser.add_argument("--artists", type=int, default=1000, help="Количество артистов")
+        parser.add_argument("--table-index", action="store_true",
+                            help="Также замерить резервный индекс в таблице SearchToken")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **kwargs):
+        rnd = random.Random(kwargs["seed"])
+        vocabulary = make_vocabulary(rnd)
+        cyrillic_word = next(word for word in vocabulary if not word.isascii())
+        queries = {
+            'word': vocabulary[len(vocabulary) // 2],
+            'prefix': vocabulary[0][:3],
+            'two words': f"{vocabulary[1]} {vocabulary[2]}",
+            'translit': translify(cyrillic_word),
+        }
+        with transaction.atomic():
+            genre = Genre.objects.create(name=f"Benchmark {rnd.random()}")
+            artists = Artist.objects.bulk_create(
+                Artist(name=' '.join(rnd.sample(vocabulary, 2)),
+                       slug=f"benchmark-{i}-{rnd.random()}", genre=genre)
+                for i in range(kwargs["artists"])
+            )
+            created = 0
+            for size in sorted(kwargs["sizes"]):
+                created += self.seed_tracks(rnd, vocabulary, genre, artists, size - created)
+                search_index.rebuild()
+                self.stdout.write(self.style.MIGRATE_HEADING(  # pylint: disable=E1101
+                    f"{size} tracks, index: {type(search_index.get_index()).__name__}"
+                ))
+
+                table_index = None
+                if kwargs["table_index"]:
+                    table_index = search_index.TableIndex()
+                    search_index.rebuild(index=table_index)
+                self.time_queries(queries, table_index, kwargs["repeat"])
+
+            transaction.set_rollback(True)
+
+    def time_queries(self, queries, table_index, repeat):
+        """Print timings of every query with each search method"""
+        limit = settings.SEARCH_RESULTS_LIMIT
+        for label, query in queries.items():
+            icontains = timed(lambda q=query: list(
+                Track.objects.filter(Q(name__icontains=q) | Q(main_author__name__icontains=q))
+                .order_by('id').values_list('id', flat=True)[:limit]
+            ), repeat)
+            indexed = timed(lambda q=query: search_index.search_track_ids(q), repeat)
+            line = (f"  {label:<10} {query!r:<28} icontains {icontains:9.2f} ms"
+                    f"   index {indexed:9.2f} ms")
+            if table_index is not None:
+                tokens = search_index.tokenize(query)
+                table = timed(lambda t=tokens: table_index.search(t, limit), repeat)
+                line += f"   table index {table:9.2f} ms"
+            self.stdout.write(line)  # pylint: disable=no-member
+
+    @staticmethod
+    def seed_tracks(rnd, vocabulary, genre, artists, count, batch_size=5000): # pylint: disable=R0913,R0917
+        """Bulk insert count synthetic tracks"""
+        created = 0
+        while created < count:
+            batch = min(batch_size, count - created)
+            Track.objects.bulk_create(
+                Track(name=' '.join(rnd.sample(vocabulary, rnd.randint(1, 4))),
+                      main_author=rnd.choice(artists), genre=genre)
+                for _ in range(batch)
+            )
+            created += batch
+        return created
@@ -0,0 +1,69 @@
+"""
+Django management command measuring query count and latency of player views.
+
+A synthetic catalogue is written inside a transaction which is rolled back
+at the end, so run it against a development copy of the database: on SQLite
+the database stays locked for writing while the benchmark runs.
+"""
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+
+from player import benchmarks
+
+
+class Command(BaseCommand):
+    """Command to benchmark player views."""
+
+    help = "Замер количества запросов, времени SQL и задержки страниц плеера"
+
+    def add_arguments(self, parser):
+        for name, default in benchmarks.DEFAULT_SIZES.items():
+            parser.add_argument(f"--{name}", type=int, default=default,
+                                help=f"Количество: {name}")
+        parser.add_argument("--repeat", type=int, default=20, help="Повторов на страницу")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Путь к JSON-отчёту")
+        parser.add_argument("--compare", help="Предыдущий JSON-отчёт для сравнения")
+        parser.add_argument("--no-budgets", action="store_true",
+                            help="Не проверять бюджеты запросов")
+
+    def handle(self, *args, **kwargs):
+        sizes = {name: kwargs[name] for name in benchmarks.DEFAULT_SIZES}
+
+        # the test client needs 'testserver' in ALLOWED_HOSTS
+        with override_settings(ALLOWED_HOSTS=['*']), transaction.atomic():
+            catalogue = benchmarks.seed_catalogue(sizes, kwargs["seed"])
+            results = benchmarks.run_benchmarks(catalogue, kwargs["repeat"])
+            transaction.set_rollback(True)
+
+        report = {'sizes': sizes, 'repeat': kwargs["repeat"], 'views': results}
+        for name, result in results.items():
+            self.stdout.write(  # pylint: disable=no-member
+                f"  {name:<14} {result['status']}  queries {result['queries']:3}"
+                f"   sql {result['sql_ms']:8.2f} ms   p50 {result['p50_ms']:8.2f} ms"
+                f"   p95 {result['p95_ms']:8.2f} ms"
+            )
+
+        if kwargs["compare"]:
+            with open(kwargs["compare"], "r", encoding="utf-8") as file:
+                previous = json.load(file)
+            self.stdout.write(self.style.MIGRATE_HEADING("Сравнение"))  # pylint: disable=E1101
+            diff = benchmarks.compare_reports(previous.get('views', {}), results)
+            for name, metrics in diff.items():
+                changes = ", ".join(f"{metric} {old} -> {new}"
+                                    for metric, (old, new) in metrics.items())
+                self.stdout.write(f"  {name:<14} {changes}")  # pylint: disable=no-member
+
+        if kwargs["output"]:
+            with open(kwargs["output"], "w", encoding="utf-8") as file:
+                json.dump(report, file, indent=2, ensure_ascii=False)
+
+        if not kwargs["no_budgets"]:
+            violations = benchmarks.check_budgets(results)
+            if violations:
+                raise CommandError("Превышены бюджеты запросов: " + "; ".join(violations))
+            self.stdout.write(self.style.SUCCESS("Бюджеты запросов соблюдены"))  # pylint: disable=E1101
@@ -0,0 +1,89 @@
+"""
+Django management command moving existing media into content-addressed storage.
+
+Every file referenced by a model is re-saved through the default storage,
+which names it by content hash, so duplicates collapse into one file. Rows
+are repointed at the new names and reference counts are recomputed from the
+number of rows using each file.
+"""
+
+from collections import Counter
+
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.management.base import BaseCommand, CommandError
+from player.management.commands.generate_thumbnails import IMAGE_FIELDS
+from player.models import Track
+from player.storage import is_content_name
+
+MEDIA_FIELDS = [(Track, 'mp3')] + IMAGE_FIELDS
+
+
+class Command(BaseCommand):
+    """Command to deduplicate media files."""
+
+    help = "Перенос медиафайлов в хранилище по хешу содержимого и удаление дублей"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Только показать, сколько места освободится")
+        parser.add_argument("--keep-originals", action="store_true",
+                            help="Не удалять исходные файлы после переноса")
+
+    def handle(self, *args, **kwargs):
+        if not hasattr(default_storage, 'set_references'):
+            raise CommandError("STORAGES['default'] не является ContentAddressedStorage")
+        legacy_storage = FileSystemStorage(location=default_storage.location)
+
+        moved = {}  # legacy name -> content name
+        missing = []
+        freed = 0
+        for model, field_name in MEDIA_FIELDS:
+            names = (model.objects.exclude(**{f'{field_name}__in': ['', None]})
+                     .values_list(field_name, flat=True).distinct())
+            for name in names.iterator():
+                if not is_content_name(name) and name not in moved:
+                    freed += self.move(legacy_storage, name, moved, missing, kwargs["dry_run"])
+
+            if not kwargs["dry_run"]:
+                for old_name, new_name in moved.items():
+                    model.objects.filter(**{field_name: old_name}).update(**{field_name: new_name})
+
+        if kwargs["dry_run"]:
+            self.stdout.write(f"Файлов к переносу: {len(moved)}")  # pylint: disable=no-member
+        else:
+            self.recount()
+            if not kwargs["keep_originals"]:
+                for name in moved:
+                    legacy_storage.delete(name)
+            self.stdout.write(self.style.SUCCESS(  # pylint: disable=E1101
+                f"Перенесено файлов: {len(moved)}, освобождено дублями: {freed} байт"
+            ))
+        for name in missing:
+            self.stderr.write(f"Файл не найден: {name}")  # pylint: disable=no-member
+
+    @staticmethod
+    def move(legacy_storage, name, moved, missing, dry_run):
+        """Store legacy file by content hash, returns bytes freed as a duplicate"""
+        if not legacy_storage.exists(name):
+            missing.append(name)
+            return 0
+        if dry_run:
+            moved[name] = None
+            return 0
+        with legacy_storage.open(name, 'rb') as file:
+            moved[name] = default_storage.save(name, file)
+        if default_storage.references(moved[name]) > 1:
+            # contents were already stored under the same hash
+            return legacy_storage.size(name)
+        return 0
+
+    @staticmethod
+    def recount():
+        """Reference count of every content-addressed file is the number of rows using it"""
+        references = Counter()
+        for model, field_name in MEDIA_FIELDS:
+            names = (model.objects.exclude(**{f'{field_name}__in': ['', None]})
+                     .values_list(field_name, flat=True))
+            references.update(name for name in names.iterator() if is_content_name(name))
+        for name, count in references.items():
+            default_storage.set_references(name, count)
@@ -0,0 +1,18 @@
+"""
+Django management command for writing buffered play counts.
+"""
+
+from django.core.management.base import BaseCommand
+from player.play_counts import drain_spool, play_buffer
+
+
+class Command(BaseCommand):
+    """Command to replay spooled play events into Track.play_count."""
+
+    help = "Запись накопленных прослушиваний треков в базу данных"
+
+    def handle(self, *args, **kwargs): # pylint: disable=W0613
+        written = play_buffer.flush() + drain_spool()
+        self.stdout.write(  # pylint: disable=no-member
+            self.style.SUCCESS(f"Записано прослушиваний: {written}")  # pylint: disable=E1101
+        )
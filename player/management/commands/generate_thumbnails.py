@@ -0,0 +1,39 @@
+"""
+Django management command for pre-generating image thumbnails.
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from player import thumbnails
+from player.models import Album, Artist, PlayerUser, Playlist, Track
+
+IMAGE_FIELDS = [
+    (Track, 'logo'),
+    (Artist, 'logo'),
+    (Album, 'logo'),
+    (Playlist, 'logo'),
+    (PlayerUser, 'profile_photo'),
+]
+
+
+class Command(BaseCommand):
+    """Command to create thumbnails of all uploaded images."""
+
+    help = "Создание уменьшенных копий обложек и фото профилей"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", nargs="+", choices=list(settings.THUMBNAIL_SIZES),
+                            default=list(settings.THUMBNAIL_SIZES), help="Размеры")
+
+    def handle(self, *args, **kwargs):
+        count = 0
+        for model, field_name in IMAGE_FIELDS:
+            names = (model.objects.exclude(**{f'{field_name}__in': ['', None]})
+                     .values_list(field_name, flat=True).distinct())
+            for name in names.iterator():
+                for size in kwargs["sizes"]:
+                    thumbnails.resolve(name, size)
+                    count += 1
+        self.stdout.write(  # pylint: disable=no-member
+            self.style.SUCCESS(f"Обработано изображений: {count}")  # pylint: disable=E1101
+        )
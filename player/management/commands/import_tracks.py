@@ -2,22 +2,44 @@
 Django management command for importing tracks from JSON file.
 """
 
-import json
 import os
 from datetime import datetime
 from django.core.files.base import ContentFile
 from django.core.management.base import BaseCommand
 from django.utils.timezone import make_aware
+from django.db import transaction
+from player import tasks
 from player.models import Track, Artist, Genre
+from player.track_import import (BulkTrackImporter, Checkpoint, attach_track_media,
+                                 read_records)
 
 
 class Command(BaseCommand):
     """Command to import tracks from JSON file."""
 
-    help = "Импорт треков из JSON-файла"
+    help = "Импорт треков из JSON или JSON Lines файла"
 
     def add_arguments(self, parser):
         parser.add_argument("json_path", type=str, help="Путь к JSON-файлу с треками")
+        parser.add_argument("--format", choices=["auto", "json", "jsonl"], default="auto",
+                            help="Формат файла: массив JSON или JSON Lines")
+        parser.add_argument("--resume-from", type=int, default=None,
+                            help="Номер строки (записи), с которой начать импорт. "
+                                 "Быстро только для JSON Lines: пропущенные строки не "
+                                 "разбираются, а массив JSON разбирается заново с начала")
+        parser.add_argument("--checkpoint", type=str, default=None,
+                            help="Файл с номером последней обработанной записи "
+                                 "(для больших файлов используйте JSON Lines)")
+        parser.add_argument("--bulk", action="store_true",
+                            help="Пакетный импорт: bulk_create, параллельное копирование файлов")
+        parser.add_argument("--batch-size", type=int, default=500,
+                            help="Треков в одной транзакции при пакетном импорте")
+        parser.add_argument("--threads", type=int, default=None,
+                            help="Потоков для копирования файлов")
+        parser.add_argument("--processes", type=int, default=None,
+                            help="Процессов для вычисления длительности")
+        parser.add_argument("--defer-media", action="store_true",
+                            help="Копировать файлы в фоновых задачах (manage.py run_workers)")
 
     def handle(self, *args, **kwargs):
         json_path = kwargs["json_path"]
@@ -26,10 +48,26 @@ class Command(BaseCommand):
             self.stderr.write(self.style.ERROR(f"Файл {json_path} не найден"))  # pylint: disable=no-member
             return
 
-        with open(json_path, "r", encoding="utf-8") as file:
-            tracks_data = json.load(file)
+        checkpoint = Checkpoint(kwargs["checkpoint"]) if kwargs["checkpoint"] else None
+        start_row = kwargs["resume_from"]
+        if start_row is None:
+            start_row = checkpoint.load() + 1 if checkpoint else 1
+        if start_row > 1:
+            self.stdout.write(f"Продолжение импорта с записи {start_row}")  # pylint: disable=no-member
 
-        for track_data in tracks_data:
+        records = read_records(json_path, kwargs["format"], start_row)
+
+        if kwargs["bulk"]:
+            self.bulk_import(records, kwargs, checkpoint)
+        else:
+            self.import_one_by_one(records, checkpoint, kwargs["defer_media"])
+
+        if checkpoint:
+            checkpoint.clear()
+
+    def import_one_by_one(self, records, checkpoint, defer_media=False):
+        """Import tracks with a save per track"""
+        for row, track_data in records:
             try:
                 main_author = Artist.objects.get(id=track_data["main_author"])
                 genre = Genre.objects.get(id=track_data["genre"])
@@ -43,7 +81,11 @@ class Command(BaseCommand):
                     )
                 )
 
-                if track_data.get("logo"):
+                if defer_media:
+                    for key in ("logo", "mp3"):
+                        if track_data.get(key) and not os.path.isfile(track_data[key]):
+                            raise FileNotFoundError(f"File {track_data[key]} not found")
+                elif track_data.get("logo"):
                     with open(track_data["logo"], "rb") as img_file:
                         track.logo.save(  # pylint: disable=no-member
                             os.path.basename(track_data["logo"]),
@@ -51,7 +93,7 @@ class Command(BaseCommand):
                             save=False
                         )
 
-                if track_data.get("mp3"):
+                if track_data.get("mp3") and not defer_media:
                     with open(track_data["mp3"], "rb") as mp3_file:
                         track.mp3.save(  # pylint: disable=no-member
                             os.path.basename(track_data["mp3"]),
@@ -59,7 +101,11 @@ class Command(BaseCommand):
                             save=False
                         )
 
-                track.save()
+                with transaction.atomic():
+                    track.save()
+                    if defer_media and (track_data.get("logo") or track_data.get("mp3")):
+                        tasks.enqueue(attach_track_media, track.pk,
+                                      track_data.get("logo"), track_data.get("mp3"))
 
                 if track_data.get("featured_authors"):
                     featured_authors = Artist.objects.filter(
@@ -73,6 +119,38 @@ class Command(BaseCommand):
             except Exception as exc:  # pylint: disable=broad-except
                 self.stderr.write(  # pylint: disable=no-member
                     self.style.ERROR(
-                        f"Ошибка при обработке трека '{track_data['name']}': {exc}"
+                        f"Ошибка при обработке трека '{track_data.get('name')}': {exc}"
                     )
                 )
+            if checkpoint:
+                checkpoint.save(row)
+
+    def bulk_import(self, records, options, checkpoint):
+        """Import with BulkTrackImporter and print throughput and errors"""
+        def on_batch(report):
+            if checkpoint:
+                checkpoint.save(report.last_row)
+            self.stdout.write(  # pylint: disable=no-member
+                f"Импортировано {report.created} треков, "
+                f"{report.throughput:.1f} треков/с, ошибок: {len(report.errors)}"
+            )
+
+        importer = BulkTrackImporter(
+            batch_size=options["batch_size"],
+            threads=options["threads"],
+            processes=options["processes"],
+            on_batch=on_batch,
+            defer_media=options["defer_media"],
+        )
+        report = importer.run(records)
+
+        for row, name, message in report.errors:
+            self.stderr.write(  # pylint: disable=no-member
+                self.style.ERROR(f"Строка {row} ('{name}'): {message}")  # pylint: disable=E1101
+            )
+        self.stdout.write(  # pylint: disable=no-member
+            self.style.SUCCESS(  # pylint: disable=E1101
+                f"Импортировано треков: {report.created} за {report.elapsed:.1f} с "
+                f"({report.throughput:.1f} треков/с), ошибок: {len(report.errors)}"
+            )
+        )
@@ -0,0 +1,58 @@
+"""
+Django management command comparing WSGI and ASGI track streaming under load.
+
+A temporary track, file and user are created (committed, the ASGI handler
+reads them from another thread) and deleted at the end, so run it against
+a development copy of the database.
+"""
+
+import json
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from player import load_test
+
+
+class Command(BaseCommand):
+    """Command to load test concurrent track streams."""
+
+    help = "Нагрузочный тест одновременных потоков треков под WSGI и ASGI"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--streams", type=int, default=1000,
+                            help="Количество одновременных клиентов")
+        parser.add_argument("--threads", type=int, default=32,
+                            help="Размер пула потоков WSGI")
+        parser.add_argument("--client-delay", type=float, default=0.05,
+                            help="Пауза клиента в секундах после каждого фрагмента")
+        parser.add_argument("--size", type=int, default=512,
+                            help="Размер файла трека в КБ")
+        parser.add_argument("--ramp", type=float, default=0.0,
+                            help="Время в секундах, за которое подключаются все клиенты")
+        parser.add_argument("--mode", choices=load_test.MODES, action="append",
+                            help="Режим (по умолчанию оба)")
+        parser.add_argument("--output", help="Путь к JSON-отчёту")
+
+    def handle(self, *args, **kwargs):
+        # requests are built without a real server, 'testserver' must be allowed;
+        # DEBUG would log every query and run the debug toolbar on every stream
+        with override_settings(ALLOWED_HOSTS=['*'], DEBUG=False):
+            reports = load_test.run_load_test(
+                streams=kwargs["streams"], threads=kwargs["threads"],
+                client_delay=kwargs["client_delay"], size=kwargs["size"] * 1024,
+                ramp=kwargs["ramp"],
+                modes=kwargs["mode"] or load_test.MODES,
+            )
+
+        for report in reports:
+            self.stdout.write(  # pylint: disable=no-member
+                f"  {report['mode']:<5} {report['completed']}/{report['streams']} потоков"
+                f"   {report['seconds']:8.2f} s   {report['streams_per_second']:8.1f} /s"
+                f"   ttfb p50 {report['ttfb_p50_ms']} ms   p95 {report['ttfb_p95_ms']} ms"
+                f"   потоков ОС {report['peak_threads']}"
+            )
+
+        if kwargs["output"]:
+            with open(kwargs["output"], "w", encoding="utf-8") as file:
+                json.dump(reports, file, indent=2, ensure_ascii=False)
@@ -0,0 +1,18 @@
+"""
+Django management command for backfilling the artist -> tracks table.
+"""
+
+from django.core.management.base import BaseCommand
+from player import artist_tracks
+
+
+class Command(BaseCommand):
+    """Command to rebuild ArtistTrack rows of all tracks."""
+
+    help = "Перестроение таблицы связей артистов и треков"
+
+    def handle(self, *args, **kwargs): # pylint: disable=W0613
+        count = artist_tracks.rebuild()
+        self.stdout.write(  # pylint: disable=no-member
+            self.style.SUCCESS(f"Обработано треков: {count}")  # pylint: disable=E1101
+        )
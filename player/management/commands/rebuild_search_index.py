@@ -0,0 +1,18 @@
+"""
+Django management command for rebuilding the track search index.
+"""
+
+from django.core.management.base import BaseCommand
+from player import search_index
+
+
+class Command(BaseCommand):
+    """Command to reindex all tracks."""
+
+    help = "Перестроение поискового индекса треков"
+
+    def handle(self, *args, **kwargs): # pylint: disable=W0613
+        count = search_index.rebuild()
+        self.stdout.write(  # pylint: disable=no-member
+            self.style.SUCCESS(f"Проиндексировано треков: {count}")  # pylint: disable=E1101
+        )
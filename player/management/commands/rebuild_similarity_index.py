@@ -0,0 +1,27 @@
+"""
+Django management command updating the similar tracks index.
+"""
+
+from django.core.management.base import BaseCommand
+from player import similarity
+
+
+class Command(BaseCommand):
+    """Command to update vectors of changed and new tracks."""
+
+    help = "Обновление индекса похожих треков"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true",
+                            help="Перестроить индекс всех треков")
+        parser.add_argument("--batch-size", type=int, default=None,
+                            help="Количество треков в одном пакете")
+
+    def handle(self, *args, **kwargs):
+        if kwargs["full"]:
+            count = similarity.rebuild(kwargs["batch_size"])
+        else:
+            count = similarity.update(kwargs["batch_size"])
+        self.stdout.write(  # pylint: disable=no-member
+            self.style.SUCCESS(f"Обновлено векторов треков: {count}")  # pylint: disable=E1101
+        )
@@ -0,0 +1,58 @@
+"""
+Django management command running background task workers.
+"""
+
+import multiprocessing
+import os
+import signal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from player import tasks
+
+
+class Command(BaseCommand):
+    """Command to process queued BackgroundTask rows."""
+
+    help = "Запуск процессов, выполняющих фоновые задачи из очереди"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=os.cpu_count() or 1,
+                            help="Количество рабочих процессов")
+        parser.add_argument("--poll-interval", type=float, default=None,
+                            help="Пауза в секундах при пустой очереди")
+        parser.add_argument("--once", action="store_true",
+                            help="Выполнить готовые задачи и завершиться")
+
+    def handle(self, *args, **kwargs):
+        if kwargs["processes"] <= 1:
+            try:
+                tasks.work(poll_interval=kwargs["poll_interval"], once=kwargs["once"])
+            except KeyboardInterrupt:
+                pass
+            return
+
+        # forked workers must not share the parent's database connection
+        connections.close_all()
+        stop_event = multiprocessing.Event()
+        workers = [
+            multiprocessing.Process(
+                target=tasks.worker_process,
+                args=(stop_event, kwargs["poll_interval"], kwargs["once"]),
+                name=f"player-worker-{index}",
+            )
+            for index in range(kwargs["processes"])
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f"Запущено процессов: {len(workers)}")  # pylint: disable=no-member
+
+        signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            stop_event.set()
+            for worker in workers:
+                worker.join()
+        self.stdout.write(self.style.SUCCESS("Рабочие процессы остановлены"))  # pylint: disable=E1101
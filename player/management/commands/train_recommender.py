@@ -0,0 +1,32 @@
+"""
+Django management command training the "recommended for you" model.
+"""
+
+from django.core.management.base import BaseCommand
+from player import recommender
+
+
+class Command(BaseCommand):
+    """Command to factorise playlist interactions with implicit ALS."""
+
+    help = "Обучение модели рекомендаций по плейлистам пользователей"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--factors", type=int, help="Размерность векторов")
+        parser.add_argument("--iterations", type=int, help="Количество итераций ALS")
+        parser.add_argument("--workers", type=int, help="Количество потоков")
+        parser.add_argument("--chunk-size", type=int,
+                            help="Количество взаимодействий в одном пакете")
+
+    def handle(self, *args, **kwargs):
+        report = recommender.train(
+            factors=kwargs["factors"], iterations=kwargs["iterations"],
+            workers=kwargs["workers"], chunk_size=kwargs["chunk_size"],
+        )
+        self.stdout.write(  # pylint: disable=no-member
+            self.style.SUCCESS(  # pylint: disable=E1101
+                f"Модель {report['generation']}: пользователей {report['users']}, "
+                f"треков {report['tracks']}, взаимодействий {report['interactions']}, "
+                f"{report['seconds']} с"
+            )
+        )
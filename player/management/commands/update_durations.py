@@ -0,0 +1,33 @@
+"""
+Django management command backfilling unknown track durations.
+"""
+
+from django.core.management.base import BaseCommand
+from player import tasks
+from player.models import Track
+
+
+class Command(BaseCommand):
+    """Command to read durations of tracks with an mp3 but no duration."""
+
+    help = "Расчёт длительности треков, у которых она неизвестна"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--background", action="store_true",
+                            help="Поставить задачи в очередь фоновых обработчиков")
+
+    def handle(self, *args, **kwargs):
+        tracks = Track.objects.filter(duration=0).exclude(mp3='').exclude(mp3__isnull=True)
+        if kwargs["background"]:
+            queued = tasks.enqueue_many(tasks.update_track_duration,
+                                        [(pk,) for pk in tracks.values_list('pk', flat=True)])
+            message = f"Поставлено в очередь треков: {len(queued)}"
+        else:
+            updated = 0
+            for track in tracks.only('id', 'mp3', 'duration').iterator(chunk_size=500):
+                track.update_duration()
+                updated += bool(track.duration)
+            message = f"Обновлена длительность треков: {updated}"
+        self.stdout.write(  # pylint: disable=no-member
+            self.style.SUCCESS(message)  # pylint: disable=E1101
+        )
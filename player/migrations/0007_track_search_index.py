@@ -0,0 +1,91 @@
+# FTS5 search index for tracks, see player/search_index.py
+
+import re
+
+from django.db import migrations, OperationalError
+from pytils.translit import translify
+
+# Frozen copy of the tokeniser of player/search_index.py as of this migration
+FTS_TABLE = 'player_track_search'
+FIELDS = ('name', 'artists', 'albums', 'lyrics')
+WORD_RE = re.compile(r'\w+')
+FOLDS = (('kh', 'h'), ('ts', 'c'), ('j', 'y'))
+
+
+def normalize_word(word):
+    """Lower-case, transliterate and fold a single word"""
+    word = word.lower().replace('ё', 'е')
+    try:
+        word = translify(word)
+    except ValueError:
+        # not a russian word, index it as is
+        pass
+    word = ''.join(WORD_RE.findall(word))
+    for variant, folded in FOLDS:
+        word = word.replace(variant, folded)
+    return word
+
+
+def tokenize(text):
+    """Split text into normalised tokens"""
+    if not text:
+        return []
+    return [token for token in map(normalize_word, WORD_RE.findall(text)) if token]
+
+
+def track_document(track):
+    """Searchable fields of track as {field: normalised text}"""
+    artists = [track.main_author.name] + [artist.name for artist in track.featured_authors.all()]
+    albums = [album.name for album in track.albums.all()]
+    return {
+        'name': ' '.join(tokenize(track.name)),
+        'artists': ' '.join(tokenize(' '.join(artists))),
+        'albums': ' '.join(tokenize(' '.join(albums))),
+        'lyrics': ' '.join(tokenize(track.lyrics)),
+    }
+
+
+def create_search_index(apps, schema_editor):
+    """Create and fill FTS5 table, other backends are indexed by migration 0016"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+                f"USING fts5({', '.join(FIELDS)}, prefix='2 3')"
+            )
+        except OperationalError:
+            # sqlite built without FTS5
+            return
+
+        track_model = apps.get_model('player', 'Track')
+        tracks = (track_model.objects.select_related('main_author')
+                  .prefetch_related('featured_authors', 'albums'))
+        for track in tracks.iterator(chunk_size=2000):
+            document = track_document(track)
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(FIELDS)}) VALUES (%s, %s, %s, %s, %s)",
+                [track.pk] + [document[field] for field in FIELDS]
+            )
+
+
+def drop_search_index(apps, schema_editor): # pylint: disable=W0613
+    """Drop FTS5 table"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("player", "0006_alter_playlist_slug"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,66 @@
+# Track.duration is stored as integer seconds instead of strings like "3.05"
+
+from django.db import migrations, models
+
+
+def parse_duration(value):
+    """Convert "m.ss" or "h.mm.ss" to seconds"""
+    seconds = 0
+    try:
+        for part in str(value).split('.'):
+            seconds = seconds * 60 + int(part)
+    except ValueError:
+        return 0
+    return seconds
+
+
+def format_duration(seconds):
+    """Convert seconds back to "m.ss" or "h.mm.ss" """
+    hours, remainder = divmod(seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    if hours:
+        return f"{hours}.{minutes:02}.{seconds:02}"
+    return f"{minutes}.{seconds:02}"
+
+
+def strings_to_seconds(apps, schema_editor): # pylint: disable=W0613
+    """Fill duration_seconds from old duration strings"""
+    track_model = apps.get_model('player', 'Track')
+    tracks = list(track_model.objects.only('id', 'duration'))
+    for track in tracks:
+        track.duration_seconds = parse_duration(track.duration)
+    track_model.objects.bulk_update(tracks, ['duration_seconds'], batch_size=1000)
+
+
+def seconds_to_strings(apps, schema_editor): # pylint: disable=W0613
+    """Fill old duration strings from duration_seconds"""
+    track_model = apps.get_model('player', 'Track')
+    tracks = list(track_model.objects.only('id', 'duration_seconds'))
+    for track in tracks:
+        track.duration = format_duration(track.duration_seconds)
+    track_model.objects.bulk_update(tracks, ['duration'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("player", "0007_track_search_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="track",
+            name="duration_seconds",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(strings_to_seconds, seconds_to_strings),
+        migrations.RemoveField(
+            model_name="track",
+            name="duration",
+        ),
+        migrations.RenameField(
+            model_name="track",
+            old_name="duration_seconds",
+            new_name="duration",
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('player', '0008_track_duration_seconds'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='track',
+            index=models.Index(fields=['publication_time', 'id'], name='player_trac_publica_062b22_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='track',
+            index=models.Index(fields=['play_count', 'id'], name='player_trac_play_co_9f3afe_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_artist_tracks(apps, schema_editor): # pylint: disable=W0613
+    """Backfill membership rows of existing tracks"""
+    track_model = apps.get_model('player', 'Track')
+    artist_track_model = apps.get_model('player', 'ArtistTrack')
+    rows = [
+        artist_track_model(artist_id=artist_id, track_id=track_id, role=0)
+        for track_id, artist_id in track_model.objects.values_list('id', 'main_author_id')
+    ]
+    rows += [
+        artist_track_model(artist_id=artist_id, track_id=track_id, role=1)
+        for track_id, artist_id in track_model.featured_authors.through.objects
+        .values_list('track_id', 'artist_id')
+    ]
+    artist_track_model.objects.bulk_create(rows, batch_size=2000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('player', '0009_track_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArtistTrack',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.PositiveSmallIntegerField(choices=[(0, 'Основной'), (1, 'Приглашённый')])),
+                ('artist', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='track_links', to='player.artist')),
+                ('track', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='artist_links', to='player.track')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('artist', 'track', 'role'), name='unique_artist_track_role')],
+            },
+        ),
+        migrations.RunPython(fill_artist_tracks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('player', '0010_artist_track'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrackAnalysis',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mp3_name', models.CharField(max_length=255)),
+                ('peaks', models.BinaryField()),
+                ('loudness', models.FloatField(null=True)),
+                ('replay_gain', models.FloatField(null=True)),
+                ('method', models.CharField(max_length=16)),
+                ('time_updated', models.DateTimeField(auto_now=True)),
+                ('track', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='analysis', to='player.track')),
+            ],
+        ),
+    ]
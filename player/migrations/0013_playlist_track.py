@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+POSITION_GAP = 1024
+
+
+def copy_playlist_tracks(apps, schema_editor): # pylint: disable=W0613
+    """Move memberships to the ordered table, in the order they were added"""
+    playlist_model = apps.get_model('player', 'Playlist')
+    playlist_track_model = apps.get_model('player', 'PlaylistTrack')
+    rows, positions = [], {}
+    for playlist_id, track_id in (playlist_model.tracks.through.objects
+                                  .order_by('playlist_id', 'id')
+                                  .values_list('playlist_id', 'track_id')):
+        positions[playlist_id] = positions.get(playlist_id, 0) + POSITION_GAP
+        rows.append(playlist_track_model(playlist_id=playlist_id, track_id=track_id,
+                                         position=positions[playlist_id]))
+    playlist_track_model.objects.bulk_create(rows, batch_size=2000)
+
+
+def copy_back_playlist_tracks(apps, schema_editor): # pylint: disable=W0613
+    """Move memberships back to the plain many-to-many table"""
+    playlist_model = apps.get_model('player', 'Playlist')
+    playlist_track_model = apps.get_model('player', 'PlaylistTrack')
+    through = playlist_model.tracks.through
+    through.objects.bulk_create(
+        [through(playlist_id=playlist_id, track_id=track_id)
+         for playlist_id, track_id in playlist_track_model.objects
+         .order_by('playlist_id', 'position', 'id').values_list('playlist_id', 'track_id')],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('player', '0012_background_task'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlaylistTrack',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.BigIntegerField()),
+                ('time_added', models.DateTimeField(auto_now_add=True)),
+                ('playlist', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='track_links', to='player.playlist')),
+                ('track', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='playlist_links', to='player.track')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['playlist', 'position', 'id'], name='player_play_playlis_dceea3_idx')],
+                'constraints': [models.UniqueConstraint(fields=('playlist', 'track'), name='unique_playlist_track')],
+            },
+        ),
+        migrations.RunPython(copy_playlist_tracks, copy_back_playlist_tracks),
+        # the through model can not be added to an existing field
+        migrations.RemoveField(
+            model_name='playlist',
+            name='tracks',
+        ),
+        migrations.AddField(
+            model_name='playlist',
+            name='tracks',
+            field=models.ManyToManyField(blank=True, related_name='playlists', through='player.PlaylistTrack', to='player.track'),
+        ),
+    ]
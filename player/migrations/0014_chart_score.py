@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('player', '0013_playlist_track'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChartEpoch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('epoch', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ChartScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.PositiveSmallIntegerField(choices=[(0, 'Трек'), (1, 'Исполнитель'), (2, 'Жанр')])),
+                ('object_id', models.BigIntegerField()),
+                ('score', models.FloatField(default=0)),
+                ('genre', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='player.genre')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', '-score', 'object_id'], name='player_char_kind_542097_idx'), models.Index(fields=['kind', 'genre', '-score', 'object_id'], name='player_char_kind_16eba7_idx')],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='unique_chart_object')],
+            },
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Refill the FTS5 search index with typed and folded word forms, see player/search_index.py
+
+import re
+
+from django.db import migrations
+from pytils.translit import translify
+
+# Frozen copy of the tokeniser of player/search_index.py as of this migration
+FTS_TABLE = 'player_track_search'
+FIELDS = ('name', 'artists', 'albums', 'lyrics')
+WORD_RE = re.compile(r'\w+')
+FOLDS = (('kh', 'h'), ('ts', 'c'), ('j', 'y'))
+
+
+def normalize_word(word):
+    """Lower-case and transliterate a single word"""
+    word = word.lower().replace('ё', 'е')
+    try:
+        word = translify(word)
+    except ValueError:
+        # not a russian word, index it as is
+        pass
+    return ''.join(WORD_RE.findall(word))
+
+
+def word_forms(token):
+    """Distinct forms of a normalised token: as typed and folded"""
+    folded = token
+    for variant, replacement in FOLDS:
+        folded = folded.replace(variant, replacement)
+    return (token,) if folded == token else (token, folded)
+
+
+def index_text(text):
+    """Indexed text with every token in all of its forms"""
+    tokens = [token for token in map(normalize_word, WORD_RE.findall(text or '')) if token]
+    return ' '.join(form for token in tokens for form in word_forms(token))
+
+
+def track_document(track):
+    """Searchable fields of track as {field: normalised text}"""
+    artists = [track.main_author.name] + [artist.name for artist in track.featured_authors.all()]
+    albums = [album.name for album in track.albums.all()]
+    return {
+        'name': index_text(track.name),
+        'artists': index_text(' '.join(artists)),
+        'albums': index_text(' '.join(albums)),
+        'lyrics': index_text(track.lyrics),
+    }
+
+
+def refill_search_index(apps, schema_editor):
+    """Reindex every track into the FTS5 table, other backends are indexed by migration 0016"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    if FTS_TABLE not in schema_editor.connection.introspection.table_names():
+        # sqlite built without FTS5
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        track_model = apps.get_model('player', 'Track')
+        tracks = (track_model.objects.select_related('main_author')
+                  .prefetch_related('featured_authors', 'albums'))
+        for track in tracks.iterator(chunk_size=2000):
+            document = track_document(track)
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(FIELDS)}) VALUES (%s, %s, %s, %s, %s)",
+                [track.pk] + [document[field] for field in FIELDS]
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("player", "0014_chart_score"),
+    ]
+
+    operations = [
+        migrations.RunPython(refill_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,99 @@
+# Search index table for databases without FTS5, see player/search_index.py
+
+import re
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+from pytils.translit import translify
+
+# Frozen copy of the tokeniser of player/search_index.py as of this migration
+FTS_TABLE = 'player_track_search'
+FIELD_WEIGHTS = {'name': 10.0, 'artists': 5.0, 'albums': 2.0, 'lyrics': 1.0}
+TOKEN_MAX_LENGTH = 64
+WORD_RE = re.compile(r'\w+')
+FOLDS = (('kh', 'h'), ('ts', 'c'), ('j', 'y'))
+
+
+def normalize_word(word):
+    """Lower-case and transliterate a single word"""
+    word = word.lower().replace('ё', 'е')
+    try:
+        word = translify(word)
+    except ValueError:
+        # not a russian word, index it as is
+        pass
+    return ''.join(WORD_RE.findall(word))
+
+
+def word_forms(token):
+    """Distinct forms of a normalised token: as typed and folded"""
+    folded = token
+    for variant, replacement in FOLDS:
+        folded = folded.replace(variant, replacement)
+    return (token,) if folded == token else (token, folded)
+
+
+def index_text(text):
+    """Indexed text with every token in all of its forms"""
+    tokens = [token for token in map(normalize_word, WORD_RE.findall(text or '')) if token]
+    return ' '.join(form for token in tokens for form in word_forms(token))
+
+
+def token_weights(track):
+    """{token: weight} of track, summed over the fields a token occurs in"""
+    artists = [track.main_author.name] + [artist.name for artist in track.featured_authors.all()]
+    albums = [album.name for album in track.albums.all()]
+    document = {
+        'name': index_text(track.name),
+        'artists': index_text(' '.join(artists)),
+        'albums': index_text(' '.join(albums)),
+        'lyrics': index_text(track.lyrics),
+    }
+    weights = defaultdict(float)
+    for field, text in document.items():
+        for token in text.split():
+            weights[token[:TOKEN_MAX_LENGTH]] += FIELD_WEIGHTS[field]
+    return weights
+
+
+def fill_search_tokens(apps, schema_editor):
+    """Index every track into SearchToken where the FTS5 table is not available"""
+    if FTS_TABLE in schema_editor.connection.introspection.table_names():
+        return
+    track_model = apps.get_model('player', 'Track')
+    token_model = apps.get_model('player', 'SearchToken')
+    tracks = (track_model.objects.select_related('main_author')
+              .prefetch_related('featured_authors', 'albums'))
+    rows = []
+    for track in tracks.iterator(chunk_size=2000):
+        rows.extend(token_model(token=token, track_id=track.pk, weight=weight)
+                    for token, weight in token_weights(track).items())
+        if len(rows) >= 10000:
+            token_model.objects.bulk_create(rows, batch_size=2000)
+            rows = []
+    token_model.objects.bulk_create(rows, batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('player', '0015_search_index_word_forms'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64)),
+                ('weight', models.FloatField()),
+                ('track', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='player.track')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['token'], name='search_token_prefix', opclasses=['varchar_pattern_ops'])],
+                'constraints': [models.UniqueConstraint(fields=('token', 'track'), name='unique_search_token')],
+            },
+        ),
+        migrations.RunPython(fill_search_tokens, migrations.RunPython.noop),
+    ]
@@ -1,12 +1,16 @@
 """Models of Player"""
-import os
+import logging
 
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.urls import reverse
 from django.utils import timezone
 from pytils.translit import slugify
-from mutagen.mp3 import MP3
+from mutagen import MutagenError
+
+from .audio_analysis import read_mp3_duration
+
+logger = logging.getLogger(__name__)
 
 
 class PlayerUser(AbstractUser):
@@ -96,7 +100,7 @@ class Track(models.Model):
     logo = models.ImageField(upload_to="tracks_logo/", blank=False, null=True) # logo of track
     mp3 = models.FileField(upload_to="tracks/", blank=False, null=True) # mp3 of track
     lyrics = models.TextField(blank=True, null=True)
-    duration = models.CharField(default=0, max_length=32)
+    duration = models.PositiveIntegerField(default=0) # duration in seconds
     is_published = models.BooleanField(choices=Status.choices, default=Status.PUBLISHED)
 
     play_count = models.IntegerField(default=0)
@@ -108,30 +112,114 @@ class Track(models.Model):
     def __str__(self):
         return f"{self.name} - {self.main_author}"
 
+    def get_stream_url(self):
+        """return url for streaming track mp3"""
+        return reverse('stream_track', kwargs={'track_id': self.pk})
+
     class Meta: # pylint: disable=R0903
         """Ordering params"""
         ordering = ['id']
         indexes = [
             models.Index(fields=['id']),  # order-by-id
+            # keyset pagination: (key, id) row comparisons
+            models.Index(fields=['publication_time', 'id']),
+            models.Index(fields=['play_count', 'id']),
         ]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remembering loaded mp3 name to detect file changes"""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_mp3_name = dict(zip(field_names, values)).get('mp3') # pylint: disable=W0212
+        return instance
+
+    def mp3_changed(self):
+        """True when mp3 file was set or replaced"""
+        # unknown durations are backfilled by `manage.py update_durations`, not on every save
+        if not self.mp3:
+            return False
+        return self.mp3.name != getattr(self, '_loaded_mp3_name', None)
+
     def save(self, *args, **kwargs):
-        """Auto compute of track duration"""
-        if self.mp3:
-            mp3_path = self.mp3.path # pylint: disable=no-member
-            if os.path.exists(mp3_path):
-                audio = MP3(mp3_path)
-                duration_seconds = int(audio.info.length)
+        """Remembering saved mp3 name, whether it changed is kept for post_save handlers"""
+        # checked before saving: a file of the same content keeps its CAS name
+        self.saved_new_mp3 = self.mp3_changed() # pylint: disable=W0201
+        super().save(*args, **kwargs)
+        self._loaded_mp3_name = self.mp3.name # pylint: disable=W0201
+
+    def update_duration(self):
+        """Read duration from mp3 file and store only this field"""
+        if not self.mp3 or not self.mp3.storage.exists(self.mp3.name):
+            return
+        try:
+            self.duration = read_mp3_duration(self.mp3.path) # pylint: disable=no-member
+        except MutagenError:
+            logger.warning("Can not read duration of %s", self.mp3.name)
+            return
+        Track.objects.filter(pk=self.pk).update(duration=self.duration)
+
+class TrackAnalysis(models.Model):
+    """Waveform peaks and loudness of track mp3, see player/audio_analysis.py"""
+    track = models.OneToOneField(Track, on_delete=models.CASCADE, related_name='analysis')
+    mp3_name = models.CharField(max_length=255) # analysed file
+    peaks = models.BinaryField() # uint8 per point
+    loudness = models.FloatField(null=True) # integrated, LUFS
+    replay_gain = models.FloatField(null=True) # dB to TRACK_LOUDNESS_TARGET
+    method = models.CharField(max_length=16)
+    time_updated = models.DateTimeField(auto_now=True)
 
-                hours, remainder = divmod(duration_seconds, 3600)
-                minutes, seconds = divmod(remainder, 60)
+    # Models Managers
+    objects = models.Manager()
 
-                if hours:
-                    self.duration = f"{hours}.{minutes:02}.{seconds:02}"
-                else:
-                    self.duration = f"{minutes}.{seconds:02}"
+    def __str__(self):
+        return f'Analysis of {self.track_id}' # pylint: disable=E1101
 
-        super().save(*args, **kwargs)
+class SearchToken(models.Model):
+    """Weighted token of track search document, see player/search_index.py"""
+    token = models.CharField(max_length=64)
+    track = models.ForeignKey(Track, on_delete=models.CASCADE, related_name='+')
+    weight = models.FloatField()
+
+    # Models Managers
+    objects = models.Manager()
+
+    def __str__(self):
+        return f'{self.token} in {self.track_id}' # pylint: disable=no-member
+
+    class Meta: # pylint: disable=R0903
+        """One row per token of a track, prefix lookups by token"""
+        constraints = [
+            models.UniqueConstraint(fields=['token', 'track'], name='unique_search_token'),
+        ]
+        indexes = [
+            # LIKE 'prefix%' on PostgreSQL, other backends ignore opclasses
+            models.Index(fields=['token'], name='search_token_prefix',
+                         opclasses=['varchar_pattern_ops']),
+        ]
+
+class ArtistTrack(models.Model):
+    """Denormalised membership of artist in track, maintained by signals"""
+    class Role(models.IntegerChoices): # pylint: disable=R0901
+        """Role of artist in track"""
+        MAIN = 0, 'Основной'
+        FEATURED = 1, 'Приглашённый'
+
+    artist = models.ForeignKey(Artist, on_delete=models.CASCADE, related_name='track_links')
+    track = models.ForeignKey(Track, on_delete=models.CASCADE, related_name='artist_links')
+    role = models.PositiveSmallIntegerField(choices=Role.choices)
+
+    # Models Managers
+    objects = models.Manager()
+
+    def __str__(self):
+        return f'{self.artist_id} in {self.track_id} ({self.get_role_display()})' # pylint: disable=E1101
+
+    class Meta: # pylint: disable=R0903
+        """Unique membership, also serves artist -> tracks lookups"""
+        constraints = [
+            models.UniqueConstraint(fields=['artist', 'track', 'role'],
+                                    name='unique_artist_track_role'),
+        ]
 
 class AlbumPublishedManager(models.Manager): # pylint: disable=R0903
     """Class-manager selects published albums"""
@@ -192,7 +280,8 @@ class Playlist(models.Model):
 
     owner = models.ForeignKey(PlayerUser, on_delete=models.PROTECT)
     added_users = models.ManyToManyField(PlayerUser, related_name='friends', blank=True)
-    tracks = models.ManyToManyField(Track, related_name='playlists', blank=True)
+    tracks = models.ManyToManyField(Track, through='PlaylistTrack', related_name='playlists',
+                                    blank=True)
 
     logo = models.ImageField(upload_to="playlists/", blank=False, null=True)
     is_public = models.BooleanField(choices=tuple(map(lambda x: (bool(x[0]), x[1]), Status.choices))
@@ -218,3 +307,98 @@ class Playlist(models.Model):
         if not self.slug:
             self.slug = slugify(self.name)
         super().save(*args, **kwargs)
+
+class PlaylistTrack(models.Model):
+    """Track of playlist at a sortable position, see player/playlist_tracks.py"""
+    playlist = models.ForeignKey(Playlist, on_delete=models.CASCADE, related_name='track_links')
+    track = models.ForeignKey(Track, on_delete=models.CASCADE, related_name='playlist_links')
+    position = models.BigIntegerField() # gaps are left between neighbours
+    time_added = models.DateTimeField(auto_now_add=True)
+
+    # Models Managers
+    objects = models.Manager()
+
+    def __str__(self):
+        return f'{self.track_id} in {self.playlist_id} at {self.position}' # pylint: disable=E1101
+
+    class Meta: # pylint: disable=R0903
+        """Unique membership, playlist is read in position order"""
+        constraints = [
+            models.UniqueConstraint(fields=['playlist', 'track'], name='unique_playlist_track'),
+        ]
+        indexes = [
+            models.Index(fields=['playlist', 'position', 'id']),  # order of playlist
+        ]
+
+class BackgroundTask(models.Model):
+    """Queued call of a registered task, see player/tasks.py"""
+    class Status(models.IntegerChoices): # pylint: disable=R0901
+        """Choices for task status"""
+        PENDING = 0, 'Ожидает'
+        RUNNING = 1, 'Выполняется'
+        FAILED = 2, 'Ошибка'
+
+    name = models.CharField(max_length=255) # dotted path of task function
+    args = models.JSONField(default=list)
+    status = models.PositiveSmallIntegerField(choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True) # visibility timeout
+    locked_by = models.CharField(max_length=64, blank=True)
+    last_error = models.TextField(blank=True)
+
+    time_created = models.DateTimeField(auto_now_add=True)
+
+    # Models Managers
+    objects = models.Manager()
+
+    def __str__(self):
+        return f'{self.name}{tuple(self.args)} ({self.get_status_display()})' # pylint: disable=E1101
+
+    class Meta: # pylint: disable=R0903
+        """Ordering params"""
+        ordering = ['run_after', 'id']
+        indexes = [
+            models.Index(fields=['status', 'run_after']),  # claiming due tasks
+        ]
+
+class ChartScore(models.Model):
+    """Time-decayed play score of a track, artist or genre, see player/charts.py"""
+    class Kind(models.IntegerChoices): # pylint: disable=R0901
+        """Kind of charted object"""
+        TRACK = 0, 'Трек'
+        ARTIST = 1, 'Исполнитель'
+        GENRE = 2, 'Жанр'
+
+    kind = models.PositiveSmallIntegerField(choices=Kind.choices)
+    object_id = models.BigIntegerField() # id of track, artist or genre
+    # genre of the track, on track rows only
+    genre = models.ForeignKey(Genre, on_delete=models.CASCADE, null=True, related_name='+')
+    score = models.FloatField(default=0) # plays weighted by 2 ** (age at ChartEpoch / half-life)
+
+    # Models Managers
+    objects = models.Manager()
+
+    def __str__(self):
+        return f'{self.get_kind_display()} {self.object_id}: {self.score}' # pylint: disable=E1101
+
+    class Meta: # pylint: disable=R0903
+        """Unique score per object, charts are read by score"""
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='unique_chart_object'),
+        ]
+        indexes = [
+            models.Index(fields=['kind', '-score', 'object_id']),  # global charts
+            models.Index(fields=['kind', 'genre', '-score', 'object_id']),  # genre charts of tracks
+        ]
+
+class ChartEpoch(models.Model):
+    """Reference time of chart scores, a single row"""
+    epoch = models.DateTimeField()
+
+    # Models Managers
+    objects = models.Manager()
+
+    def __str__(self):
+        return f'Charts since {self.epoch}'
@@ -0,0 +1,204 @@
+"""Module with keyset (cursor) pagination
+
+Pages are selected with a `WHERE (key1, key2, ...) > (cursor values)`
+condition over an ordering which ends with a unique column, so neither
+`COUNT(*)` nor `OFFSET` is issued and deep pages cost the same as the
+first one. Cursors are opaque url-safe strings.
+"""
+import base64
+import binascii
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    """Cursor can not be decoded"""
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """JSON encoder keeping microseconds, DjangoJSONEncoder cuts times to milliseconds"""
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(payload):
+    """Opaque cursor string from JSON-serializable payload"""
+    raw = json.dumps(payload, cls=CursorEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Payload of cursor string, raises InvalidCursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        return json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as exc:
+        raise InvalidCursor(cursor) from exc
+
+
+class KeysetPage:
+    """Page of objects with cursors of the neighbouring pages"""
+    def __init__(self, object_list, next_cursor, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        """Whether there are objects after the page"""
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        """Whether there are objects before the page"""
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+
+class KeysetPaginator:
+    """Cursor paginator over queryset ordered by `ordering`
+
+    The last ordering key must be unique (usually 'id' or '-id'). Keys may
+    name annotations, e.g. the position of a track in a playlist.
+    """
+    def __init__(self, queryset, ordering, page_size):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.page_size = page_size
+        self.keys = [(key.lstrip('-'), key.startswith('-')) for key in self.ordering]
+
+    def _values(self, obj):
+        return [getattr(obj, field) for field, _ in self.keys]
+
+    def cursor_for(self, obj, inclusive=False, backwards=False):
+        """Cursor of the page after obj (at obj when inclusive, before obj when backwards)"""
+        payload = {'v': self._values(obj), 'i': inclusive}
+        if backwards:
+            payload['b'] = True
+        return encode_cursor(payload)
+
+    def _field(self, name):
+        """Model field or annotation output field of an ordering key"""
+        annotation = self.queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        return self.queryset.model._meta.get_field(name)  # pylint: disable=W0212
+
+    def _parse(self, cursor):
+        payload = decode_cursor(cursor)
+        try:
+            values = payload['v']
+            if len(values) != len(self.keys):
+                raise InvalidCursor(cursor)
+            values = [self._field(field).to_python(value)
+                      for (field, _), value in zip(self.keys, values)]
+        except (KeyError, TypeError, ValidationError) as exc:
+            raise InvalidCursor(cursor) from exc
+        return values, bool(payload.get('i')), bool(payload.get('b'))
+
+    def _condition(self, values, inclusive, backwards):
+        """Q selecting rows after (before when backwards) values in ordering"""
+        condition = Q()
+        equal = Q()
+        for index, ((field, descending), value) in enumerate(zip(self.keys, values)):
+            is_last = index == len(self.keys) - 1
+            lookup = 'lt' if descending != backwards else 'gt'
+            if inclusive and is_last:
+                lookup += 'e'
+            condition |= equal & Q(**{f'{field}__{lookup}': value})
+            equal &= Q(**{field: value})
+        return condition
+
+    def _query(self, cursor):
+        """(queryset of up to page_size + 1 rows, backwards, has_previous) for cursor"""
+        if not cursor:
+            return self.queryset.order_by(*self.ordering)[:self.page_size + 1], False, False
+
+        values, inclusive, backwards = self._parse(cursor)
+        condition = self._condition(values, inclusive, backwards)
+        if backwards:
+            reverse_ordering = [key[1:] if key.startswith('-') else f'-{key}'
+                                for key in self.ordering]
+            queryset = self.queryset.filter(condition).order_by(*reverse_ordering)
+            return queryset[:self.page_size + 1], True, None
+
+        # a forward cursor is made from an object, so something precedes the page
+        queryset = self.queryset.filter(condition).order_by(*self.ordering)
+        return queryset[:self.page_size + 1], False, not inclusive
+
+    def _make_page(self, object_list, backwards, has_previous):
+        if backwards:
+            has_previous = len(object_list) > self.page_size
+            object_list = object_list[:self.page_size][::-1]
+            return KeysetPage(
+                object_list,
+                self.cursor_for(object_list[-1]) if object_list else None,
+                self.cursor_for(object_list[0], backwards=True) if has_previous else None,
+            )
+
+        next_cursor = None
+        if len(object_list) > self.page_size:
+            object_list = object_list[:self.page_size]
+            next_cursor = self.cursor_for(object_list[-1])
+        previous_cursor = None
+        if has_previous and object_list:
+            previous_cursor = self.cursor_for(object_list[0], backwards=True)
+        return KeysetPage(object_list, next_cursor, previous_cursor)
+
+    def page(self, cursor=None):
+        """Page after cursor, raises InvalidCursor on a malformed cursor"""
+        queryset, backwards, has_previous = self._query(cursor)
+        return self._make_page(list(queryset), backwards, has_previous)
+
+    async def apage(self, cursor=None):
+        """Async version of page()"""
+        queryset, backwards, has_previous = self._query(cursor)
+        return self._make_page([obj async for obj in queryset], backwards, has_previous)
+
+
+class SequencePaginator:
+    """Cursor paginator over an already ordered and bounded sequence
+
+    Used for ranked search results, which have no orderable column; the
+    cursor keeps the position in the sequence.
+    """
+    def __init__(self, object_list, page_size):
+        self.object_list = object_list
+        self.page_size = page_size
+
+    def cursor_at(self, offset):
+        """Cursor of the page starting at offset"""
+        return encode_cursor({'o': offset})
+
+    def page(self, cursor=None):
+        """Page at cursor, raises InvalidCursor on a malformed cursor"""
+        offset = 0
+        if cursor:
+            try:
+                offset = max(int(decode_cursor(cursor)['o']), 0)
+            except (KeyError, TypeError, ValueError) as exc:
+                raise InvalidCursor(cursor) from exc
+
+        object_list = list(self.object_list[offset:offset + self.page_size + 1])
+        next_cursor = None
+        if len(object_list) > self.page_size:
+            object_list = object_list[:self.page_size]
+            next_cursor = self.cursor_at(offset + self.page_size)
+        previous_cursor = None
+        if offset > 0:
+            previous_cursor = self.cursor_at(max(offset - self.page_size, 0))
+        return KeysetPage(object_list, next_cursor, previous_cursor)
@@ -0,0 +1,191 @@
+"""Module with buffered ingestion of track play events
+
+Play events are accumulated in a per-process counter and written to the
+database in batches: one `UPDATE ... SET play_count = play_count + n` per
+distinct increment instead of one row write per play. A batch is written
+when it is full, or by a timer thread once its first play is
+PLAY_COUNT_FLUSH_INTERVAL seconds old, so plays of a quiet process are
+not held back until the next one arrives. Counts that could not
+be written (e.g. the database was locked) are appended to a spool file and
+replayed later by the `flush_play_counts` management command, one drain at
+a time under a lock file. The same batches feed the trending charts, see
+player/charts.py.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+
+from . import charts
+from .models import Track
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of one process are serialised
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DRAIN_LOCK_NAME = 'drain.lock'
+
+_drain_lock = threading.Lock()
+
+
+def apply_play_counts(counts):
+    """Write {track_id: increment} to the database with F()-based bulk updates"""
+    by_increment = defaultdict(list)
+    for track_id, increment in counts.items():
+        by_increment[increment].append(track_id)
+
+    with transaction.atomic():
+        for increment, track_ids in by_increment.items():
+            Track.objects.filter(id__in=track_ids).update(
+                play_count=F('play_count') + increment
+            )
+        charts.record(counts)
+
+
+def get_spool_dir():
+    """Directory for play counts which were not written yet"""
+    return str(settings.PLAY_COUNT_SPOOL_DIR)
+
+
+def spool_play_counts(counts):
+    """Append counts to this process's spool file"""
+    spool_dir = get_spool_dir()
+    os.makedirs(spool_dir, exist_ok=True)
+    path = os.path.join(spool_dir, f"plays-{os.getpid()}.jsonl")
+    with open(path, "a", encoding="utf-8") as file:
+        file.write(json.dumps(counts) + "\n")
+
+
+@contextmanager
+def locked_spool(spool_dir):
+    """Exclusive access to the spool for one drain at a time"""
+    with _drain_lock, open(os.path.join(spool_dir, DRAIN_LOCK_NAME), 'a',
+                           encoding='utf-8') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+
+def drain_spool(apply=apply_play_counts):
+    """Replay all spool files, returns number of plays written"""
+    spool_dir = get_spool_dir()
+    if not os.path.isdir(spool_dir):
+        return 0
+
+    total = 0
+    with locked_spool(spool_dir):
+        for file_name in sorted(os.listdir(spool_dir)):
+            path = os.path.join(spool_dir, file_name)
+            if file_name.endswith(".jsonl"):
+                processing_path = path[:-len(".jsonl")] + ".processing"
+                try:
+                    os.replace(path, processing_path)
+                except FileNotFoundError:
+                    continue
+            elif file_name.endswith(".processing"):
+                # left over by an interrupted drain, no other drain holds the lock
+                processing_path = path
+            else:
+                continue
+
+            counts = Counter()
+            with open(processing_path, "r", encoding="utf-8") as file:
+                for line in file:
+                    if line.strip():
+                        counts.update({int(k): v for k, v in json.loads(line).items()})
+
+            apply(dict(counts))
+            os.remove(processing_path)
+            total += sum(counts.values())
+    return total
+
+
+class PlayCountBuffer:
+    """Thread-safe in-process buffer of play events"""
+    def __init__(self, flush_size=None, flush_interval=None):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._counts = Counter()
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def add(self, track_id, count=1):
+        """Register plays of track, flushes when the batch is full or stale"""
+        with self._lock:
+            self._counts[track_id] += count
+            self._pending += count
+            should_flush = self._should_flush()
+            if not should_flush and self._timer is None:
+                self._start_timer()
+        if should_flush:
+            self.flush()
+
+    def _flush_interval(self):
+        return self.flush_interval or settings.PLAY_COUNT_FLUSH_INTERVAL
+
+    def _should_flush(self):
+        flush_size = self.flush_size or settings.PLAY_COUNT_FLUSH_SIZE
+        return (self._pending >= flush_size
+                or time.monotonic() - self._last_flush >= self._flush_interval())
+
+    def _start_timer(self):
+        """Flush buffered plays after the interval even if no play follows"""
+        self._timer = threading.Timer(self._flush_interval(), self._flush_stale)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _flush_stale(self):
+        try:
+            self.flush()
+        finally:
+            # connections of the timer thread are not closed by any request
+            connections.close_all()
+
+    def take(self):
+        """Atomically take buffered counts and reset the buffer"""
+        with self._lock:
+            counts, self._counts = dict(self._counts), Counter()
+            self._pending = 0
+            self._last_flush = time.monotonic()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        return counts
+
+    def flush(self):
+        """Write buffered counts, spooling them to disk on failure"""
+        counts = self.take()
+        if not counts:
+            return 0
+        try:
+            apply_play_counts(counts)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Play counts flush failed, spooling %s tracks", len(counts))
+            spool_play_counts(counts)
+        return sum(counts.values())
+
+    def __len__(self):
+        with self._lock:
+            return self._pending
+
+
+play_buffer = PlayCountBuffer()
+
+
+@atexit.register
+def _flush_on_exit():
+    """Do not lose buffered plays when a worker shuts down"""
+    play_buffer.flush()
@@ -0,0 +1,189 @@
+"""Module with play queues of player contexts
+
+A queue is the ordered list of tracks the player walks through on a page
+(home, artist, album, playlist, search or chart). It is served as JSON in
+pages with keyset cursors, so the client switches tracks without reloading.
+Every query function has an `a`-prefixed async twin used by the ASGI views.
+"""
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from django.http import Http404
+from django.shortcuts import aget_object_or_404, get_object_or_404
+from django.urls import reverse
+
+from . import artist_tracks, charts, playlist_tracks, search_index, thumbnails
+from .models import Album, Artist, Genre, Playlist, Track
+from .pagination import KeysetPaginator, SequencePaginator
+
+
+def track_payload(track):
+    """JSON-serializable metadata used by the player"""
+    return {
+        'id': track.pk,
+        'name': track.name,
+        'author': track.main_author.name,
+        'author_url': track.main_author.get_absolute_url(),
+        'logo': thumbnails.thumbnail_url(track.logo, 'cover'),
+        'src': track.get_stream_url(),
+        'play_url': reverse('register_play', kwargs={'track_id': track.pk}),
+        'waveform_url': reverse('track_waveform', kwargs={'track_id': track.pk}),
+        'duration': track.duration,
+    }
+
+
+def track_payloads(tracks):
+    """Payloads of tracks"""
+    return [track_payload(track) for track in tracks]
+
+
+def context_object(context, params):
+    """(model, lookup) of the object whose tracks form the queue, None for home"""
+    if context == 'home':
+        return None
+    if context == 'artist':
+        return Artist, {'slug': params.get('slug')}
+    if context == 'album':
+        return Album, {'main_author__slug': params.get('artist_slug'), 'slug': params.get('slug')}
+    if context == 'playlist':
+        return Playlist, {'slug': params.get('slug')}
+    raise Http404(f"Unknown queue context {context}")
+
+
+def tracks_of(context, obj):
+    """Queryset and ordering of tracks of the context object"""
+    if context == 'home':
+        return Track.published.all(), ('id',)
+    if context == 'artist':
+        return artist_tracks.tracks_of(obj), ('-publication_time', '-id')
+    if context == 'playlist':
+        return playlist_tracks.ordered_tracks(obj), playlist_tracks.TRACK_ORDERING
+    return obj.tracks.all(), ('id',)
+
+
+def get_tracks(context, params):
+    """Queryset and ordering of tracks for a keyset-paginated context"""
+    lookup = context_object(context, params)
+    obj = get_object_or_404(lookup[0], **lookup[1]) if lookup else None
+    return tracks_of(context, obj)
+
+
+async def aget_tracks(context, params):
+    """Async version of get_tracks()"""
+    lookup = context_object(context, params)
+    obj = await aget_object_or_404(lookup[0], **lookup[1]) if lookup else None
+    return tracks_of(context, obj)
+
+
+def get_queue_page(context, params, cursor=None, start=None, limit=100):
+    """{'tracks': [...], 'next_cursor': str or None} of the context queue
+
+    `start` is a track id the queue should begin with when no cursor is given.
+    Raises pagination.InvalidCursor and Http404.
+    """
+    if context == 'search':
+        return get_search_page(params.get('query', ''), cursor, start, limit)
+    if context == 'chart':
+        return get_chart_page(params.get('genre'), cursor, start, limit)
+
+    tracks, ordering = get_tracks(context, params)
+    paginator = KeysetPaginator(tracks.select_related('main_author'), ordering, limit)
+    if not cursor and start:
+        start_track = tracks.filter(pk=start).first()
+        if start_track is not None:
+            cursor = paginator.cursor_for(start_track, inclusive=True)
+
+    page = paginator.page(cursor)
+    return {
+        'tracks': track_payloads(page),
+        'next_cursor': page.next_cursor,
+    }
+
+
+async def aget_queue_page(context, params, cursor=None, start=None, limit=100):
+    """Async version of get_queue_page()
+
+    Payloads are built in a worker thread, as thumbnail urls may hit the cache.
+    """
+    if context == 'search':
+        return await aget_search_page(params.get('query', ''), cursor, start, limit)
+    if context == 'chart':
+        return await aget_chart_page(params.get('genre'), cursor, start, limit)
+
+    tracks, ordering = await aget_tracks(context, params)
+    paginator = KeysetPaginator(tracks.select_related('main_author'), ordering, limit)
+    if not cursor and start:
+        start_track = await tracks.filter(pk=start).afirst()
+        if start_track is not None:
+            cursor = paginator.cursor_for(start_track, inclusive=True)
+
+    page = await paginator.apage(cursor)
+    return {
+        'tracks': await sync_to_async(track_payloads, thread_sensitive=False)(page),
+        'next_cursor': page.next_cursor,
+    }
+
+
+def ranked_page(track_ids, cursor, start, limit):
+    """Queue page over an already ordered list of track ids"""
+    paginator = SequencePaginator(track_ids, limit)
+    if not cursor and start and start in track_ids:
+        cursor = paginator.cursor_at(track_ids.index(start))
+
+    page = paginator.page(cursor)
+    tracks = Track.objects.select_related('main_author').in_bulk(page.object_list)
+    return {
+        'tracks': [track_payload(tracks[pk]) for pk in page if pk in tracks],
+        'next_cursor': page.next_cursor,
+    }
+
+
+async def aranked_page(track_ids, cursor, start, limit):
+    """Async version of ranked_page()"""
+    paginator = SequencePaginator(track_ids, limit)
+    if not cursor and start and start in track_ids:
+        cursor = paginator.cursor_at(track_ids.index(start))
+
+    page = paginator.page(cursor)
+    tracks = await Track.objects.select_related('main_author').ain_bulk(page.object_list)
+    return {
+        'tracks': await sync_to_async(track_payloads, thread_sensitive=False)(
+            [tracks[pk] for pk in page if pk in tracks]
+        ),
+        'next_cursor': page.next_cursor,
+    }
+
+
+def get_search_page(query, cursor, start, limit):
+    """Queue page over ranked search results"""
+    return ranked_page(search_index.search_track_ids(query), cursor, start, limit)
+
+
+async def aget_search_page(query, cursor, start, limit):
+    """Async version of get_search_page()"""
+    track_ids = await sync_to_async(search_index.search_track_ids)(query)
+    return await aranked_page(track_ids, cursor, start, limit)
+
+
+def chart_track_ids(genre_slug):
+    """Ids of the chart of genre (global without slug), raises Http404"""
+    genre = get_object_or_404(Genre, slug=genre_slug) if genre_slug else None
+    return charts.top_track_ids(genre)
+
+
+def get_chart_page(genre_slug, cursor, start, limit):
+    """Queue page over a trending chart"""
+    return ranked_page(chart_track_ids(genre_slug), cursor, start, limit)
+
+
+async def aget_chart_page(genre_slug, cursor, start, limit):
+    """Async version of get_chart_page()"""
+    track_ids = await sync_to_async(chart_track_ids)(genre_slug)
+    return await aranked_page(track_ids, cursor, start, limit)
+
+
+def get_queue_url(context, **params):
+    """Url of the queue endpoint for a context"""
+    query = urlencode({key: value for key, value in params.items() if value})
+    url = reverse('play_queue', kwargs={'context': context})
+    return f'{url}?{query}' if query else url
@@ -0,0 +1,68 @@
+"""Module with cached playlist sidebar of a user
+
+The sidebar lists playlists the user owns and playlists the user was added
+to as plain dicts (id, name, slug, url, logo url, owner name). It is stored
+per user in the cache and deleted by signal handlers whenever one of the
+listed playlists, its `added_users` or its owner changes, so on a warm cache
+rendering the sidebar issues no queries. The cache must be shared by all
+worker processes (see CACHES in ml_music/settings_production.py), otherwise
+the deletions only reach the process which handled the change.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from . import thumbnails
+from .models import Playlist
+
+
+def cache_key(user_id):
+    """Cache key of user's sidebar"""
+    return f'player:playlist_sidebar:{user_id}'
+
+
+def invalidate(user_ids):
+    """Drop cached sidebars of users"""
+    cache.delete_many([cache_key(user_id) for user_id in set(user_ids)])
+
+
+def playlist_payload(playlist):
+    """Template data of a playlist"""
+    return {
+        'id': playlist.pk,
+        'name': playlist.name,
+        'slug': playlist.slug,
+        'url': playlist.get_absolute_url(),
+        'logo': thumbnails.thumbnail_url(playlist.logo, 'icon'),
+        'owner': playlist.owner.username,
+    }
+
+
+def build(user):
+    """Query sidebar: {'owned_playlists': [...], 'added_playlists': [...]}"""
+    playlists = Playlist.objects.select_related('owner').order_by('-time_created', '-id')
+    return {
+        'owned_playlists': [playlist_payload(playlist)
+                            for playlist in playlists.filter(owner=user)],
+        'added_playlists': [playlist_payload(playlist)
+                            for playlist in playlists.filter(added_users=user)],
+    }
+
+
+def get(user):
+    """Sidebar from cache, built on miss"""
+    key = cache_key(user.pk)
+    sidebar = cache.get(key)
+    if sidebar is None:
+        sidebar = build(user)
+        cache.set(key, sidebar, settings.PLAYLIST_SIDEBAR_CACHE_TIMEOUT)
+    return sidebar
+
+
+def audience(playlists):
+    """Ids of users whose sidebars show any of playlists"""
+    playlists = list(playlists)
+    user_ids = {playlist.owner_id for playlist in playlists}
+    user_ids.update(Playlist.added_users.through.objects # pylint: disable=E1101
+                    .filter(playlist_id__in=[playlist.pk for playlist in playlists])
+                    .values_list('playeruser_id', flat=True))
+    return user_ids
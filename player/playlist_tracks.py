@@ -0,0 +1,168 @@
+"""Module with ordered tracks of playlists
+
+Tracks of a playlist are `PlaylistTrack` rows sorted by (position, id).
+Appended tracks get positions PLAYLIST_POSITION_GAP apart, tracks inserted
+or moved between two neighbours take positions inside the gap between
+them, so an edit writes only the rows it adds or moves. When a gap is used
+up the rows after it are spread out again over a window which is doubled
+until it has room, which keeps renumbering local and rare.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+
+from .models import Playlist, PlaylistTrack, Track
+
+ORDERING = ('position', 'id')
+TRACK_ORDERING = ('playlist_position', 'id')
+MIN_WINDOW = 8
+
+
+class NotInPlaylist(ValueError):
+    """Track is not a track of the playlist"""
+
+
+def ordered_tracks(playlist):
+    """Tracks of playlist annotated with `playlist_position`, order by TRACK_ORDERING"""
+    return (Track.objects.filter(playlist_links__playlist=playlist)
+            .annotate(playlist_position=F('playlist_links__position')))
+
+
+def track_ids(playlist):
+    """Ids of tracks of playlist in order"""
+    return list(PlaylistTrack.objects.filter(playlist=playlist).order_by(*ORDERING)
+                .values_list('track_id', flat=True))
+
+
+def lock(playlist):
+    """Serialize edits of playlist until the end of the transaction"""
+    list(Playlist.objects.select_for_update().filter(pk=playlist.pk).values_list('pk'))
+
+
+def rows_after(row):
+    """Q of rows after row in playlist order"""
+    return Q(position__gt=row.position) | Q(position=row.position, id__gt=row.pk)
+
+
+def anchor_row(rows, track_id):
+    """Row of track_id among rows, raises NotInPlaylist"""
+    row = rows.filter(track_id=track_id).first()
+    if row is None:
+        raise NotInPlaylist(f"Track {track_id} is not in the playlist")
+    return row
+
+
+def neighbours(rows, before):
+    """(lower, upper) rows around the slot before row `before`, at the end when None"""
+    if before is None:
+        return rows.order_by('-position', '-id').first(), None
+    lower = (rows.exclude(pk=before.pk).exclude(rows_after(before))
+             .order_by('-position', '-id').first())
+    return lower, before
+
+
+def make_room(rows, lower, upper, count):
+    """Positions of count new rows between lower and upper, renumbers rows after a full gap"""
+    gap = settings.PLAYLIST_POSITION_GAP
+    if upper is None:
+        start = lower.position if lower else 0
+        return [start + gap * (index + 1) for index in range(count)]
+    if lower is None:
+        return [upper.position - gap * (count - index) for index in range(count)]
+    if upper.position - lower.position > count:
+        return spread(lower.position, upper.position, count)
+
+    size = max(count, MIN_WINDOW)
+    while True:
+        window = list(rows.filter(Q(pk=upper.pk) | rows_after(upper)).order_by(*ORDERING)
+                      [:size + 1])
+        total = count + len(window)
+        if len(window) <= size:
+            # the window reached the end of the playlist
+            positions = [lower.position + gap * (index + 1) for index in range(total)]
+            break
+        end = window.pop().position
+        total -= 1
+        if end - lower.position >= (total + 1) * gap // 2:
+            positions = spread(lower.position, end, total)
+            break
+        size *= 2
+
+    window = window[:total - count]
+    for row, position in zip(window, positions[count:]):
+        row.position = position
+    PlaylistTrack.objects.bulk_update(window, ['position'])
+    return positions[:count]
+
+
+def spread(lower, upper, count):
+    """count positions evenly spread strictly between lower and upper"""
+    span = upper - lower
+    return [lower + span * (index + 1) // (count + 1) for index in range(count)]
+
+
+@transaction.atomic
+def insert(playlist, ids, before=None):
+    """Add tracks which are not in playlist yet before track `before` (at the end when None)
+
+    Returns ids of added tracks, raises ValueError on unknown tracks.
+    """
+    lock(playlist)
+    rows = PlaylistTrack.objects.filter(playlist=playlist)
+    anchor = anchor_row(rows, before) if before is not None else None
+    present = set(rows.filter(track_id__in=ids).values_list('track_id', flat=True))
+    new_ids = [pk for pk in dict.fromkeys(ids) if pk not in present]
+    found = set(Track.objects.filter(pk__in=new_ids).values_list('id', flat=True))
+    if missing := [pk for pk in new_ids if pk not in found]:
+        raise ValueError(f"Unknown tracks {missing}")
+
+    positions = make_room(rows, *neighbours(rows, anchor), len(new_ids))
+    PlaylistTrack.objects.bulk_create(
+        PlaylistTrack(playlist=playlist, track_id=pk, position=position)
+        for pk, position in zip(new_ids, positions)
+    )
+    return new_ids
+
+
+def append(playlist, ids):
+    """Add tracks which are not in playlist yet at its end, ids of added tracks"""
+    return insert(playlist, ids)
+
+
+@transaction.atomic
+def move(playlist, ids, before=None):
+    """Move tracks of playlist before track `before` (to the end when None), in the given order
+
+    Returns ids of moved tracks, raises NotInPlaylist.
+    """
+    lock(playlist)
+    ids = list(dict.fromkeys(ids))
+    if before is not None and before in ids:
+        raise ValueError(f"Track {before} can not be moved before itself")
+    moved = {row.track_id: row
+             for row in PlaylistTrack.objects.filter(playlist=playlist, track_id__in=ids)}
+    if missing := [pk for pk in ids if pk not in moved]:
+        raise NotInPlaylist(f"Tracks {missing} are not in the playlist")
+
+    rows = PlaylistTrack.objects.filter(playlist=playlist).exclude(track_id__in=ids)
+    anchor = anchor_row(rows, before) if before is not None else None
+    positions = make_room(rows, *neighbours(rows, anchor), len(ids))
+    for pk, position in zip(ids, positions):
+        moved[pk].position = position
+    PlaylistTrack.objects.bulk_update(moved.values(), ['position'])
+    return ids
+
+
+def remove(playlist, ids):
+    """Remove tracks from playlist, ids of removed tracks"""
+    rows = PlaylistTrack.objects.filter(playlist=playlist, track_id__in=ids)
+    removed = list(rows.values_list('track_id', flat=True))
+    rows.delete()
+    return removed
+
+
+@transaction.atomic
+def replace(playlist, ids):
+    """Make ids the tracks of playlist, kept tracks keep their positions"""
+    PlaylistTrack.objects.filter(playlist=playlist).exclude(track_id__in=ids).delete()
+    return append(playlist, ids)
@@ -0,0 +1,247 @@
+"""Module with the "recommended for you" collaborative filtering model
+
+Interactions are read from playlists: the owner of a playlist and the
+users added to it interact with every track of it (weights in
+RECOMMENDER_WEIGHTS, summed over playlists). Play events carry no user,
+so they can not be used. Interactions form a sparse user x track matrix
+in CSR arrays (indptr, indices, data) built with NumPy only.
+
+The matrix is factorised with implicit-feedback ALS (Hu, Koren, Volinsky):
+confidence is 1 + RECOMMENDER_ALPHA * strength, every half-step solves the
+regularised least squares of all users (then all tracks) against the fixed
+other side. Instead of an f x f system per user the systems are solved
+with a few conjugate gradient steps started from the previous factors,
+vectorised over chunks of at most RECOMMENDER_CHUNK_SIZE interactions, so
+memory stays bounded; chunks run in a thread pool as NumPy releases the
+GIL in its kernels.
+
+Factors are stored in RECOMMENDER_DIR as generations of memory-mapped
+arrays like the similarity index (see player/generations.py) and shelves
+of top tracks per user are cached under a key of the model generation.
+Any cache backend works for shelves, as a new generation changes the key,
+but a shared one (see CACHES in ml_music/settings_production.py) computes
+each shelf once instead of once per worker process.
+"""
+import itertools
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from .generations import (array_path, load_array, load_current, read_meta,
+                          remove_generations, write_meta)
+from .models import PlaylistTrack, Track
+
+ARRAYS = ('user_ids', 'track_ids', 'user_factors', 'track_factors', 'indptr', 'indices')
+EPSILON = 1e-10
+
+
+def pairs_of(rows):
+    """(n, 2) int64 array of a values_list of id pairs, read in chunks"""
+    flat = itertools.chain.from_iterable(rows.iterator(chunk_size=10000))
+    return np.fromiter(flat, dtype=np.int64).reshape(-1, 2)
+
+
+def interactions():
+    """(user ids, track ids, strength) arrays of playlist interactions"""
+    weights = settings.RECOMMENDER_WEIGHTS
+    owners = pairs_of(PlaylistTrack.objects.values_list('playlist__owner_id', 'track_id'))
+    added = pairs_of(PlaylistTrack.objects.filter(playlist__added_users__isnull=False)
+                     .values_list('playlist__added_users', 'track_id'))
+    pairs = np.concatenate([owners, added])
+    strength = np.concatenate([np.full(len(owners), weights['owner'], dtype=np.float32),
+                               np.full(len(added), weights['added_user'], dtype=np.float32)])
+    return pairs[:, 0], pairs[:, 1], strength
+
+
+def build_matrix(user_ids, track_ids, strength):
+    """(user ids, track ids, (indptr, indices, data)) of the user x track CSR matrix
+
+    Repeated pairs are summed.
+    """
+    users, user_rows = np.unique(user_ids, return_inverse=True)
+    tracks, track_columns = np.unique(track_ids, return_inverse=True)
+    keys, cells = np.unique(user_rows.astype(np.int64) * len(tracks) + track_columns,
+                            return_inverse=True)
+    data = np.bincount(cells, weights=strength, minlength=len(keys)).astype(np.float32)
+    rows, indices = np.divmod(keys, len(tracks)) if len(tracks) else (keys, keys)
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=len(users)))])
+    return users, tracks, (indptr, indices, data)
+
+
+def transpose(matrix, columns):
+    """CSR arrays of the transposed matrix with columns rows"""
+    indptr, indices, data = matrix
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    order = np.argsort(indices, kind='stable')
+    counts = np.bincount(indices, minlength=columns)
+    return np.concatenate([[0], np.cumsum(counts)]), rows[order], data[order]
+
+
+def chunks(indptr, size):
+    """(first row, end row) ranges of about size interactions, a heavy row may exceed it"""
+    cuts = np.searchsorted(indptr, np.arange(size, indptr[-1], max(size, 1)))
+    bounds = np.unique(np.concatenate([[0], cuts, [len(indptr) - 1]]))
+    return [(int(first), int(end)) for first, end in zip(bounds[:-1], bounds[1:])]
+
+
+def solve_chunk(matrix, fixed, target, gram, steps, bounds):  # pylint: disable=R0913,R0914,R0917
+    """Conjugate gradient steps for rows first..end of target against fixed factors"""
+    indptr, indices, confidence = matrix
+    first, end = bounds
+    counts = np.diff(indptr[first:end + 1])
+    target[first:end][counts == 0] = 0
+    rows = np.flatnonzero(counts) + first
+    if not rows.size:
+        return
+    start = indptr[first]
+    offsets = indptr[rows] - start
+    owner = np.repeat(np.arange(len(rows)), counts[counts > 0])
+    factors = fixed[indices[start:indptr[end]]]
+    weight = confidence[start:indptr[end]]
+
+    def segment_sum(values):
+        return np.add.reduceat(values, offsets, axis=0)
+
+    def product(vectors):
+        """A @ v of every row: (YtY + Yt (C - I) Y + lambda I) v"""
+        projected = np.einsum('nf,nf->n', factors, vectors[owner])
+        return vectors @ gram + segment_sum(((weight - 1) * projected)[:, None] * factors)
+
+    solution = target[rows]
+    residual = segment_sum(weight[:, None] * factors) - product(solution)
+    direction = residual.copy()
+    norm = np.einsum('uf,uf->u', residual, residual)
+    for _ in range(steps):
+        applied = product(direction)
+        step = norm / np.maximum(np.einsum('uf,uf->u', direction, applied), EPSILON)
+        solution += step[:, None] * direction
+        residual -= step[:, None] * applied
+        new_norm = np.einsum('uf,uf->u', residual, residual)
+        direction = residual + (new_norm / np.maximum(norm, EPSILON))[:, None] * direction
+        norm = new_norm
+    target[rows] = solution
+
+
+def half_step(matrix, fixed, target, options, pool):
+    """Update all rows of target against fixed factors"""
+    gram = fixed.T @ fixed + options['regularization'] * np.eye(fixed.shape[1],
+                                                                dtype=np.float32)
+    list(pool.map(lambda bounds: solve_chunk(matrix, fixed, target, gram,
+                                             options['cg_steps'], bounds),
+                  chunks(matrix[0], options['chunk_size'])))
+
+
+def fit(matrix, shape, options, seed=0):
+    """(user factors, track factors) of implicit ALS on the CSR matrix of shape"""
+    rng = np.random.default_rng(seed)
+    factors = options['factors']
+    user_factors = (rng.standard_normal((shape[0], factors)) * 0.01).astype(np.float32)
+    track_factors = (rng.standard_normal((shape[1], factors)) * 0.01).astype(np.float32)
+    indptr, indices, data = matrix
+    by_user = (indptr, indices, (1 + options['alpha'] * data).astype(np.float32))
+    by_track = transpose(by_user, shape[1])
+    with ThreadPoolExecutor(options['workers']) as pool:
+        for _ in range(options['iterations']):
+            half_step(by_user, track_factors, user_factors, options, pool)
+            half_step(by_track, user_factors, track_factors, options, pool)
+    return user_factors, track_factors
+
+
+def default_options(**overrides):
+    """Training options from settings"""
+    options = {
+        'factors': settings.RECOMMENDER_FACTORS,
+        'iterations': settings.RECOMMENDER_ITERATIONS,
+        'regularization': settings.RECOMMENDER_REGULARIZATION,
+        'alpha': settings.RECOMMENDER_ALPHA,
+        'cg_steps': settings.RECOMMENDER_CG_STEPS,
+        'chunk_size': settings.RECOMMENDER_CHUNK_SIZE,
+        'workers': os.cpu_count() or 1,
+    }
+    options.update({key: value for key, value in overrides.items() if value is not None})
+    return options
+
+
+def train(**overrides):
+    """Train on current playlists and store the model, report dict"""
+    options = default_options(**overrides)
+    started = time.perf_counter()
+    users, tracks, matrix = build_matrix(*interactions())
+    user_factors, track_factors = fit(matrix, (len(users), len(tracks)), options)
+    generation = save({
+        'user_ids': users, 'track_ids': tracks,
+        'user_factors': user_factors, 'track_factors': track_factors,
+        'indptr': matrix[0], 'indices': matrix[1],
+    })
+    return {
+        'generation': generation,
+        'users': len(users),
+        'tracks': len(tracks),
+        'interactions': len(matrix[1]),
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+
+
+def save(arrays):
+    """Write arrays as a new generation of the model, its number"""
+    directory = str(settings.RECOMMENDER_DIR)
+    os.makedirs(directory, exist_ok=True)
+    previous = read_meta(directory)
+    generation = previous['generation'] + 1 if previous else 1
+    for name in ARRAYS:
+        np.save(array_path(directory, name, generation), arrays[name])
+    write_meta(directory, {'generation': generation})
+    remove_generations(directory, generation)
+    return generation
+
+
+class Model: # pylint: disable=R0903
+    """Memory-mapped factors of a trained generation"""
+    def __init__(self, directory, meta):
+        self.generation = generation = meta['generation']
+        self.user_ids = load_array(directory, 'user_ids', generation)
+        self.track_ids = load_array(directory, 'track_ids', generation)
+        self.user_factors = load_array(directory, 'user_factors', generation)
+        self.track_factors = load_array(directory, 'track_factors', generation)
+        self.indptr = load_array(directory, 'indptr', generation)
+        self.indices = load_array(directory, 'indices', generation)
+
+    def recommend(self, user_id, count):
+        """Ids of up to count best scored tracks the user has not interacted with"""
+        row = int(np.searchsorted(self.user_ids, user_id))
+        if row >= len(self.user_ids) or self.user_ids[row] != user_id or count <= 0:
+            return []
+        scores = self.track_factors @ self.user_factors[row]
+        scores[self.indices[self.indptr[row]:self.indptr[row + 1]]] = -np.inf
+        count = min(count, int(np.isfinite(scores).sum()))
+        if count <= 0:
+            return []
+        top = np.argpartition(-scores, count - 1)[:count]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [int(self.track_ids[index]) for index in top]
+
+
+def load_model():
+    """Model of RECOMMENDER_DIR, reopened when meta.json changes, None before training"""
+    return load_current(str(settings.RECOMMENDER_DIR), Model)
+
+
+def shelf(user):
+    """Recommended published tracks of user, cached per model generation"""
+    model = load_model()
+    if model is None:
+        return []
+    key = f'player:recommendations:{model.generation}:{user.pk}'
+    tracks = cache.get(key)
+    if tracks is None:
+        size = settings.RECOMMENDER_SHELF_SIZE
+        ids = model.recommend(user.pk, math.ceil(size * settings.RECOMMENDER_OVERFETCH))
+        found = Track.published.select_related('main_author').in_bulk(ids)
+        tracks = [found[pk] for pk in ids if pk in found][:size]
+        cache.set(key, tracks, settings.RECOMMENDER_CACHE_TIMEOUT)
+    return tracks
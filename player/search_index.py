@@ -0,0 +1,274 @@
+"""Module with full-text search index over tracks
+
+Each track is indexed as four weighted fields: track name, artist names,
+album names and lyrics. Text is normalised to transliterated lower-case
+Latin tokens with pytils, and spelling variants are folded, so "Люцифер",
+"lyutsifer" and "lyucifer" find the same track in either alphabet.
+
+On SQLite the index lives in an FTS5 virtual table (created by migration
+0007) and is ranked with bm25. Other backends use an inverted index in the
+`SearchToken` table, one row per token of a track with its field weight,
+ranked by weight times the inverse document frequency of the query prefix.
+Both live in the database, so every worker sees the same index, and both
+are kept in sync by the handlers in `player.signals`.
+"""
+import math
+import re
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import OperationalError, connection
+from django.db.models import Case, IntegerField, Q, Sum, When
+from pytils.translit import translify
+
+from .models import SearchToken, Track
+
+FTS_TABLE = 'player_track_search'
+FIELDS = ('name', 'artists', 'albums', 'lyrics')
+FIELD_WEIGHTS = {'name': 10.0, 'artists': 5.0, 'albums': 2.0, 'lyrics': 1.0}
+TOKEN_MAX_LENGTH = 64  # SearchToken.token, longer tokens are indexed by their prefix
+CANDIDATES_IN_QUERY = 500  # up to this many matches of a token are passed to the next query
+
+WORD_RE = re.compile(r'\w+')
+# Spelling variants of the same Cyrillic sounds; tokens are indexed both as
+# typed and folded, so a prefix matches before and after the fold point
+FOLDS = (('kh', 'h'), ('ts', 'c'), ('j', 'y'))
+
+
+def normalize_word(word):
+    """Lower-case and transliterate a single word"""
+    word = word.lower().replace('ё', 'е')
+    try:
+        word = translify(word)
+    except ValueError:
+        # not a russian word, index it as is
+        pass
+    return ''.join(WORD_RE.findall(word))
+
+
+def fold_word(word):
+    """Word with spelling variants folded"""
+    for variant, folded in FOLDS:
+        word = word.replace(variant, folded)
+    return word
+
+
+def word_forms(token):
+    """Distinct forms of a normalised token: as typed and folded"""
+    folded = fold_word(token)
+    return (token,) if folded == token else (token, folded)
+
+
+def tokenize(text):
+    """Split text into normalised tokens"""
+    if not text:
+        return []
+    return [token for token in map(normalize_word, WORD_RE.findall(text)) if token]
+
+
+def index_text(text):
+    """Indexed text with every token in all of its forms"""
+    return ' '.join(form for token in tokenize(text) for form in word_forms(token))
+
+
+def track_document(track):
+    """Searchable fields of track as {field: normalised text}"""
+    artists = [track.main_author.name] + [artist.name for artist in track.featured_authors.all()]
+    albums = [album.name for album in track.albums.all()]
+    return {
+        'name': index_text(track.name),
+        'artists': index_text(' '.join(artists)),
+        'albums': index_text(' '.join(albums)),
+        'lyrics': index_text(track.lyrics),
+    }
+
+
+def tracks_for_indexing():
+    """Queryset with everything needed by track_document"""
+    return (Track.objects.select_related('main_author')
+            .prefetch_related('featured_authors', 'albums'))
+
+
+class FTSIndex:
+    """SQLite FTS5 backed index"""
+
+    def index(self, tracks):
+        """Insert or replace documents of tracks"""
+        rows = []
+        for track in tracks:
+            document = track_document(track)
+            rows.append([track.pk] + [document[field] for field in FIELDS])
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [[row[0]] for row in rows]
+            )
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, {", ".join(FIELDS)}) '
+                f'VALUES (%s, %s, %s, %s, %s)',
+                rows
+            )
+
+    def remove(self, track_ids):
+        """Delete documents of tracks"""
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [[pk] for pk in track_ids]
+            )
+
+    def clear(self):
+        """Drop all documents"""
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+
+    def search(self, tokens, limit):
+        """Ranked track ids matching all tokens as prefixes"""
+        match = ' AND '.join(
+            '(' + ' OR '.join(f'"{form}"*' for form in word_forms(token)) + ')'
+            for token in tokens
+        )
+        weights = ', '.join(str(FIELD_WEIGHTS[field]) for field in FIELDS)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                f'ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT %s',
+                [match, limit]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+def token_weights(document):
+    """{token: weight} of a document, summed over the fields a token occurs in"""
+    weights = defaultdict(float)
+    for field, text in document.items():
+        for token in text.split():
+            weights[token[:TOKEN_MAX_LENGTH]] += FIELD_WEIGHTS[field]
+    return weights
+
+
+class TableIndex:
+    """Inverted index in the `SearchToken` table, used when FTS5 is not available"""
+
+    def index(self, tracks):
+        """Insert or replace documents of tracks"""
+        tracks = list(tracks)
+        if not tracks:
+            return
+        SearchToken.objects.filter(track_id__in=[track.pk for track in tracks]).delete()
+        SearchToken.objects.bulk_create([
+            SearchToken(token=token, track_id=track.pk, weight=weight)
+            for track in tracks
+            for token, weight in token_weights(track_document(track)).items()
+        ], batch_size=2000)
+
+    def remove(self, track_ids):
+        """Delete documents of tracks"""
+        SearchToken.objects.filter(track_id__in=track_ids).delete()
+
+    def clear(self):
+        """Drop all documents"""
+        SearchToken.objects.all().delete()
+
+    def search(self, tokens, limit):
+        """Ranked track ids matching all tokens as prefixes"""
+        total = Track.objects.count() or 1
+        scores = None
+        # long prefixes match fewer rows, the candidates then narrow the other queries
+        for token in sorted(tokens, key=len, reverse=True):
+            prefixes = Q()
+            for form in word_forms(token):
+                prefixes |= Q(token__startswith=form[:TOKEN_MAX_LENGTH])
+            rows = SearchToken.objects.filter(prefixes)
+            if scores is not None and len(scores) <= CANDIDATES_IN_QUERY:
+                rows = rows.filter(track_id__in=list(scores))
+            token_scores = dict(rows.values_list('track_id').annotate(Sum('weight')).order_by())
+            if token_scores:
+                idf = math.log(1 + total / len(token_scores))
+                token_scores = {pk: weight * idf for pk, weight in token_scores.items()}
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {pk: score + token_scores[pk]
+                          for pk, score in scores.items() if pk in token_scores}
+            if not scores:
+                return []
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [track_id for track_id, _ in ranked[:limit]]
+
+
+_table_index = TableIndex()
+_fts_index = FTSIndex()
+
+
+def fts_available():
+    """Whether the FTS5 table exists in the current database"""
+    if connection.vendor != 'sqlite':
+        return False
+    return FTS_TABLE in connection.introspection.table_names()
+
+
+def get_index():
+    """Search backend for the current database"""
+    if not hasattr(connection, 'player_search_index'):
+        connection.player_search_index = _fts_index if fts_available() else _table_index
+    return connection.player_search_index
+
+
+def index_tracks(tracks):
+    """Add or refresh tracks in the index"""
+    get_index().index(tracks)
+
+
+def index_track_ids(track_ids):
+    """Add or refresh tracks in the index by ids"""
+    track_ids = list(track_ids)
+    if track_ids:
+        index_tracks(tracks_for_indexing().filter(id__in=track_ids))
+
+
+def remove_track_ids(track_ids):
+    """Remove tracks from the index"""
+    get_index().remove(list(track_ids))
+
+
+def rebuild(chunk_size=2000, index=None):
+    """Reindex every track, returns the number of indexed tracks"""
+    index = index or get_index()
+    index.clear()
+    count = 0
+    batch = []
+    for track in tracks_for_indexing().iterator(chunk_size=chunk_size):
+        batch.append(track)
+        if len(batch) >= chunk_size:
+            index.index(batch)
+            count += len(batch)
+            batch = []
+    index.index(batch)
+    return count + len(batch)
+
+
+def search_track_ids(query, limit=None):
+    """Ranked ids of tracks matching the query"""
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+    limit = limit or settings.SEARCH_RESULTS_LIMIT
+    try:
+        return get_index().search(tokens, limit)
+    except OperationalError:
+        # malformed FTS query, nothing can match it
+        return []
+
+
+def search_tracks(query, limit=None):
+    """Queryset of matching tracks ordered by rank"""
+    track_ids = search_track_ids(query, limit)
+    if not track_ids:
+        return Track.objects.none()
+    rank = Case(
+        *[When(pk=pk, then=position) for position, pk in enumerate(track_ids)],
+        output_field=IntegerField()
+    )
+    return Track.objects.filter(pk__in=track_ids).order_by(rank)
@@ -0,0 +1,223 @@
+"""Module with signal handlers of player models"""
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import artist_tracks, home_feed, playlist_sidebar, search_index, tasks
+from .models import Album, Artist, Genre, Playlist, PlayerUser, Track
+
+
+def related_track_ids(instance):
+    """Ids of tracks linked to album or featured artist"""
+    tracks = instance.tracks if isinstance(instance, Album) else instance.featured_artists
+    return list(tracks.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Track)
+def index_saved_track(sender, instance, **kwargs): # pylint: disable=W0613
+    """Refresh search document of saved track"""
+    search_index.index_track_ids([instance.pk])
+
+
+@receiver(post_save, sender=Track)
+def process_new_mp3(sender, instance, **kwargs): # pylint: disable=W0613
+    """Read duration and analyse a set or replaced mp3 file"""
+    if not instance.saved_new_mp3:
+        return
+    if settings.TRACK_DURATION_IN_BACKGROUND:
+        tasks.enqueue(tasks.update_track_duration, instance.pk)
+    else:
+        instance.update_duration()
+    if settings.TRACK_ANALYSIS_ON_UPLOAD:
+        tasks.enqueue(tasks.analyse_track, instance.pk)
+
+
+@receiver(post_delete, sender=Track)
+def unindex_deleted_track(sender, instance, **kwargs): # pylint: disable=W0613
+    """Remove deleted track from search index"""
+    search_index.remove_track_ids([instance.pk])
+
+
+@receiver(m2m_changed, sender=Track.featured_authors.through) # pylint: disable=E1101
+@receiver(m2m_changed, sender=Album.tracks.through) # pylint: disable=E1101
+def index_track_relations(sender, instance, action, pk_set, **kwargs): # pylint: disable=W0613
+    """Refresh tracks whose featured authors or albums changed"""
+    if isinstance(instance, Track):
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            search_index.index_track_ids([instance.pk])
+    elif action == 'pre_clear':
+        # remember tracks while the relation still exists
+        instance._cleared_track_ids = related_track_ids(instance)  # pylint: disable=W0212
+    elif action == 'post_clear':
+        search_index.index_track_ids(getattr(instance, '_cleared_track_ids', []))
+    elif action in ('post_add', 'post_remove'):
+        search_index.index_track_ids(pk_set)
+
+
+@receiver(post_save, sender=Track)
+def sync_main_author(sender, instance, **kwargs): # pylint: disable=W0613
+    """Refresh artist memberships of saved track"""
+    artist_tracks.sync_track_ids([instance.pk])
+
+
+@receiver(m2m_changed, sender=Track.featured_authors.through) # pylint: disable=E1101
+def sync_featured_authors(sender, instance, action, pk_set, **kwargs): # pylint: disable=W0613
+    """Refresh artist memberships of tracks whose featured authors changed"""
+    if isinstance(instance, Track):
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            artist_tracks.sync_track_ids([instance.pk])
+    elif action == 'pre_clear':
+        instance._cleared_featured_track_ids = list(  # pylint: disable=W0212
+            instance.featured_artists.values_list('id', flat=True)
+        )
+    elif action == 'post_clear':
+        artist_tracks.sync_track_ids(getattr(instance, '_cleared_featured_track_ids', []))
+    elif action in ('post_add', 'post_remove'):
+        artist_tracks.sync_track_ids(pk_set)
+
+
+@receiver(post_save, sender=Artist)
+def index_artist_tracks(sender, instance, created, **kwargs): # pylint: disable=W0613
+    """Refresh tracks of renamed artist"""
+    if not created:
+        search_index.index_track_ids(
+            Track.objects.filter(id__in=artist_tracks.track_ids_of(instance))
+            .values_list('id', flat=True)
+        )
+
+
+@receiver(post_save, sender=Album)
+def index_album_tracks(sender, instance, created, **kwargs): # pylint: disable=W0613
+    """Refresh tracks of renamed album"""
+    if not created:
+        search_index.index_track_ids(related_track_ids(instance))
+
+
+@receiver(post_save, sender=Track)
+@receiver(post_delete, sender=Track)
+@receiver(post_save, sender=Album)
+@receiver(post_delete, sender=Album)
+@receiver(post_save, sender=Artist)
+@receiver(post_delete, sender=Artist)
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+def invalidate_home_feed(sender, **kwargs): # pylint: disable=W0613
+    """Drop cached home feed when its content changes"""
+    home_feed.invalidate()
+
+
+@receiver(pre_save, sender=Playlist)
+def remember_playlist_owner(sender, instance, **kwargs): # pylint: disable=W0613
+    """Remember previous owner of changed playlist"""
+    if instance.pk:
+        instance._previous_owner_id = (Playlist.objects  # pylint: disable=W0212
+                                       .filter(pk=instance.pk)
+                                       .values_list('owner_id', flat=True).first())
+
+
+@receiver(post_save, sender=Playlist)
+def invalidate_saved_playlist_sidebars(sender, instance, **kwargs): # pylint: disable=W0613
+    """Drop sidebars showing saved playlist"""
+    user_ids = playlist_sidebar.audience([instance])
+    previous_owner_id = getattr(instance, '_previous_owner_id', None)
+    if previous_owner_id:
+        user_ids.add(previous_owner_id)
+    playlist_sidebar.invalidate(user_ids)
+
+
+@receiver(pre_delete, sender=Playlist)
+def remember_playlist_audience(sender, instance, **kwargs): # pylint: disable=W0613
+    """Remember users of deleted playlist while the relation still exists"""
+    instance._sidebar_user_ids = playlist_sidebar.audience([instance])  # pylint: disable=W0212
+
+
+@receiver(post_delete, sender=Playlist)
+def invalidate_deleted_playlist_sidebars(sender, instance, **kwargs): # pylint: disable=W0613
+    """Drop sidebars which showed deleted playlist"""
+    playlist_sidebar.invalidate(getattr(instance, '_sidebar_user_ids', {instance.owner_id}))
+
+
+@receiver(m2m_changed, sender=Playlist.added_users.through) # pylint: disable=E1101
+def invalidate_added_users_sidebars(sender, instance, action, reverse, pk_set, **kwargs): # pylint: disable=W0613
+    """Drop sidebars of users added to or removed from playlists"""
+    if reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            playlist_sidebar.invalidate([instance.pk])
+    elif action == 'pre_clear':
+        instance._cleared_user_ids = list(  # pylint: disable=W0212
+            instance.added_users.values_list('id', flat=True)
+        )
+    elif action == 'post_clear':
+        playlist_sidebar.invalidate(getattr(instance, '_cleared_user_ids', []))
+    elif action in ('post_add', 'post_remove'):
+        playlist_sidebar.invalidate(pk_set)
+
+
+@receiver(post_save, sender=PlayerUser)
+def invalidate_owner_sidebars(sender, instance, created, update_fields, **kwargs): # pylint: disable=W0613
+    """Drop sidebars showing playlists of renamed user"""
+    if created or (update_fields and set(update_fields) <= {'last_login'}):
+        return
+    playlist_sidebar.invalidate(
+        playlist_sidebar.audience(Playlist.objects.filter(owner=instance)) | {instance.pk}
+    )
+
+
+def file_fields(instance):
+    """File fields of model instance"""
+    return [field for field in instance._meta.get_fields()  # pylint: disable=W0212
+            if isinstance(field, models.FileField)]
+
+
+def release_on_commit(storage, name):
+    """Drop reference to a content-addressed file once the transaction commits"""
+    if hasattr(storage, 'release'):
+        transaction.on_commit(lambda: storage.release(name))
+
+
+@receiver(post_delete, sender=Track)
+@receiver(post_delete, sender=Artist)
+@receiver(post_delete, sender=Album)
+@receiver(post_delete, sender=Playlist)
+@receiver(post_delete, sender=PlayerUser)
+def release_media(sender, instance, **kwargs): # pylint: disable=W0613
+    """Drop references of deleted object to its content-addressed files"""
+    for field in file_fields(instance):
+        file = getattr(instance, field.name)
+        if file:
+            release_on_commit(file.storage, file.name)
+
+
+@receiver(pre_save, sender=Track)
+@receiver(pre_save, sender=Artist)
+@receiver(pre_save, sender=Album)
+@receiver(pre_save, sender=Playlist)
+@receiver(pre_save, sender=PlayerUser)
+def remember_replaced_media(sender, instance, update_fields, **kwargs): # pylint: disable=W0613
+    """Remember stored files which the save replaces or clears"""
+    fields = [field for field in file_fields(instance)
+              if update_fields is None or field.name in update_fields]
+    if instance._state.adding or not fields:  # pylint: disable=W0212
+        return
+    stored = sender.objects.filter(pk=instance.pk).values(*[field.attname for field in fields])
+    stored = stored.first() or {}
+    replaced = []
+    for field in fields:
+        name = stored.get(field.attname)
+        file = getattr(instance, field.name)
+        # an upload not saved yet adds a reference even with the same contents
+        if name and (not file or not file._committed or file.name != name):  # pylint: disable=W0212
+            replaced.append((field.storage, name))
+    instance._replaced_media = replaced  # pylint: disable=W0212
+
+
+@receiver(post_save, sender=Track)
+@receiver(post_save, sender=Artist)
+@receiver(post_save, sender=Album)
+@receiver(post_save, sender=Playlist)
+@receiver(post_save, sender=PlayerUser)
+def release_replaced_media(sender, instance, **kwargs): # pylint: disable=W0613
+    """Drop references of files replaced by the save"""
+    for storage, name in instance.__dict__.pop('_replaced_media', ()):
+        release_on_commit(storage, name)
@@ -0,0 +1,322 @@
+"""Module with the track similarity index ("more like this")
+
+Every track gets a dense float32 vector of SIMILARITY_DIMENSIONS values
+built from hashed features in groups: genre, artists (main and featured),
+albums and playlists the track is in (co-occurrence), and bucketed audio
+features (duration and loudness of its analysis). A feature is hashed to
+a signed column, features of a context shared by many tracks weigh less,
+every group is normalised and scaled by its SIMILARITY_WEIGHTS entry, and
+the vector is normalised, so the cosine similarity is a dot product.
+
+Vectors are stored in SIMILARITY_INDEX_DIR as a NumPy matrix opened with
+`np.memmap`, next to the sorted track ids of its rows and a `meta.json`
+(see player/generations.py).
+A query multiplies the whole matrix by one vector and takes the top rows
+with `argpartition`; the operating system keeps the matrix in the page
+cache and shares it between processes.
+
+`update()` only recomputes tracks changed since the previous build (saved
+tracks and albums, new playlist memberships, new analyses) and writes
+their rows into a copy of the files, the next generation, so processes
+which still map the current one never see half-written rows; new tracks
+are appended to spare rows, and a full `rebuild()` runs when they are
+used up. Removed memberships leave no trace to detect, a rebuild picks
+them up.
+"""
+import math
+import os
+import shutil
+import zlib
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .generations import (array_path, load_array, load_current, read_meta,
+                          remove_generations, write_meta)
+from .models import Album, ArtistTrack, PlaylistTrack, Track, TrackAnalysis
+
+GROUPS = ('genre', 'artist', 'album', 'playlist', 'audio')
+
+
+def feature_column(name, dimensions):
+    """(column, sign) of hashed feature name"""
+    value = zlib.crc32(name.encode())
+    return value % dimensions, 1.0 if value & 0x80000000 else -1.0
+
+
+def context_weight(size):
+    """Weight of a playlist or album with size tracks, large contexts say less"""
+    return 1.0 / math.log2(2 + size)
+
+
+def audio_features(duration, loudness):
+    """Bucketed audio feature names of a track"""
+    features = []
+    if duration:
+        features.append(f'duration:{round(math.log2(max(duration, 1) / 30) * 2)}')
+    if loudness is not None:
+        features.append(f'loudness:{round(loudness / 3)}')
+    return features
+
+
+def track_features(track_ids):
+    """{track id: {group: {feature name: weight}}} of existing tracks"""
+    features = defaultdict(lambda: defaultdict(dict))
+    for pk, genre_id, duration in (Track.objects.filter(pk__in=track_ids)
+                                   .values_list('id', 'genre_id', 'duration')):
+        features[pk]['genre'][f'genre:{genre_id}'] = 1.0
+        for name in audio_features(duration, None):
+            features[pk]['audio'][name] = 1.0
+
+    for track_id, artist_id, role in (ArtistTrack.objects.filter(track_id__in=track_ids)
+                                      .values_list('track_id', 'artist_id', 'role')):
+        if track_id in features:
+            weight = 1.0 if role == ArtistTrack.Role.MAIN else 0.5
+            features[track_id]['artist'][f'artist:{artist_id}'] = weight
+
+    for track_id, loudness in (TrackAnalysis.objects.filter(track_id__in=track_ids)
+                               .values_list('track_id', 'loudness')):
+        if track_id in features:
+            for name in audio_features(None, loudness):
+                features[track_id]['audio'][name] = 1.0
+
+    add_context_features(features, track_ids)
+    return features
+
+
+def add_context_features(features, track_ids):
+    """Add album and playlist features of tracks, weighed by the context size"""
+    album_links = Album.tracks.through.objects.filter(track_id__in=track_ids) # pylint: disable=E1101
+    playlist_links = PlaylistTrack.objects.filter(track_id__in=track_ids)
+    for group, links, key in (('album', album_links, 'album_id'),
+                              ('playlist', playlist_links, 'playlist_id')):
+        pairs = list(links.values_list('track_id', key))
+        sizes = dict(links.model.objects.filter(**{f'{key}__in': {pair[1] for pair in pairs}})
+                     .values_list(key).annotate(size=Count('id')).order_by())
+        for track_id, context_id in pairs:
+            if track_id in features:
+                features[track_id][group][f'{group}:{context_id}'] = \
+                    context_weight(sizes[context_id])
+
+
+def vectorize(features, dimensions, weights):
+    """Normalised float32 vector of track features"""
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for group in GROUPS:
+        group_vector = np.zeros(dimensions, dtype=np.float32)
+        for name, weight in features.get(group, {}).items():
+            column, sign = feature_column(name, dimensions)
+            group_vector[column] += sign * weight
+        norm = np.linalg.norm(group_vector)
+        if norm:
+            vector += group_vector * (weights.get(group, 0.0) / norm)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def vectors_of(track_ids):
+    """(ids, matrix of vectors) of existing tracks among track_ids, sorted by id"""
+    dimensions = settings.SIMILARITY_DIMENSIONS
+    features = track_features(track_ids)
+    ids = np.array(sorted(features), dtype=np.int64)
+    matrix = np.zeros((len(ids), dimensions), dtype=np.float32)
+    for row, pk in enumerate(ids):
+        matrix[row] = vectorize(features[int(pk)], dimensions, settings.SIMILARITY_WEIGHTS)
+    return ids, matrix
+
+
+class Index:
+    """Memory-mapped vectors of the first `count` rows and their track ids"""
+    def __init__(self, directory, meta, mode='r'):
+        self.directory = directory
+        self.meta = meta
+        self.count = meta['count']
+        self.ids = load_array(directory, 'ids', meta['generation'], mode)
+        self.vectors = load_array(directory, 'vectors', meta['generation'], mode)
+
+    def row_of(self, track_id):
+        """Row of track_id, None when it is not indexed"""
+        ids = self.ids[:self.count]
+        row = int(np.searchsorted(ids, track_id))
+        return row if row < self.count and ids[row] == track_id else None
+
+    def nearest(self, track_id, count):
+        """[(track id, score)] of the count most similar tracks, best first"""
+        row = self.row_of(track_id)
+        if row is None or count <= 0:
+            return []
+        vector = np.array(self.vectors[row])
+        if not vector.any():
+            return []
+        scores = self.vectors[:self.count] @ vector
+        scores[row] = -np.inf
+        count = min(count, self.count - 1)
+        if count <= 0:
+            return []
+        top = np.argpartition(-scores, count - 1)[:count]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(self.ids[index]), float(scores[index]))
+                for index in top if scores[index] > 0]
+
+
+def index_dir():
+    """Directory of the index files"""
+    return str(settings.SIMILARITY_INDEX_DIR)
+
+
+def load_index():
+    """Index of SIMILARITY_INDEX_DIR, reopened when meta.json changes, None without index"""
+    return load_current(index_dir(), Index)
+
+
+def allocate(directory, generation, capacity, dimensions):
+    """New ids and vectors files of generation, opened for writing"""
+    ids = np.lib.format.open_memmap(array_path(directory, 'ids', generation),
+                                    mode='w+', dtype=np.int64, shape=(capacity,))
+    vectors = np.lib.format.open_memmap(array_path(directory, 'vectors', generation),
+                                        mode='w+', dtype=np.float32,
+                                        shape=(capacity, dimensions))
+    return ids, vectors
+
+
+def batches(queryset, size):
+    """Lists of ids of queryset, keyset-paginated by id"""
+    last = 0
+    while True:
+        ids = list(queryset.filter(pk__gt=last).order_by('id').values_list('id', flat=True)[:size])
+        if not ids:
+            return
+        yield ids
+        last = ids[-1]
+
+
+def rebuild(batch_size=None):
+    """Build the index of all tracks from scratch, number of indexed tracks"""
+    batch_size = batch_size or settings.SIMILARITY_BATCH_SIZE
+    directory = index_dir()
+    os.makedirs(directory, exist_ok=True)
+    started = timezone.now()
+    previous = read_meta(directory)
+    generation = previous['generation'] + 1 if previous else 1
+    dimensions = settings.SIMILARITY_DIMENSIONS
+    capacity = max(Track.objects.count(), 1)
+    capacity += capacity // 4  # room for tracks added until the next rebuild
+
+    all_ids, vectors = allocate(directory, generation, capacity, dimensions)
+    count = 0
+    for track_ids in batches(Track.objects.all(), batch_size):
+        ids, matrix = vectors_of(track_ids)
+        if count + len(ids) > capacity:
+            break  # tracks created during the build wait for the next update
+        all_ids[count:count + len(ids)] = ids
+        vectors[count:count + len(ids)] = matrix
+        count += len(ids)
+    vectors.flush()
+    all_ids.flush()
+
+    write_meta(directory, {
+        'generation': generation,
+        'count': count,
+        'capacity': capacity,
+        'dimensions': dimensions,
+        'weights': settings.SIMILARITY_WEIGHTS,
+        'built': started.isoformat(),
+    })
+    remove_generations(directory, generation)
+    return count
+
+
+def changed_track_ids(since):
+    """Ids of tracks whose features may have changed after since"""
+    return set(Track.objects.filter(
+        Q(time_updated__gte=since)
+        | Q(playlist_links__time_added__gte=since)
+        | Q(albums__time_updated__gte=since)
+        | Q(analysis__time_updated__gte=since)
+    ).values_list('id', flat=True).distinct())
+
+
+def copy_generation(directory, generation, new_generation):
+    """Copy ids and vectors files of generation as new_generation"""
+    for name in ('ids', 'vectors'):
+        shutil.copyfile(array_path(directory, name, generation),
+                        array_path(directory, name, new_generation))
+
+
+def write_changed(index, changed, batch_size):
+    """Recompute rows of indexed tracks among changed ids, number of written rows"""
+    indexed = index.ids[:index.count]
+    written = 0
+    for start in range(0, len(changed), batch_size):
+        ids, matrix = vectors_of(changed[start:start + batch_size])
+        rows = np.searchsorted(indexed, ids)
+        known = rows < index.count
+        known[known] = indexed[rows[known]] == ids[known]
+        index.vectors[rows[known]] = matrix[known]
+        written += int(known.sum())
+    return written
+
+
+def append_new(index, new_ids, batch_size):
+    """Write new tracks to spare rows after the indexed ones, new row count"""
+    count = index.count
+    for start in range(0, len(new_ids), batch_size):
+        ids, matrix = vectors_of(new_ids[start:start + batch_size])
+        index.ids[count:count + len(ids)] = ids
+        index.vectors[count:count + len(ids)] = matrix
+        count += len(ids)
+    return count
+
+
+def update(batch_size=None):
+    """Recompute changed and new tracks into a new generation, number of written rows
+
+    Falls back to rebuild() without an index, when settings changed or the
+    capacity is used up. Rows of deleted tracks stay, queries skip them.
+    """
+    batch_size = batch_size or settings.SIMILARITY_BATCH_SIZE
+    directory = index_dir()
+    meta = read_meta(directory)
+    if (meta is None or meta['dimensions'] != settings.SIMILARITY_DIMENSIONS
+            or meta['weights'] != settings.SIMILARITY_WEIGHTS):
+        return rebuild(batch_size)
+
+    started = timezone.now()
+    current = Index(directory, meta)
+    last_id = int(current.ids[current.count - 1]) if current.count else 0
+    new_ids = list(Track.objects.filter(pk__gt=last_id).order_by('id')
+                   .values_list('id', flat=True))
+    if current.count + len(new_ids) > meta['capacity']:
+        return rebuild(batch_size)
+    changed = sorted(changed_track_ids(parse_datetime(meta['built'])))
+    if not changed and not new_ids:
+        write_meta(directory, dict(meta, built=started.isoformat()))
+        return 0
+
+    # readers keep the current generation mapped, rows are written to a copy
+    meta = dict(meta, generation=meta['generation'] + 1)
+    copy_generation(directory, current.meta['generation'], meta['generation'])
+    index = Index(directory, meta, mode='r+')
+    written = write_changed(index, changed, batch_size)
+    count = append_new(index, new_ids, batch_size)
+    index.vectors.flush()
+    index.ids.flush()
+
+    write_meta(directory, dict(meta, count=count, built=started.isoformat()))
+    remove_generations(directory, meta['generation'])
+    return written + count - index.count
+
+
+def similar_track_ids(track_id, count):
+    """[(track id, score)] of up to count published tracks most similar to track_id"""
+    index = load_index()
+    if index is None:
+        return []
+    candidates = index.nearest(track_id, count * settings.SIMILARITY_OVERFETCH)
+    published = set(Track.published.filter(pk__in=[pk for pk, _ in candidates])
+                    .values_list('id', flat=True))
+    return [(pk, score) for pk, score in candidates if pk in published][:count]
@@ -7,16 +7,3 @@ document.getElementById('id_logo').addEventListener('change', function (e) {
     }
 });
 
-document.addEventListener('DOMContentLoaded', function () {
-    const searchInput = document.querySelector('.track-search-input');
-    const trackItems = document.querySelectorAll('.track-select-container div');
-
-    searchInput.addEventListener('input', function (e) {
-        const searchTerm = e.target.value.toLowerCase();
-
-        trackItems.forEach(item => {
-            const trackName = item.querySelector('label').textContent.toLowerCase();
-            item.style.display = trackName.includes(searchTerm) ? 'flex' : 'none';
-        });
-    });
-});
\ No newline at end of file
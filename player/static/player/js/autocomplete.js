@@ -0,0 +1,79 @@
+// Pickers of PlaylistForm: candidates are loaded page by page from a JSON
+// endpoint, chosen ids are kept as selected options of a hidden select.
+document.querySelectorAll('.autocomplete').forEach(function (picker) {
+    const input = picker.querySelector('.autocomplete-input');
+    const results = picker.querySelector('.autocomplete-results');
+    const chosen = picker.querySelector('.autocomplete-chosen');
+    const more = picker.querySelector('.autocomplete-more');
+    const select = picker.querySelector('select');
+    let nextCursor = null;
+    let timer = null;
+
+    function isChosen(id) {
+        return select.querySelector(`option[value="${id}"]`) !== null;
+    }
+
+    function choose(item) {
+        if (isChosen(item.id)) {
+            return;
+        }
+        select.add(new Option(item.text, item.id, true, true));
+        const li = document.createElement('li');
+        li.dataset.id = item.id;
+        li.textContent = item.text;
+        const remove = document.createElement('button');
+        remove.type = 'button';
+        remove.className = 'autocomplete-remove';
+        remove.textContent = '×';
+        li.appendChild(remove);
+        chosen.appendChild(li);
+    }
+
+    function load(append) {
+        const params = new URLSearchParams({q: input.value.trim()});
+        if (append && nextCursor) {
+            params.set('cursor', nextCursor);
+        }
+        fetch(`${picker.dataset.url}?${params}`, {credentials: 'same-origin'})
+            .then(response => response.json())
+            .then(page => {
+                if (!append) {
+                    results.innerHTML = '';
+                }
+                page.results.forEach(item => {
+                    const li = document.createElement('li');
+                    li.textContent = item.text;
+                    li.classList.toggle('chosen', isChosen(item.id));
+                    li.addEventListener('click', () => {
+                        choose(item);
+                        li.classList.add('chosen');
+                    });
+                    results.appendChild(li);
+                });
+                nextCursor = page.next_cursor;
+                more.hidden = !nextCursor;
+            });
+    }
+
+    input.addEventListener('input', function () {
+        clearTimeout(timer);
+        timer = setTimeout(() => load(false), 250);
+    });
+    input.addEventListener('focus', function () {
+        if (!results.children.length) {
+            load(false);
+        }
+    });
+    more.addEventListener('click', () => load(true));
+    chosen.addEventListener('click', function (e) {
+        if (!e.target.classList.contains('autocomplete-remove')) {
+            return;
+        }
+        const li = e.target.closest('li');
+        const option = select.querySelector(`option[value="${li.dataset.id}"]`);
+        if (option) {
+            option.remove();
+        }
+        li.remove();
+    });
+});
@@ -1,11 +1,15 @@
 document.addEventListener("DOMContentLoaded", function () {
     document.querySelectorAll(".track").forEach(track => {
         let durationElement = track.querySelector(".track-duration");
-        let rawDuration = track.getAttribute("data-duration"); // Получаем исходное значение
+        let rawDuration = parseInt(track.getAttribute("data-duration"), 10); // Длительность в секундах
 
-        if (rawDuration) {
-            let formattedDuration = rawDuration.replace(/\./g, ":"); // Заменяем все точки на двоеточия
-            durationElement.textContent = formattedDuration;
+        if (durationElement && !isNaN(rawDuration)) {
+            let hours = Math.floor(rawDuration / 3600);
+            let minutes = Math.floor((rawDuration % 3600) / 60);
+            let seconds = String(rawDuration % 60).padStart(2, "0");
+            durationElement.textContent = hours
+                ? `${hours}:${String(minutes).padStart(2, "0")}:${seconds}`
+                : `${minutes}:${seconds}`;
         }
     });
 });
\ No newline at end of file
@@ -14,6 +14,30 @@ document.addEventListener("DOMContentLoaded", () => {
     const trackAuthor = document.getElementById("track-author");
     const tracks = document.querySelectorAll(".track");
     let currentTrackIndex = 0;
+    let playReported = false;
+
+    function getCookie(name) {
+        const match = document.cookie.match(new RegExp(`(?:^|; )${name}=([^;]*)`));
+        return match ? decodeURIComponent(match[1]) : null;
+    }
+
+    function reportPlay() {
+        const playUrl = audioPlayer.dataset.playUrl;
+        if (playReported || !playUrl) {
+            return;
+        }
+        playReported = true;
+        fetch(playUrl, {
+            method: "POST",
+            headers: {"X-CSRFToken": getCookie("csrftoken")},
+            credentials: "same-origin",
+            keepalive: true,
+        }).catch(() => {
+            playReported = false;
+        });
+    }
+
+    audioPlayer.addEventListener("play", reportPlay);
 
     function togglePlayPause() {
         if (audioPlayer.paused) {
@@ -78,6 +102,9 @@ document.addEventListener("DOMContentLoaded", () => {
         if (index >= 0 && index < tracks.length) {
             const track = tracks[index];
             audioPlayer.src = track.getAttribute("data-src");
+            audioPlayer.dataset.playUrl = track.getAttribute("data-play-url");
+            playReported = false;
+            queue.index = queue.tracks.findIndex(item => item.src === track.getAttribute("data-src"));
             trackLogo.src = track.getAttribute("data-logo");
             trackTitle.textContent = track.getAttribute("data-name");
             trackAuthor.textContent = track.getAttribute("data-author");
@@ -92,7 +119,95 @@ document.addEventListener("DOMContentLoaded", () => {
         track.addEventListener("click", () => loadTrack(index));
     });
 
+    // Очередь воспроизведения: треки текущей страницы загружаются с сервера по курсору
+    const playerContainer = document.querySelector(".player-container");
+    const prevTrackBtn = document.getElementById("prev-track-btn");
+    const nextTrackBtn = document.getElementById("next-track-btn");
+    const queue = {
+        url: playerContainer ? playerContainer.dataset.queueUrl : "",
+        tracks: [],
+        index: -1,
+        nextCursor: null,
+    };
+
+    function queueUrl(params) {
+        const url = new URL(queue.url, window.location.origin);
+        Object.entries(params).forEach(([key, value]) => url.searchParams.set(key, value));
+        return url;
+    }
+
+    function loadQueuePage(params) {
+        return fetch(queueUrl(params), {credentials: "same-origin"})
+            .then(response => response.ok ? response.json() : Promise.reject(response))
+            .then(page => {
+                queue.tracks.push(...page.tracks);
+                queue.nextCursor = page.next_cursor;
+            });
+    }
+
+    function playQueueTrack(index) {
+        const track = queue.tracks[index];
+        queue.index = index;
+        audioPlayer.src = track.src;
+        audioPlayer.dataset.trackId = track.id;
+        audioPlayer.dataset.playUrl = track.play_url;
+        playReported = false;
+        trackLogo.src = track.logo;
+        trackTitle.textContent = track.name;
+        const authorLink = document.createElement("a");
+        authorLink.href = track.author_url;
+        authorLink.textContent = track.author;
+        trackAuthor.replaceChildren(authorLink);
+        audioPlayer.play();
+        playIcon.classList.remove("fa-play");
+        playIcon.classList.add("fa-pause");
+    }
+
+    function playNextInQueue() {
+        if (queue.index + 1 < queue.tracks.length) {
+            playQueueTrack(queue.index + 1);
+            return true;
+        }
+        if (queue.nextCursor) {
+            loadQueuePage({cursor: queue.nextCursor}).then(() => {
+                if (queue.index + 1 < queue.tracks.length) {
+                    playQueueTrack(queue.index + 1);
+                }
+            });
+            return true;
+        }
+        return false;
+    }
+
+    if (queue.url && audioPlayer.dataset.trackId) {
+        loadQueuePage({start: audioPlayer.dataset.trackId}).then(() => {
+            queue.index = queue.tracks.findIndex(track => String(track.id) === audioPlayer.dataset.trackId);
+        }).catch(() => {
+            queue.tracks = [];
+        });
+    }
+
+    if (nextTrackBtn) {
+        nextTrackBtn.addEventListener("click", (event) => {
+            if (queue.index >= 0 && playNextInQueue()) {
+                event.preventDefault();
+            }
+        });
+    }
+
+    if (prevTrackBtn) {
+        prevTrackBtn.addEventListener("click", (event) => {
+            if (queue.index > 0) {
+                event.preventDefault();
+                playQueueTrack(queue.index - 1);
+            }
+        });
+    }
+
     audioPlayer.addEventListener("ended", () => {
+        if (queue.index >= 0 && playNextInQueue()) {
+            return;
+        }
         let nextTrackIndex = (currentTrackIndex + 1) % tracks.length;
         loadTrack(nextTrackIndex);
     });
@@ -0,0 +1,143 @@
+"""Module with content-addressed media storage
+
+Uploaded files are stored as `cas/<aa>/<bb>/<sha256><ext>`. The hash is
+computed while the upload is spooled to a temporary file in chunks, so
+files are never read into memory whole, and a second upload of the same
+contents only bumps the reference count of the existing file instead of
+writing a copy. Reference counts live next to the files (`<name>.refs`)
+and are changed under a file lock, so deleting one of several references
+never removes a file which is still used. Replacing a file of a saved object
+drops the reference of the previous one (see `player.signals`).
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from django.core.files.storage import FileSystemStorage
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of one process are serialised
+    fcntl = None
+
+PREFIX = 'cas'
+REFS_SUFFIX = '.refs'
+
+_lock = threading.Lock()
+
+
+def is_content_name(name):
+    """Whether name was produced by ContentAddressedStorage"""
+    parts = name.replace('\\', '/').split('/')
+    return len(parts) == 4 and parts[0] == PREFIX and len(os.path.splitext(parts[3])[0]) == 64
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage naming files by the sha256 of their contents"""
+
+    def content_name(self, digest, extension):
+        """Storage name of contents with digest"""
+        return f'{PREFIX}/{digest[:2]}/{digest[2:4]}/{digest}{extension.lower()}'
+
+    @staticmethod
+    def digest_of(name):
+        """sha256 of a content-addressed file, taken from its name"""
+        if not is_content_name(name):
+            return None
+        return os.path.splitext(os.path.basename(name))[0]
+
+    def get_available_name(self, name, max_length=None):
+        # the final name is chosen by _save from the contents
+        return name
+
+    def _save(self, name, content):
+        tmp_dir = self.path(f'{PREFIX}/tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(dir=tmp_dir, delete=False) as tmp:
+            if hasattr(content, 'seek'):
+                content.seek(0)
+            for chunk in content.chunks():
+                if isinstance(chunk, str):
+                    chunk = chunk.encode()
+                digest.update(chunk)
+                tmp.write(chunk)
+
+        final_name = self.content_name(digest.hexdigest(), os.path.splitext(name)[1])
+        full_path = self.path(final_name)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with self.references_lock(final_name) as refs:
+            if os.path.exists(full_path):
+                os.remove(tmp.name)
+            else:
+                os.replace(tmp.name, full_path)
+                if self.file_permissions_mode is not None:
+                    os.chmod(full_path, self.file_permissions_mode)
+            refs.count += 1
+        return final_name
+
+    def delete(self, name):
+        """Drop one reference, the file is removed with the last one"""
+        if not is_content_name(name):
+            super().delete(name)
+            return
+        with self.references_lock(name) as refs:
+            refs.count -= 1
+            if refs.count <= 0:
+                refs.count = 0
+                super().delete(name)
+
+    def release(self, name):
+        """Drop reference of a deleted object, legacy files are left in place"""
+        if name and is_content_name(name):
+            self.delete(name)
+
+    def references(self, name):
+        """Reference count of a content-addressed file"""
+        with self.references_lock(name) as refs:
+            return refs.count
+
+    def set_references(self, name, count):
+        """Overwrite reference count, used when recounting existing media"""
+        with self.references_lock(name) as refs:
+            refs.count = count
+
+    @staticmethod
+    def _open_locked(refs_path):
+        """Refs file opened and locked, reopened when it was removed while waiting"""
+        while True:
+            file = open(refs_path, 'a+', encoding='ascii')  # pylint: disable=R1732
+            if fcntl is None:
+                return file
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                # the holder of the lock may have removed the file with the last reference
+                if os.path.samestat(os.fstat(file.fileno()), os.stat(refs_path)):
+                    return file
+            except FileNotFoundError:
+                pass
+            file.close()
+
+    @contextmanager
+    def references_lock(self, name):
+        """Exclusive access to reference count of name, yields object with `count`"""
+        refs_path = self.path(name) + REFS_SUFFIX
+        os.makedirs(os.path.dirname(refs_path), exist_ok=True)
+        with _lock, self._open_locked(refs_path) as file:
+            file.seek(0)
+            refs = _References(int(file.read().strip() or 0))
+            yield refs
+            file.seek(0)
+            file.truncate()
+            if refs.count > 0:
+                file.write(str(refs.count))
+            else:
+                os.remove(refs_path)
+
+
+class _References:  # pylint: disable=R0903
+    """Mutable reference count"""
+    def __init__(self, count):
+        self.count = count
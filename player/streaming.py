@@ -0,0 +1,183 @@
+"""Module with helpers for ranged (partial content) file streaming
+
+Under WSGI files are served by FileResponse, which lets the server use
+sendfile. Under ASGI a sync file iterator would be read in full into
+memory by Django, so the range is sent by an async iterator instead, with
+every read done in the default executor: a slow client only holds a
+coroutine and an open file, not a thread.
+"""
+import asyncio
+import os
+import re
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeFile:
+    """File wrapper which reads only `length` bytes starting from `start`
+
+    `fileno` is kept so WSGI servers with a sendfile-capable file_wrapper
+    (gunicorn, uwsgi) can still do zero-copy transfers of the range.
+    """
+    def __init__(self, file, start, length):
+        self.file = file
+        self.remaining = length
+        self.file.seek(start)
+
+    def read(self, size=-1):
+        """Read no more than remaining bytes of the range"""
+        if self.remaining <= 0:
+            return b''
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        """Descriptor of the wrapped file"""
+        return self.file.fileno()
+
+    def close(self):
+        """Close the wrapped file"""
+        self.file.close()
+
+
+async def aiter_range(path, start, length, chunk_size):
+    """Chunks of length bytes of file starting from start, read off the event loop"""
+    file = await asyncio.to_thread(open, path, 'rb')
+    try:
+        await asyncio.to_thread(file.seek, start)
+        while length > 0:
+            data = await asyncio.to_thread(file.read, min(chunk_size, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+    finally:
+        # also runs when the client disconnects and the response is cancelled
+        file.close()
+
+
+def make_etag(stat):
+    """Strong etag built from file mtime and size"""
+    return f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+
+
+def parse_range(header, size):
+    """Parse a single `bytes=` range, returns (start, end) or None.
+
+    Raises ValueError for syntactically valid but unsatisfiable ranges.
+    Multi-range requests are not supported and are served in full.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # suffix range: last N bytes
+        suffix = int(last)
+        if suffix == 0:
+            raise ValueError('Empty suffix range')
+        return max(size - suffix, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError('Range not satisfiable')
+    return start, min(end, size - 1)
+
+
+def if_range_matches(request, etag, mtime):
+    """Check If-Range precondition, True when Range header may be applied"""
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    if_range_date = parse_http_date_safe(if_range)
+    return if_range_date is not None and int(mtime) <= if_range_date
+
+
+def accel_response(file_name, path, content_type):
+    """Response which delegates file delivery to the front web server"""
+    header = settings.TRACK_STREAM_ACCEL_HEADER
+    response = HttpResponse(content_type=content_type)
+    if header == 'X-Accel-Redirect':
+        response[header] = settings.TRACK_STREAM_ACCEL_PREFIX + file_name
+    else:
+        response[header] = path
+    return response
+
+
+async def aranged_file_response(request, file_field, content_type='application/octet-stream'):
+    """Serve a FieldFile honouring Range/If-Range and conditional headers
+
+    The file is stat'ed off the event loop, raises FileNotFoundError.
+    """
+    stat = await asyncio.to_thread(os.stat, file_field.path)
+    return ranged_file_response(request, file_field, stat, content_type)
+
+
+def ranged_file_response(request, file_field, stat, content_type='application/octet-stream'):
+    """Response of aranged_file_response() for a file with known stat"""
+    path = file_field.path
+    etag = make_etag(stat)
+    last_modified = int(stat.st_mtime)
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        if getattr(settings, 'TRACK_STREAM_ACCEL_HEADER', None):
+            response = accel_response(file_field.name, path, content_type)
+        else:
+            response = file_range_response(request, path, stat, etag, content_type)
+
+    response.headers.setdefault('ETag', etag)
+    response.headers.setdefault('Last-Modified', http_date(last_modified))
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def file_range_response(request, path, stat, etag, content_type):
+    """Build 200/206/416 response reading the file in chunks"""
+    size = stat.st_size
+    byte_range = None
+    range_header = request.headers.get('Range')
+    if range_header and if_range_matches(request, etag, stat.st_mtime):
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    if byte_range is None:
+        start, end, status = 0, size - 1, 200
+    else:
+        (start, end), status = byte_range, 206
+
+    chunk_size = getattr(settings, 'TRACK_STREAM_CHUNK_SIZE', 64 * 1024)
+    if isinstance(request, ASGIRequest):
+        response = StreamingHttpResponse(
+            aiter_range(path, start, end - start + 1, chunk_size),
+            status=status,
+            content_type=content_type,
+        )
+    else:
+        response = FileResponse(
+            RangeFile(open(path, 'rb'), start, end - start + 1),  # pylint: disable=R1732
+            status=status,
+            content_type=content_type,
+        )
+        response.block_size = chunk_size
+    response['Content-Length'] = str(end - start + 1)
+    if status == 206:
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
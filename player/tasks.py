@@ -0,0 +1,208 @@
+"""Module with background tasks of player
+
+Tasks are plain functions registered with the `@task` decorator. `enqueue`
+stores a `BackgroundTask` row in the current transaction, so a task is
+never lost or run for data which was rolled back, and no broker besides the
+database is needed. `manage.py run_workers` claims due tasks in batches:
+a claimed task is hidden from other workers until its visibility timeout
+expires, so a crashed worker's tasks are picked up again. Failed tasks are
+retried with exponential backoff up to `max_attempts`; a task whose lock
+expires on its last attempt is marked failed.
+"""
+import importlib
+import logging
+import os
+import socket
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+REGISTRY = {}
+
+
+def task(func=None, *, max_attempts=None, timeout=None):
+    """Register func as a task, usable as @task or @task(max_attempts=..., timeout=...)"""
+    def register(func):
+        func.task_name = f'{func.__module__}.{func.__qualname__}'
+        func.max_attempts = max_attempts or settings.TASK_MAX_ATTEMPTS
+        func.timeout = timeout or settings.TASK_VISIBILITY_TIMEOUT
+        REGISTRY[func.task_name] = func
+        return func
+    return register(func) if func is not None else register
+
+
+def resolve(name):
+    """Task function by name, importing its module when needed"""
+    if name not in REGISTRY:
+        importlib.import_module(name.rsplit('.', 1)[0])
+    return REGISTRY[name]
+
+
+def enqueue(func, *args, delay=0):
+    """Queue func(*args) to be run by a worker, returns BackgroundTask"""
+    from .models import BackgroundTask  # pylint: disable=C0415
+
+    return BackgroundTask.objects.create(
+        name=func.task_name, args=list(args), max_attempts=func.max_attempts,
+        run_after=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def enqueue_many(func, args_list):
+    """Queue func for every tuple of args with one INSERT"""
+    from .models import BackgroundTask  # pylint: disable=C0415
+
+    now = timezone.now()
+    return BackgroundTask.objects.bulk_create(
+        BackgroundTask(name=func.task_name, args=list(args),
+                       max_attempts=func.max_attempts, run_after=now)
+        for args in args_list
+    )
+
+
+def worker_name():
+    """Identifier of current worker process"""
+    return f'{socket.gethostname()}:{os.getpid()}'[:64]
+
+
+def claim(worker, limit):
+    """Lock up to limit due tasks for worker, returns them"""
+    from .models import BackgroundTask  # pylint: disable=C0415
+
+    now = timezone.now()
+    expired = Q(status=BackgroundTask.Status.RUNNING, locked_until__lt=now)
+    # the worker died on every attempt (killed on a huge file, crashed), give up
+    BackgroundTask.objects.filter(expired, attempts__gte=F('max_attempts')).update(
+        status=BackgroundTask.Status.FAILED, locked_until=None,
+        last_error='Visibility timeout expired on the last attempt',
+    )
+    due = (
+        Q(status=BackgroundTask.Status.PENDING, run_after__lte=now)
+        # running tasks whose worker did not finish within the visibility timeout
+        | (expired & Q(attempts__lt=F('max_attempts')))
+    )
+    ids = list(BackgroundTask.objects.filter(due).order_by('run_after', 'id')
+               .values_list('id', flat=True)[:limit])
+    if not ids:
+        return []
+
+    # the condition is checked again by the UPDATE, so concurrent workers never share a task
+    with transaction.atomic():
+        BackgroundTask.objects.filter(due, id__in=ids).update(
+            status=BackgroundTask.Status.RUNNING,
+            locked_until=now + timedelta(seconds=settings.TASK_VISIBILITY_TIMEOUT),
+            locked_by=worker,
+            attempts=F('attempts') + 1,
+        )
+        claimed = list(BackgroundTask.objects.filter(
+            id__in=ids, locked_by=worker, status=BackgroundTask.Status.RUNNING
+        ))
+    for claimed_task in claimed:
+        timeout = getattr(REGISTRY.get(claimed_task.name), 'timeout', None)
+        if timeout and timeout != settings.TASK_VISIBILITY_TIMEOUT:
+            BackgroundTask.objects.filter(pk=claimed_task.pk, locked_by=worker).update(
+                locked_until=now + timedelta(seconds=timeout)
+            )
+    return claimed
+
+
+def execute(background_task):
+    """Run claimed task, then delete it or schedule a retry"""
+    from .models import BackgroundTask  # pylint: disable=C0415
+
+    # a worker which outlived its visibility timeout must not touch a reclaimed task
+    claimed = BackgroundTask.objects.filter(
+        pk=background_task.pk, locked_by=background_task.locked_by,
+        attempts=background_task.attempts,
+    )
+    try:
+        resolve(background_task.name)(*background_task.args)
+    except Exception as exc:  # pylint: disable=broad-except
+        logger.exception("Background task %s failed", background_task)
+        if background_task.attempts < background_task.max_attempts:
+            delay = settings.TASK_RETRY_DELAY * 2 ** (background_task.attempts - 1)
+            claimed.update(
+                status=BackgroundTask.Status.PENDING, locked_until=None, locked_by='',
+                run_after=timezone.now() + timedelta(seconds=delay), last_error=repr(exc),
+            )
+        else:
+            claimed.update(
+                status=BackgroundTask.Status.FAILED, locked_until=None, last_error=repr(exc),
+            )
+        return False
+    claimed.delete()
+    return True
+
+
+def run_pending(limit=None, worker=None):
+    """Run due tasks in the current process until none is left, returns the number run"""
+    worker = worker or worker_name()
+    done = 0
+    while limit is None or done < limit:
+        batch = claim(worker, settings.TASK_BATCH_SIZE if limit is None
+                      else min(settings.TASK_BATCH_SIZE, limit - done))
+        if not batch:
+            break
+        for background_task in batch:
+            execute(background_task)
+            done += 1
+    return done
+
+
+def work(stop_event=None, poll_interval=None, once=False):
+    """Worker loop: run due tasks, sleep when the queue is empty"""
+    worker = worker_name()
+    poll_interval = settings.TASK_POLL_INTERVAL if poll_interval is None else poll_interval
+    logger.info("Worker %s started", worker)
+    while stop_event is None or not stop_event.is_set():
+        close_old_connections()
+        try:
+            done = run_pending(worker=worker)
+        finally:
+            close_old_connections()
+        if once:
+            break
+        if not done:
+            if stop_event is not None:
+                stop_event.wait(poll_interval)
+            else:
+                time.sleep(poll_interval)
+    logger.info("Worker %s stopped", worker)
+
+
+def worker_process(stop_event, poll_interval, once):
+    """Entry point of a worker started by run_workers"""
+    import django  # pylint: disable=C0415
+    from django.apps import apps  # pylint: disable=C0415
+
+    if not apps.ready:
+        # spawned (not forked) processes start without configured Django
+        django.setup()
+    try:
+        work(stop_event, poll_interval, once)
+    except KeyboardInterrupt:
+        pass
+
+
+@task
+def update_track_duration(track_id):
+    """Compute duration of track mp3"""
+    from .models import Track  # pylint: disable=C0415
+
+    track = Track.objects.filter(pk=track_id).first()
+    if track is not None:
+        track.update_duration()
+
+
+@task(timeout=1800)
+def analyse_track(track_id):
+    """Compute waveform and loudness of track mp3"""
+    from . import track_analysis  # pylint: disable=C0415
+
+    track_analysis.analyse_track_ids([track_id])
@@ -1,6 +1,6 @@
 """Player tags file"""
 from django import template
-from player import data_for_tests
+from player import data_for_tests, thumbnails
 
 register = template.Library()
 
@@ -8,3 +8,25 @@ register = template.Library()
 def get_lowermenu():
     """Getting lower_menu"""
     return data_for_tests.lowermenu_buttons
+
+@register.simple_tag
+def thumbnail(image, size):
+    """Url of image resized to one of THUMBNAIL_SIZES"""
+    return thumbnails.thumbnail_url(image, size)
+
+@register.simple_tag(takes_context=True)
+def cursor_url(context, cursor):
+    """Query string of current page with another pagination cursor"""
+    params = context['request'].GET.copy()
+    params['cursor'] = cursor
+    params.pop('page', None)
+    return f"?{params.urlencode()}"
+
+@register.filter
+def duration(seconds):
+    """Format duration in seconds like 3:05 or 1:02:03"""
+    hours, remainder = divmod(int(seconds or 0), 3600)
+    minutes, seconds = divmod(remainder, 60)
+    if hours:
+        return f"{hours}:{minutes:02}:{seconds:02}"
+    return f"{minutes}:{seconds:02}"
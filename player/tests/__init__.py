@@ -0,0 +1 @@
+"""Tests of player app, one module per feature"""
@@ -1,22 +1,18 @@
-"""Tests for app"""
+"""Tests for models, views and admin of player"""
+import tempfile
 import uuid
 from unittest.mock import patch
 from django.contrib.auth import get_user_model
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
 from pytils.translit import slugify
-
-from .models import (
-    Genre,
-    Artist,
-    Track,
-    Album
-)
+from ..models import Genre, Artist, Track, Album
 
 User = get_user_model()
 
 
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
 class ModelTests(TestCase):
     """Tests for app"""
     def setUp(self):
@@ -73,6 +69,7 @@ class ModelTests(TestCase):
         self.assertIn(self.track, self.album.tracks.all())
 
 
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
 class ViewTests(TestCase):
     """View tests"""
     def setUp(self):
@@ -136,6 +133,7 @@ class ViewTests(TestCase):
         self.assertContains(response, self.track.name)
 
 
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
 class AdminTests(TestCase):
     """Tests for admin"""
     def setUp(self):
@@ -0,0 +1,41 @@
+"""Tests for denormalised artist tracks"""
+import io
+import uuid
+from django.core.management import call_command
+from django.test import TestCase
+from ..models import Genre, Artist, Track, ArtistTrack
+
+
+class ArtistTrackTests(TestCase):
+    """Tests for denormalised artist membership"""
+    def setUp(self):
+        """Set up data for test"""
+        self.genre = Genre.objects.create(name=f"Rock {uuid.uuid4().hex[:6]}")
+        self.main = Artist.objects.create(name="Main", slug="main-member", genre=self.genre)
+        self.guest = Artist.objects.create(name="Guest", slug="guest-member", genre=self.genre)
+        self.track = Track.objects.create(name='Member', main_author=self.main, genre=self.genre)
+
+    def memberships(self):
+        """Set of (artist id, role) of the track"""
+        return set(ArtistTrack.objects.filter(track=self.track).values_list('artist_id', 'role'))
+
+    def test_signals_keep_membership(self):
+        """Tests track save and featured_authors changes in both directions"""
+        self.assertEqual(self.memberships(), {(self.main.id, ArtistTrack.Role.MAIN)})
+
+        self.track.featured_authors.add(self.guest)
+        self.assertIn((self.guest.id, ArtistTrack.Role.FEATURED), self.memberships())
+        self.guest.featured_artists.remove(self.track)
+        self.assertEqual(self.memberships(), {(self.main.id, ArtistTrack.Role.MAIN)})
+
+        self.track.main_author = self.guest
+        self.track.save()
+        self.assertEqual(self.memberships(), {(self.guest.id, ArtistTrack.Role.MAIN)})
+
+    def test_backfill_command(self):
+        """Tests rebuild_artist_tracks restores missing rows"""
+        self.track.featured_authors.add(self.guest)
+        ArtistTrack.objects.all().delete()
+        call_command('rebuild_artist_tracks', stdout=io.StringIO())
+        self.assertEqual(self.memberships(), {(self.main.id, ArtistTrack.Role.MAIN),
+                                              (self.guest.id, ArtistTrack.Role.FEATURED)})
@@ -0,0 +1,155 @@
+"""Tests for track durations and audio analysis"""
+import io
+import os
+import tempfile
+import uuid
+from unittest.mock import patch
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.conf import settings
+from django.urls import reverse
+from django.core.files.uploadedfile import SimpleUploadedFile
+import numpy as np
+from ..models import Genre, Artist, Track, Album, TrackAnalysis, BackgroundTask
+from .. import audio_analysis, tasks
+
+User = get_user_model()
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class TrackDurationTests(TestCase):
+    """Tests for track duration"""
+    def setUp(self):
+        """Set up data for test"""
+        self.genre = Genre.objects.create(name=f"Rock {uuid.uuid4().hex[:6]}")
+        self.artist = Artist.objects.create(
+            name="Main", slug=f"main-{uuid.uuid4().hex[:6]}", genre=self.genre
+        )
+        mp3_path = os.path.join(settings.BASE_DIR, 'media', 'tracks', 'Outro.mp3')
+        with open(mp3_path, 'rb') as file:
+            self.track = Track.objects.create(
+                name='Outro', main_author=self.artist, genre=self.genre,
+                mp3=SimpleUploadedFile('outro.mp3', file.read()),
+                logo=SimpleUploadedFile("track.jpg", b"fakeimagecontent")
+            )
+
+    def test_duration_computed_on_upload_only(self):
+        """Tests that mp3 is parsed when the file changes only"""
+        track = Track.objects.get(pk=self.track.pk)
+        self.assertGreater(track.duration, 0)
+
+        with patch('player.models.read_mp3_duration') as read_duration:
+            track.name = 'Renamed'
+            track.save()
+            read_duration.assert_not_called()
+
+    @override_settings(TRACK_DURATION_IN_BACKGROUND=True, TRACK_ANALYSIS_ON_UPLOAD=True)
+    def test_upload_processed_by_workers_when_enabled(self):
+        """Tests duration and analysis of a new mp3 are queued for run_workers"""
+        self.assertFalse(BackgroundTask.objects.exists())
+        self.track.mp3 = SimpleUploadedFile('again.mp3', self.track.mp3.read())
+        Track.objects.filter(pk=self.track.pk).update(duration=0)
+        self.track.duration = 0
+        self.track.save()
+        self.assertEqual(sorted(BackgroundTask.objects.values_list('name', flat=True)),
+                         [tasks.analyse_track.task_name, tasks.update_track_duration.task_name])
+        self.assertEqual(Track.objects.get(pk=self.track.pk).duration, 0)
+
+        with patch('player.track_analysis.analyse_track_ids'):
+            tasks.run_pending()
+        self.assertGreater(Track.objects.get(pk=self.track.pk).duration, 0)
+
+    def test_unknown_duration_backfilled_by_command(self):
+        """Tests saving a track without duration queues nothing, the command fills it"""
+        Track.objects.filter(pk=self.track.pk).update(duration=0)
+        track = Track.objects.get(pk=self.track.pk)
+        track.name = 'Renamed'
+        track.save()
+        self.assertFalse(BackgroundTask.objects.exists())
+
+        out = io.StringIO()
+        call_command('update_durations', stdout=out)
+        track.refresh_from_db()
+        self.assertGreater(track.duration, 0)
+        self.assertIn("Обновлена длительность треков: 1", out.getvalue())
+
+    def test_total_duration_aggregation(self):
+        """Tests album duration summed in SQL"""
+        other = Track.objects.create(
+            name='Other', main_author=self.artist, genre=self.genre,
+            logo=SimpleUploadedFile("track.jpg", b"fakeimagecontent")
+        )
+        Track.objects.filter(pk=other.pk).update(duration=100)
+        album = Album.objects.create(
+            name='Album', slug='album', main_author=self.artist, genre=self.genre,
+            logo=SimpleUploadedFile("album.jpg", b"fakeimagecontent")
+        )
+        album.tracks.add(self.track, other)
+        self.track.refresh_from_db()
+
+        User.objects.create_user(username='testuser', password='testpass123')
+        self.client.login(username='testuser', password='testpass123')
+        response = self.client.get(reverse('show_album', kwargs={
+            'artist_slug': self.artist.slug, 'album_slug': album.slug
+        }))
+        self.assertEqual(response.context['tracks_count'], 2)
+        self.assertEqual(response.context['total_duration'], self.track.duration + 100)
+
+
+def make_mp3_frames(gains):
+    """MPEG-1 Layer III stereo frames (128 kbit/s) with global_gain of both granules"""
+    frames = b''
+    for gain in gains:
+        side_info = 0
+        for block in range(4):  # 2 granules x 2 channels, 59 bits each after 20 bits
+            side_info |= gain << (256 - 20 - block * 59 - 21 - 8)
+        frame = b'\xff\xfb\x90\x00' + side_info.to_bytes(32, 'big')
+        frames += frame.ljust(417, b'\x00')
+    return frames
+
+
+class AudioAnalysisTests(TestCase):
+    """Tests for waveform and loudness analysis"""
+    def test_frame_gains_without_decoder(self):
+        """Tests gains of mp3 frames become a rising waveform"""
+        data = b'ID3\x03\x00\x00\x00\x00\x00\x02xx' + make_mp3_frames(range(150, 210, 2))
+        gains, sample_rate = audio_analysis.frame_gains(data)
+        self.assertEqual(sample_rate, 44100)
+        self.assertEqual(list(gains[:4]), [150, 150, 152, 152])
+
+        result = audio_analysis.analyse_frames(data, points=10)
+        self.assertEqual(len(result['peaks']), 10)
+        self.assertEqual(list(result['peaks']), sorted(result['peaks']))
+        self.assertEqual(result['peaks'][-1], 255)
+
+    def test_loudness_of_sine(self):
+        """Tests gated loudness of a full-scale sine"""
+        samples = np.sin(np.arange(44100 * 3) * 2 * np.pi * 440 / 44100)
+        result = audio_analysis.analyse_samples(samples, 44100, points=100)
+        self.assertAlmostEqual(result['loudness'], -3.70, places=2)
+        self.assertIsNone(audio_analysis.integrated_loudness(np.zeros(10)))
+
+    def test_waveform_endpoint(self):
+        """Tests JSON and binary responses with ETag revalidation"""
+        genre = Genre.objects.create(name=f"Rock {uuid.uuid4().hex[:6]}")
+        artist = Artist.objects.create(name="Wave", slug="wave", genre=genre)
+        track = Track.objects.create(name='Wave', main_author=artist, genre=genre)
+        TrackAnalysis.objects.create(track=track, mp3_name='x.mp3', peaks=bytes([0, 128, 255]),
+                                     loudness=-9.5, replay_gain=-4.5, method='pcm')
+        User.objects.create_user(username='testuser', password='testpass123')
+        self.client.login(username='testuser', password='testpass123')
+
+        url = reverse('track_waveform', kwargs={'track_id': track.id})
+        response = self.client.get(url)
+        self.assertEqual(response.json()['peaks'], [0, 128, 255])
+        self.assertIn('max-age', response['Cache-Control'])
+        self.assertEqual(self.client.get(url, {'format': 'bin'}).content, bytes([0, 128, 255]))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        TrackAnalysis.objects.filter(track=track).update(loudness=None, replay_gain=None)
+        response = self.client.get(url, {'format': 'bin'})
+        self.assertEqual(response.content, bytes([0, 128, 255]))
+        self.assertNotIn('X-Loudness', response)
+        self.assertNotIn('X-Replay-Gain', response)
@@ -0,0 +1,84 @@
+"""Tests for trending charts"""
+import uuid
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.conf import settings
+from django.urls import reverse
+from django.utils import timezone
+from ..models import Genre, Artist, Track, ChartScore
+from .. import charts
+
+User = get_user_model()
+
+
+class ChartTests(TestCase): # pylint: disable=R0902
+    """Tests for time-decayed trending charts"""
+    def setUp(self):
+        """Set up data for test"""
+        self.rock = Genre.objects.create(name=f"Rock {uuid.uuid4().hex[:6]}")
+        self.jazz = Genre.objects.create(name=f"Jazz {uuid.uuid4().hex[:6]}")
+        self.band = Artist.objects.create(name="Band", slug="band", genre=self.rock,
+                                          logo='artists/band.jpg')
+        self.trio = Artist.objects.create(name="Trio", slug="trio", genre=self.jazz)
+        self.old_hit, self.new_hit, self.unreleased = [
+            Track.objects.create(name=f'Rock {i}', main_author=self.band, genre=self.rock,
+                                 logo='tracks_logo/rock.jpg', play_count=100 - i)
+            for i in range(3)
+        ]
+        self.unreleased.is_published = Track.Status.UNRELEASED
+        self.unreleased.save()
+        self.jazz_track = Track.objects.create(name='Jazz', main_author=self.trio,
+                                               genre=self.jazz, logo='tracks_logo/jazz.jpg')
+        self.half_life = timedelta(seconds=settings.CHART_HALF_LIFE)
+        User.objects.create_user(username='testuser', password='testpass123')
+        self.client.login(username='testuser', password='testpass123')
+
+    def play(self, counts, ago):
+        """Record {track: plays} played ago half-lives before now"""
+        charts.record({track.pk: plays for track, plays in counts.items()},
+                      timezone.now() - ago * self.half_life)
+
+    def test_recent_plays_outrank_old_ones(self):
+        """Tests scores halve every half-life and charts skip unpublished tracks"""
+        self.play({self.old_hit: 8, self.unreleased: 50}, ago=3)
+        self.play({self.new_hit: 2, self.jazz_track: 3}, ago=0)
+
+        top = charts.top(ChartScore.Kind.TRACK)
+        self.assertEqual([pk for pk, _ in top],
+                         [self.jazz_track.pk, self.new_hit.pk, self.old_hit.pk])
+        self.assertAlmostEqual(dict(top)[self.old_hit.pk], 1.0, places=3)
+        self.assertEqual(charts.top_track_ids(self.rock), [self.new_hit.pk, self.old_hit.pk])
+        self.assertEqual([pk for pk, _ in charts.top(ChartScore.Kind.ARTIST)],
+                         [self.band.pk, self.trio.pk])
+
+    @override_settings(CHART_REBASE_HALF_LIVES=1, CHART_PRUNE_SCORE=0.1)
+    def test_rebase_keeps_order_and_prunes(self):
+        """Tests moving the epoch rescales scores and drops decayed rows"""
+        self.play({self.old_hit: 1, self.jazz_track: 8}, ago=5)
+        self.play({self.new_hit: 1}, ago=0)
+
+        self.assertFalse(ChartScore.objects.filter(object_id=self.old_hit.pk,
+                                                   kind=ChartScore.Kind.TRACK).exists())
+        top = dict(charts.top(ChartScore.Kind.TRACK))
+        self.assertAlmostEqual(top[self.jazz_track.pk], 0.25, places=3)
+        self.assertAlmostEqual(top[self.new_hit.pk], 1.0, places=3)
+
+    def test_chart_pages_queue_and_artist_top(self):
+        """Tests chart pages, their play queue and trending top of artist page"""
+        self.play({self.old_hit: 1, self.new_hit: 5, self.jazz_track: 3}, ago=0)
+
+        response = self.client.get(reverse('charts'))
+        self.assertEqual(response.context['tracks_for_column'],
+                         [self.new_hit, self.jazz_track, self.old_hit])
+        self.assertEqual(response.context['top_genres'], [self.rock, self.jazz])
+        response = self.client.get(reverse('genre_chart', kwargs={'genre_slug': self.jazz.slug}))
+        self.assertEqual(response.context['tracks_for_column'], [self.jazz_track])
+
+        url = reverse('play_queue', kwargs={'context': 'chart'})
+        page = self.client.get(url, {'genre': self.rock.slug}).json()
+        self.assertEqual([track['id'] for track in page['tracks']],
+                         [self.new_hit.pk, self.old_hit.pk])
+
+        response = self.client.get(reverse('artist', kwargs={'artist_slug': self.band.slug}))
+        self.assertEqual(response.context['tracks_for_column'][:2], [self.new_hit, self.old_hit])
@@ -0,0 +1,29 @@
+"""Tests for database profiles"""
+import tempfile
+from django.test import TestCase
+from ml_music import databases
+from .. import db_benchmark
+
+
+class DatabaseProfileTests(TestCase):
+    """Tests for production database profiles"""
+    def test_sqlite_profile_pragmas(self):
+        """Tests tuned SQLite connections use WAL and relaxed syncing"""
+        directory = tempfile.mkdtemp()
+        wal_connection = db_benchmark.connect(databases.sqlite(f'{directory}/wal.sqlite3'))
+        try:
+            with wal_connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                self.assertEqual(cursor.fetchone()[0], 'wal')
+                cursor.execute('PRAGMA synchronous')
+                self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+        finally:
+            wal_connection.close()
+
+    def test_write_benchmark(self):
+        """Tests every profile completes all writes of concurrent writers"""
+        reports = db_benchmark.run_benchmark(writers=(3,), operations=5)
+        self.assertEqual(set(reports), {'sqlite-default', 'sqlite-wal'})
+        for results in reports.values():
+            self.assertEqual(results[0]['writes'] + results[0]['errors'], 3 * 5 + 3 * 4)
+        self.assertEqual(reports['sqlite-wal'][0]['errors'], 0)
@@ -0,0 +1,149 @@
+"""Tests for media storage and thumbnails"""
+import io
+import os
+import tempfile
+import uuid
+from unittest.mock import patch
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.urls import reverse
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+from ..models import Genre, Artist, Track
+from .. import thumbnails
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ThumbnailTests(TestCase):
+    """Tests for image derivatives"""
+    def setUp(self):
+        """Set up data for test"""
+        cache.clear()
+        self.genre = Genre.objects.create(name=f"Rock {uuid.uuid4().hex[:6]}")
+
+    def make_artist(self, logo):
+        """Artist with uploaded logo"""
+        return Artist.objects.create(name="Pic", slug=f"pic-{uuid.uuid4().hex[:6]}",
+                                     genre=self.genre, logo=logo)
+
+    @staticmethod
+    def make_image(size):
+        """Uploaded png of size"""
+        buffer = io.BytesIO()
+        Image.new('RGB', size, 'red').save(buffer, 'PNG')
+        return SimpleUploadedFile("logo.png", buffer.getvalue())
+
+    def test_thumbnail_generated_and_shared(self):
+        """Tests resized derivative with content hash name shared by identical uploads"""
+        first = self.make_artist(self.make_image((1200, 600)))
+        second = self.make_artist(self.make_image((1200, 600)))
+
+        url = thumbnails.resolve(first.logo.name, 'icon')
+        self.assertEqual(thumbnails.resolve(second.logo.name, 'icon'), url)
+        name = url[len(settings.MEDIA_URL):]
+        self.assertTrue(name.startswith('thumbnails/'))
+        with default_storage.open(name) as file, Image.open(file) as image:
+            self.assertEqual(image.size, (80, 40))
+        self.assertEqual(thumbnails.thumbnail_url(first.logo, 'icon'), url)
+
+    def test_rendering_links_unresolved_images_to_view(self):
+        """Tests pages never generate derivatives, the view does it once and redirects"""
+        artist = self.make_artist(self.make_image((1200, 600)))
+        with patch.object(thumbnails, 'generate') as generate:
+            view_url = thumbnails.thumbnail_url(artist.logo, 'card')
+        generate.assert_not_called()
+        self.assertEqual(view_url, reverse('thumbnail', args=['card', artist.logo.name]))
+
+        response = self.client.get(view_url)
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response['Location'].startswith(settings.MEDIA_URL + 'thumbnails/'))
+        self.assertEqual(thumbnails.thumbnail_url(artist.logo, 'card'), response['Location'])
+
+        self.assertEqual(self.client.get(reverse('thumbnail', args=['huge', artist.logo.name]))
+                         .status_code, 404)
+        self.assertEqual(self.client.get(reverse('thumbnail', args=['card', 'missing.png']))
+                         .status_code, 404)
+
+    def test_racing_workers_leave_no_orphans(self):
+        """Tests a derivative written twice keeps its name and no suffixed copy"""
+        artist = self.make_artist(self.make_image((1200, 600)))
+        target = thumbnails.generate(artist.logo.name, 'icon')
+        with thumbnails.derivative_storage.open(target) as file:
+            thumbnails.store(target, file.read())
+        directory = os.path.dirname(thumbnails.derivative_storage.path(target))
+        self.assertEqual(os.listdir(directory), [os.path.basename(target)])
+
+    def test_broken_image_falls_back_to_original(self):
+        """Tests files Pillow can not read keep the original url"""
+        artist = self.make_artist(SimpleUploadedFile("artist.jpg", b"fakeimagecontent"))
+        self.assertEqual(thumbnails.resolve(artist.logo.name, 'card'), artist.logo.url)
+        self.assertEqual(thumbnails.thumbnail_url(artist.logo, 'card'), artist.logo.url)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ContentAddressedStorageTests(TestCase):
+    """Tests for deduplicating media storage"""
+    def setUp(self):
+        """Set up data for test"""
+        self.genre = Genre.objects.create(name=f"Rock {uuid.uuid4().hex[:6]}")
+
+    def test_identical_uploads_share_file(self):
+        """Tests deduplication and reference counted deletes"""
+        first = default_storage.save('tracks/a.mp3', SimpleUploadedFile('a.mp3', b'same'))
+        second = default_storage.save('tracks/b.MP3', SimpleUploadedFile('b.mp3', b'same'))
+        self.assertEqual(first, second)
+        self.assertTrue(first.startswith('cas/') and first.endswith('.mp3'))
+        self.assertEqual(default_storage.references(first), 2)
+
+        default_storage.delete(first)
+        self.assertTrue(default_storage.exists(first))
+        default_storage.delete(first)
+        self.assertFalse(default_storage.exists(first))
+
+    def test_deleted_object_releases_file(self):
+        """Tests deleting an artist drops its reference after commit"""
+        artist = Artist.objects.create(name="Cas", slug="cas", genre=self.genre,
+                                       logo=SimpleUploadedFile("a.jpg", b"released cover"))
+        name = artist.logo.name
+        with self.captureOnCommitCallbacks(execute=True):
+            artist.delete()
+        self.assertFalse(default_storage.exists(name))
+
+    def test_replaced_file_releases_reference(self):
+        """Tests replacing a file drops the reference of the previous one"""
+        artist = Artist.objects.create(name="Cas", slug="cas", genre=self.genre,
+                                       logo=SimpleUploadedFile("a.jpg", b"old cover"))
+        old_name = artist.logo.name
+        with self.captureOnCommitCallbacks(execute=True):
+            artist.logo = SimpleUploadedFile("b.jpg", b"new cover")
+            artist.save()
+        self.assertFalse(default_storage.exists(old_name))
+        self.assertEqual(default_storage.references(artist.logo.name), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            artist.logo = SimpleUploadedFile("c.jpg", b"new cover")
+            artist.save()
+            artist.name = "Renamed"
+            artist.save()
+        self.assertEqual(default_storage.references(artist.logo.name), 1)
+
+    def test_dedupe_media_command(self):
+        """Tests legacy duplicates are moved, repointed and recounted"""
+        legacy = FileSystemStorage()
+        artist_logo = legacy.save('artists/cover.jpg', SimpleUploadedFile('c.jpg', b'cover'))
+        track_logo = legacy.save('tracks_logo/copy.jpg', SimpleUploadedFile('c.jpg', b'cover'))
+        artist = Artist.objects.create(name="Old", slug="old", genre=self.genre)
+        track = Track.objects.create(name='Old', main_author=artist, genre=self.genre)
+        Artist.objects.filter(pk=artist.pk).update(logo=artist_logo)
+        Track.objects.filter(pk=track.pk).update(logo=track_logo)
+
+        call_command('dedupe_media', stdout=io.StringIO())
+        artist.refresh_from_db()
+        track.refresh_from_db()
+        self.assertEqual(artist.logo.name, track.logo.name)
+        self.assertEqual(default_storage.references(artist.logo.name), 2)
+        self.assertFalse(legacy.exists(artist_logo))
+        self.assertFalse(legacy.exists(track_logo))
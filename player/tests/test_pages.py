@@ -0,0 +1,144 @@
+"""Tests for cached page parts and query budgets of pages"""
+import tempfile
+import uuid
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.test import TestCase, override_settings
+from django.core.cache import cache
+from django.urls import reverse
+from django.core.files.uploadedfile import SimpleUploadedFile
+from ..models import Genre, Artist, Track, Album, Playlist
+from .. import benchmarks, home_feed, playlist_sidebar
+
+User = get_user_model()
+
+
+@override_settings(HOME_FEED_TRACKS_PER_GENRE=2)
+class HomeFeedTests(TestCase):
+    """Tests for cached home feed"""
+    def setUp(self):
+        """Set up data for test"""
+        self.genre = Genre.objects.create(name=f"Rock {uuid.uuid4().hex[:6]}")
+        self.artist = Artist.objects.create(
+            name="Main", slug=f"main-{uuid.uuid4().hex[:6]}", genre=self.genre
+        )
+        self.tracks = [
+            Track.objects.create(name=f'Track {i}', main_author=self.artist,
+                                 genre=self.genre, play_count=i)
+            for i in range(3)
+        ]
+
+    def test_feed_is_bounded_and_cached(self):
+        """Tests top-N tracks per genre and cache hit without queries"""
+        feed = home_feed.get()
+        self.assertEqual(feed['tracks_by_genre'][self.genre], self.tracks[:0:-1])
+
+        with self.assertNumQueries(0):
+            home_feed.get()
+
+    def test_feed_invalidated_on_save(self):
+        """Tests that saving a track drops cached feed"""
+        home_feed.get()
+        self.tracks[0].play_count = 10
+        self.tracks[0].save()
+        feed = home_feed.get()
+        self.assertEqual(feed['tracks_by_genre'][self.genre][0], self.tracks[0])
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class PlaylistSidebarTests(TestCase):
+    """Tests for cached playlist sidebar"""
+    def setUp(self):
+        """Set up data for test"""
+        cache.clear()
+        self.owner = User.objects.create_user(username='owner', password='testpass123')
+        self.friend = User.objects.create_user(username='friend', password='testpass123')
+        self.playlist = Playlist.objects.create(
+            name='Sidebar', owner=self.owner,
+            logo=SimpleUploadedFile("playlist.jpg", b"fakeimagecontent")
+        )
+
+    def test_sidebar_cached(self):
+        """Tests warm sidebar costs no queries"""
+        sidebar = playlist_sidebar.get(self.owner)
+        self.assertEqual([item['id'] for item in sidebar['owned_playlists']], [self.playlist.id])
+        self.assertEqual(sidebar['owned_playlists'][0]['owner'], 'owner')
+
+        with self.assertNumQueries(0):
+            playlist_sidebar.get(self.owner)
+
+    def test_sidebar_invalidated(self):
+        """Tests playlist and added_users changes drop cached sidebars"""
+        self.assertEqual(playlist_sidebar.get(self.friend)['added_playlists'], [])
+        self.playlist.added_users.add(self.friend)
+        self.assertEqual(len(playlist_sidebar.get(self.friend)['added_playlists']), 1)
+
+        playlist_sidebar.get(self.owner)
+        self.playlist.name = 'Renamed'
+        self.playlist.save()
+        self.assertEqual(playlist_sidebar.get(self.owner)['owned_playlists'][0]['name'], 'Renamed')
+        self.assertEqual(playlist_sidebar.get(self.friend)['added_playlists'][0]['name'], 'Renamed')
+
+        self.friend.friends.remove(self.playlist)
+        self.assertEqual(playlist_sidebar.get(self.friend)['added_playlists'], [])
+
+
+class QueryBudgetTests(TestCase):
+    """Tests query budgets of player views"""
+    def test_views_within_budgets(self):
+        """Tests every benchmarked view on a small synthetic catalogue"""
+        catalogue = benchmarks.seed_catalogue(
+            {'artists': 5, 'tracks': 60, 'albums': 10, 'playlists': 4, 'users': 3}
+        )
+        report = benchmarks.run_benchmarks(catalogue, repeat=1)
+        self.assertEqual(set(report), set(benchmarks.VIEW_BUDGETS))
+        for name, result in report.items():
+            self.assertIn(result['status'], (200, 302), name)
+        self.assertEqual(benchmarks.check_budgets(report), [])
+
+
+class ArtistPageTests(TestCase):
+    """Tests for artist page queries"""
+    def setUp(self):
+        """Set up data for test"""
+        self.genre = Genre.objects.create(name=f"Rock {uuid.uuid4().hex[:6]}")
+        self.artist = Artist.objects.create(
+            name="Artist", slug=f"artist-{uuid.uuid4().hex[:6]}", genre=self.genre,
+            logo='artists/artist.jpg'
+        )
+        self.guest = Artist.objects.create(
+            name="Guest", slug=f"guest-{uuid.uuid4().hex[:6]}", genre=self.genre
+        )
+        User.objects.create_user(username='testuser', password='testpass123')
+        self.client.login(username='testuser', password='testpass123')
+
+    def add_tracks(self, count):
+        """Create tracks of artist, every other one as a featured author"""
+        for i in range(count):
+            track = Track.objects.create(
+                name=f'Artist {i}', genre=self.genre, play_count=i, logo='tracks_logo/t.jpg',
+                main_author=self.artist if i % 2 else self.guest,
+            )
+            if not i % 2:
+                track.featured_authors.add(self.artist)
+            Album.objects.create(name=f'Album {i}', slug=f'album-{i}', main_author=self.artist,
+                                 genre=self.genre, logo='playlists/a.jpg')
+
+    def test_query_count_is_fixed(self):
+        """Tests artist page costs the same number of queries for any catalogue size"""
+        url = reverse('artist', kwargs={'artist_slug': self.artist.slug})
+        self.add_tracks(3)
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(url)
+
+        self.add_tracks(12)
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(url)
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+
+        top = [track.play_count for track in response.context['tracks_for_column']]
+        self.assertEqual(top, [11, 10, 9, 8, 7])
+        self.assertEqual(len(response.context['all_author_tracks']), 7)
@@ -0,0 +1,151 @@
+"""Tests for the play queue and keyset pagination"""
+import tempfile
+import uuid
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.core.files.uploadedfile import SimpleUploadedFile
+from ..models import Genre, Artist, Track
+from ..pagination import KeysetPaginator
+
+User = get_user_model()
+
+
+class PlayQueueTests(TestCase):
+    """Tests for play queue endpoint"""
+    def setUp(self):
+        """Set up data for test"""
+        self.genre = Genre.objects.create(name=f"Rock {uuid.uuid4().hex[:6]}")
+        self.artist = Artist.objects.create(
+            name="Main", slug=f"main-{uuid.uuid4().hex[:6]}", genre=self.genre
+        )
+        self.tracks = [
+            Track.objects.create(name=f'Queue {i}', main_author=self.artist, genre=self.genre)
+            for i in range(5)
+        ]
+        User.objects.create_user(username='testuser', password='testpass123')
+        self.client.login(username='testuser', password='testpass123')
+
+    def get_all(self, url, **params):
+        """Walk queue pages following cursors"""
+        ids = []
+        params['limit'] = 2
+        while True:
+            page = self.client.get(url, params).json()
+            ids += [track['id'] for track in page['tracks']]
+            if not page['next_cursor']:
+                return ids
+            params.pop('start', None)
+            params['cursor'] = page['next_cursor']
+
+    def test_home_queue_pages(self):
+        """Tests cursor pages cover the whole queue without COUNT queries"""
+        url = reverse('play_queue', kwargs={'context': 'home'})
+        self.assertEqual(self.get_all(url), [track.id for track in self.tracks])
+        self.assertEqual(self.get_all(url, start=self.tracks[3].id),
+                         [track.id for track in self.tracks[3:]])
+
+    def test_artist_and_search_queue(self):
+        """Tests artist ordering and ranked search queue"""
+        url = reverse('play_queue', kwargs={'context': 'artist'})
+        self.assertEqual(self.get_all(url, slug=self.artist.slug),
+                         [track.id for track in reversed(self.tracks)])
+
+        url = reverse('play_queue', kwargs={'context': 'search'})
+        self.assertEqual(sorted(self.get_all(url, query='queue')),
+                         [track.id for track in self.tracks])
+
+    def test_bad_requests(self):
+        """Tests invalid cursor and unknown context"""
+        url = reverse('play_queue', kwargs={'context': 'home'})
+        self.assertEqual(self.client.get(url, {'cursor': '!!!'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'limit': 0}).status_code, 400)
+        url = reverse('play_queue', kwargs={'context': 'unknown'})
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    async def test_async_queue_and_search(self):
+        """Tests async queue view served through ASGI requests"""
+        await self.async_client.alogin(username='testuser', password='testpass123')
+        url = reverse('play_queue', kwargs={'context': 'artist'})
+        response = await self.async_client.get(url, {'slug': self.artist.slug, 'limit': 2})
+        self.assertEqual([track['id'] for track in response.json()['tracks']],
+                         [self.tracks[4].id, self.tracks[3].id])
+
+        url = reverse('play_queue', kwargs={'context': 'search'})
+        response = await self.async_client.get(url, {'query': 'queue', 'start': self.tracks[0].id})
+        self.assertEqual(response.json()['tracks'][0]['id'], self.tracks[0].id)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class KeysetPaginationTests(TestCase):
+    """Tests for cursor pagination of track lists"""
+    def setUp(self):
+        """Set up data for test"""
+        self.genre = Genre.objects.create(name=f"Rock {uuid.uuid4().hex[:6]}")
+        self.artist = Artist.objects.create(
+            name="Keyset", slug=f"keyset-{uuid.uuid4().hex[:6]}", genre=self.genre,
+            logo=SimpleUploadedFile("artist.jpg", b"fakeimagecontent")
+        )
+        self.tracks = [
+            Track.objects.create(name=f'Keyset {i}', main_author=self.artist, genre=self.genre,
+                                 logo=SimpleUploadedFile("track.jpg", b"fakeimagecontent"))
+            for i in range(5)
+        ]
+        # equal keys are ordered by the unique id
+        Track.objects.filter(pk__in=[track.pk for track in self.tracks]).update(
+            publication_time=self.tracks[0].publication_time
+        )
+        User.objects.create_user(username='testuser', password='testpass123')
+        self.client.login(username='testuser', password='testpass123')
+
+    def test_forward_and_backward_pages(self):
+        """Tests next and previous cursors walk the list in both directions"""
+        paginator = KeysetPaginator(Track.objects.filter(main_author=self.artist),
+                                    ('-publication_time', '-id'), 2)
+        expected = [track.id for track in reversed(self.tracks)]
+
+        pages = [paginator.page()]
+        while pages[-1].has_next:
+            pages.append(paginator.page(pages[-1].next_cursor))
+        self.assertEqual([track.id for page in pages for track in page], expected)
+        self.assertFalse(pages[0].has_previous)
+
+        previous = paginator.page(pages[-1].previous_cursor)
+        self.assertEqual([track.id for track in previous], expected[2:4])
+        self.assertEqual([track.id for track in paginator.page(previous.previous_cursor)],
+                         expected[:2])
+
+    def test_sub_millisecond_neighbours(self):
+        """Tests cursor keeps microseconds, so rows within one millisecond are not skipped"""
+        start = self.tracks[0].publication_time.replace(microsecond=123000)
+        for index, track in enumerate(self.tracks):
+            Track.objects.filter(pk=track.pk).update(
+                publication_time=start + timedelta(microseconds=100 * index)
+            )
+        paginator = KeysetPaginator(Track.objects.filter(main_author=self.artist),
+                                    ('-publication_time', '-id'), 1)
+
+        pages = [paginator.page()]
+        while pages[-1].has_next:
+            pages.append(paginator.page(pages[-1].next_cursor))
+        self.assertEqual([track.id for page in pages for track in page],
+                         [track.id for track in reversed(self.tracks)])
+
+    def test_artist_page_cursor(self):
+        """Tests artist page follows cursor links without COUNT queries"""
+        url = reverse('artist', kwargs={'artist_slug': self.artist.slug})
+        response = self.client.get(url)
+        self.assertEqual(response.context['page_obj'][0], self.tracks[-1])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'cursor': response.context['page_obj'].next_cursor})
+        self.assertEqual(response.context['page_obj'][0], self.tracks[-2])
+        self.assertContains(response, 'id="prev-track-btn"')
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries.captured_queries
+                             if 'player_track' in query['sql'] and 'SUM(' not in query['sql']))
+
+        response = self.client.get(url, {'cursor': 'broken'})
+        self.assertEqual(response.context['page_obj'][0], self.tracks[-1])
@@ -0,0 +1,182 @@
+"""Tests for playlist form and track order"""
+import json
+import uuid
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from ..models import Genre, Artist, Track, Playlist, PlaylistTrack
+from .. import playlist_tracks
+from ..forms import PlaylistForm
+
+User = get_user_model()
+
+
+class PlaylistPickerTests(TestCase):
+    """Tests for lazy track and user pickers of playlist form"""
+    def setUp(self):
+        """Set up data for test"""
+        self.genre = Genre.objects.create(name=f"Rock {uuid.uuid4().hex[:6]}")
+        self.artist = Artist.objects.create(name="Picker", slug="picker", genre=self.genre)
+        self.tracks = [
+            Track.objects.create(name=f'Picked {i}', main_author=self.artist, genre=self.genre)
+            for i in range(5)
+        ]
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.friends = [User.objects.create_user(username=f'friend{i}', password='x')
+                        for i in range(3)]
+        self.client.login(username='testuser', password='testpass123')
+
+    def test_form_renders_chosen_options_only(self):
+        """Tests catalogue is not rendered into the form"""
+        response = self.client.get(reverse('add_playlist'))
+        self.assertNotContains(response, 'Picked 0')
+        self.assertContains(response, reverse('autocomplete_tracks'))
+
+        form = PlaylistForm(user=self.user, initial={'tracks': [self.tracks[2].pk]})
+        html = str(form['tracks'])
+        self.assertIn('Picked 2 - Picker', html)
+        self.assertNotIn('Picked 1', html)
+
+    def test_submitted_ids_checked_in_one_query(self):
+        """Tests validation cost does not depend on the number of chosen ids"""
+        data = {'name': 'Mix', 'tracks': [track.pk for track in self.tracks],
+                'added_users': [friend.pk for friend in self.friends]}
+        form = PlaylistForm(data, user=self.user)
+        with self.assertNumQueries(3):  # name, users, tracks
+            self.assertTrue(form.is_valid())
+
+        form = PlaylistForm({'name': 'Mix', 'tracks': [self.tracks[0].pk, 999999]},
+                            user=self.user)
+        self.assertFalse(form.is_valid())
+        self.assertIn('tracks', form.errors)
+        form = PlaylistForm({'name': 'Mix', 'added_users': [self.user.pk],
+                             'tracks': [self.tracks[0].pk]}, user=self.user)
+        self.assertIn('added_users', form.errors)
+
+    def test_tracks_saved_in_submitted_order(self):
+        """Tests the chosen order becomes the playlist order, kept tracks stay in place"""
+        order = [self.tracks[3].pk, self.tracks[0].pk, self.tracks[4].pk]
+        form = PlaylistForm({'name': 'Mix', 'is_public': True, 'tracks': order}, user=self.user)
+        self.assertTrue(form.is_valid(), form.errors)
+        playlist = form.save(commit=False)
+        playlist.save()
+        form.save_m2m()
+        self.assertEqual(playlist_tracks.track_ids(playlist), order)
+
+        form = PlaylistForm({'name': 'Mix', 'is_public': True,
+                             'tracks': [self.tracks[1].pk, self.tracks[4].pk, self.tracks[3].pk]},
+                            instance=playlist, user=self.user)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        self.assertEqual(playlist_tracks.track_ids(playlist),
+                         [self.tracks[3].pk, self.tracks[4].pk, self.tracks[1].pk])
+
+    def test_autocomplete_endpoints(self):
+        """Tests paginated JSON results of pickers"""
+        url = reverse('autocomplete_tracks')
+        page = self.client.get(url, {'limit': 3}).json()
+        self.assertEqual([item['id'] for item in page['results']],
+                         [track.pk for track in self.tracks[:3]])
+        page = self.client.get(url, {'limit': 3, 'cursor': page['next_cursor']}).json()
+        self.assertEqual(len(page['results']), 2)
+        self.assertIsNone(page['next_cursor'])
+        page = self.client.get(url, {'q': 'picked'}).json()
+        self.assertEqual(len(page['results']), 5)
+        self.assertEqual(self.client.get(url, {'limit': 1000}).status_code, 400)
+
+        page = self.client.get(reverse('autocomplete_users'), {'q': 'FRI'}).json()
+        self.assertEqual([item['text'] for item in page['results']],
+                         ['friend0', 'friend1', 'friend2'])
+        page = self.client.get(reverse('autocomplete_users'), {'q': 'test'}).json()
+        self.assertEqual(page['results'], [])
+
+
+class PlaylistTrackTests(TestCase):
+    """Tests for ordered playlist tracks and their JSON edits"""
+    def setUp(self):
+        """Set up data for test"""
+        self.genre = Genre.objects.create(name=f"Rock {uuid.uuid4().hex[:6]}")
+        self.artist = Artist.objects.create(name="Order", slug="order", genre=self.genre)
+        self.tracks = [
+            Track.objects.create(name=f'Ordered {i}', main_author=self.artist, genre=self.genre)
+            for i in range(6)
+        ]
+        self.ids = [track.pk for track in self.tracks]
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.playlist = Playlist.objects.create(name='Order', owner=self.user,
+                                                logo='playlists/order.jpg')
+        self.client.login(username='testuser', password='testpass123')
+
+    def edit(self, action, **payload):
+        """Post JSON edit of the playlist"""
+        url = reverse('edit_playlist_tracks', kwargs={'slug': self.playlist.slug, 'action': action})
+        return self.client.post(url, json.dumps(payload), content_type='application/json')
+
+    def test_edit_endpoints(self):
+        """Tests append, insert, move and remove keep the requested order"""
+        ids = self.ids
+        self.assertEqual(self.edit('append', track_ids=ids[:3]).json()['track_ids'], ids[:3])
+        self.edit('insert', track_ids=[ids[4], ids[3]], before=ids[1])
+        self.assertEqual(playlist_tracks.track_ids(self.playlist),
+                         [ids[0], ids[4], ids[3], ids[1], ids[2]])
+        self.edit('move', track_ids=[ids[2]], before=ids[0])
+        self.edit('move', track_ids=[ids[4]])
+        self.edit('remove', track_ids=[ids[3]])
+        self.assertEqual(playlist_tracks.track_ids(self.playlist), [ids[2], ids[0], ids[1], ids[4]])
+
+        # tracks already in the playlist are not added twice
+        self.assertEqual(self.edit('append', track_ids=[ids[0], ids[5]]).json()['track_ids'],
+                         [ids[5]])
+        self.assertEqual(self.edit('insert', track_ids=[ids[3]]).status_code, 400)
+        self.assertEqual(self.edit('move', track_ids=[ids[3]], before=ids[0]).status_code, 400)
+        self.assertEqual(self.edit('append', track_ids=[999999]).status_code, 400)
+        self.assertEqual(self.edit('append', track_ids='1').status_code, 400)
+        self.assertEqual(self.edit('shuffle', track_ids=ids).status_code, 404)
+
+        User.objects.create_user(username='other', password='x')
+        self.client.login(username='other', password='x')
+        self.assertEqual(self.edit('remove', track_ids=ids).status_code, 403)
+        self.assertEqual(len(playlist_tracks.track_ids(self.playlist)), 5)
+
+    @override_settings(PLAYLIST_POSITION_GAP=4)
+    def test_full_gaps_are_renumbered_locally(self):
+        """Tests order survives inserts into used up gaps and far rows are not rewritten"""
+        tracks = self.tracks + [
+            Track.objects.create(name=f'Extra {i}', main_author=self.artist, genre=self.genre)
+            for i in range(40)
+        ]
+        ids = [track.pk for track in tracks]
+        playlist_tracks.append(self.playlist, ids[:30])
+        expected = ids[:30]
+        last = PlaylistTrack.objects.get(playlist=self.playlist, track_id=ids[29]).position
+        for pk in ids[30:]:
+            playlist_tracks.insert(self.playlist, [pk], before=expected[5])
+            expected.insert(5, pk)
+        playlist_tracks.move(self.playlist, [expected[0]], before=expected[6])
+        expected.insert(5, expected.pop(0))
+
+        self.assertEqual(playlist_tracks.track_ids(self.playlist), expected)
+        self.assertEqual(PlaylistTrack.objects.get(playlist=self.playlist, track_id=ids[29])
+                         .position, last)
+
+    def test_queue_form_and_page_follow_positions(self):
+        """Tests play queue, playlist page and form edits use playlist order"""
+        ids = self.ids
+        playlist_tracks.append(self.playlist, [ids[3], ids[1], ids[2]])
+        url = reverse('play_queue', kwargs={'context': 'playlist'})
+        page = self.client.get(url, {'slug': self.playlist.slug, 'limit': 2}).json()
+        self.assertEqual([track['id'] for track in page['tracks']], [ids[3], ids[1]])
+        page = self.client.get(url, {'slug': self.playlist.slug, 'limit': 2,
+                                     'cursor': page['next_cursor']}).json()
+        self.assertEqual([track['id'] for track in page['tracks']], [ids[2]])
+
+        response = self.client.get(self.playlist.get_absolute_url())
+        self.assertEqual(list(response.context['tracks_for_column']),
+                         [self.tracks[3], self.tracks[1], self.tracks[2]])
+
+        form = PlaylistForm({'name': 'Order', 'tracks': [ids[2], ids[0], ids[3]]},
+                            instance=self.playlist, user=self.user)
+        self.assertEqual(form.initial['tracks'], [ids[3], ids[1], ids[2]])
+        self.assertTrue(form.is_valid())
+        form.save()
+        self.assertEqual(playlist_tracks.track_ids(self.playlist), [ids[3], ids[2], ids[0]])
@@ -0,0 +1,170 @@
+"""Tests for similar and recommended tracks"""
+import io
+import shutil
+import tempfile
+import uuid
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.core.cache import cache
+from django.urls import reverse
+import numpy as np
+from ..models import Genre, Artist, Track, Playlist
+from .. import playlist_tracks, recommender, similarity
+
+User = get_user_model()
+
+
+class SimilarityTests(TestCase): # pylint: disable=R0902
+    """Tests for the memory-mapped similar tracks index"""
+    def setUp(self):
+        """Set up data for test"""
+        self.directory = tempfile.mkdtemp()
+        self.settings_override = override_settings(SIMILARITY_INDEX_DIR=self.directory)
+        self.settings_override.enable()
+        self.rock = Genre.objects.create(name=f"Rock {uuid.uuid4().hex[:6]}")
+        self.jazz = Genre.objects.create(name=f"Jazz {uuid.uuid4().hex[:6]}")
+        self.band = Artist.objects.create(name="Band", slug="band", genre=self.rock)
+        self.trio = Artist.objects.create(name="Trio", slug="trio", genre=self.jazz)
+        self.rock_tracks = [Track.objects.create(name=f'Rock {i}', main_author=self.band,
+                                                 genre=self.rock) for i in range(3)]
+        self.jazz_tracks = [Track.objects.create(name=f'Jazz {i}', main_author=self.trio,
+                                                 genre=self.jazz) for i in range(3)]
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.login(username='testuser', password='testpass123')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def similar(self, track):
+        """Ids of tracks similar to track"""
+        return [pk for pk, _ in similarity.similar_track_ids(track.pk, 10)]
+
+    def test_rebuild_and_endpoint(self):
+        """Tests tracks of the same artist and playlist rank first, unpublished are skipped"""
+        self.assertEqual(self.similar(self.rock_tracks[0]), [])
+        playlist = Playlist.objects.create(name='Mix', owner=self.user, logo='playlists/mix.jpg')
+        playlist_tracks.append(playlist, [self.rock_tracks[0].pk, self.jazz_tracks[0].pk])
+        self.rock_tracks[2].is_published = Track.Status.UNRELEASED
+        self.rock_tracks[2].save()
+        self.assertEqual(similarity.rebuild(batch_size=4), 6)
+
+        similar = self.similar(self.rock_tracks[0])
+        self.assertEqual(similar[0], self.rock_tracks[1].pk)
+        self.assertEqual(similar[1], self.jazz_tracks[0].pk)
+        self.assertNotIn(self.rock_tracks[2].pk, similar)
+        self.assertNotIn(self.rock_tracks[0].pk, similar)
+
+        url = reverse('similar_tracks', kwargs={'track_id': self.jazz_tracks[1].pk})
+        payload = self.client.get(url, {'limit': 1}).json()
+        self.assertEqual([track['id'] for track in payload['tracks']], [self.jazz_tracks[2].pk])
+        self.assertGreater(payload['tracks'][0]['score'], 0.9)
+        self.assertEqual(self.client.get(url, {'limit': 0}).status_code, 400)
+
+    def test_update_writes_changed_and_new_tracks(self):
+        """Tests incremental update rewrites changed rows and appends new tracks"""
+        similarity.rebuild()
+        self.assertEqual(similarity.update(), 0)
+        index = similarity.load_index()
+
+        moved = self.jazz_tracks[0]
+        moved.main_author = self.band
+        moved.genre = self.rock
+        moved.save()
+        new = Track.objects.create(name='Rock 3', main_author=self.band, genre=self.rock)
+        before = np.array(index.vectors[:index.count])
+        self.assertEqual(similarity.update(), 2)
+
+        # a reader of the previous generation keeps its rows intact
+        np.testing.assert_array_equal(index.vectors[:index.count], before)
+        self.assertEqual(similarity.load_index().meta['generation'],
+                         index.meta['generation'] + 1)
+        self.assertIsNot(similarity.load_index(), index)
+        self.assertEqual(similarity.load_index().count, 7)
+        self.assertIn(moved.pk, self.similar(new)[:4])
+        self.assertNotIn(moved.pk, self.similar(self.jazz_tracks[1])[:1])
+
+        out = io.StringIO()
+        call_command('rebuild_similarity_index', '--full', stdout=out)
+        self.assertIn('7', out.getvalue())
+
+
+class RecommenderTests(TestCase):
+    """Tests for implicit ALS recommendations from playlists"""
+    def setUp(self):
+        """Set up data for test"""
+        self.directory = tempfile.mkdtemp()
+        self.settings_override = override_settings(RECOMMENDER_DIR=self.directory,
+                                                   RECOMMENDER_CHUNK_SIZE=4)
+        self.settings_override.enable()
+        cache.clear()
+        self.genre = Genre.objects.create(name=f"Rock {uuid.uuid4().hex[:6]}")
+        self.artist = Artist.objects.create(name="Band", slug="band", genre=self.genre)
+        self.rock = [Track.objects.create(name=f'Rock {i}', main_author=self.artist,
+                                          genre=self.genre, logo='tracks_logo/rock.jpg')
+                     for i in range(5)]
+        self.jazz = [Track.objects.create(name=f'Jazz {i}', main_author=self.artist,
+                                          genre=self.genre, logo='tracks_logo/jazz.jpg')
+                     for i in range(5)]
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.login(username='testuser', password='testpass123')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.directory, ignore_errors=True)
+        cache.clear()
+
+    def add_playlist(self, owner, tracks, added_users=()):
+        """Playlist of owner with tracks"""
+        playlist = Playlist.objects.create(name=f'Mix {uuid.uuid4().hex[:6]}', owner=owner,
+                                           logo='playlists/mix.jpg')
+        playlist.added_users.set(added_users)
+        playlist_tracks.append(playlist, [track.pk for track in tracks])
+        return playlist
+
+    def test_build_matrix(self):
+        """Tests repeated interactions are summed into CSR arrays"""
+        users, tracks, (indptr, indices, data) = recommender.build_matrix(
+            np.array([7, 3, 7, 7]), np.array([10, 10, 20, 10]),
+            np.array([1.0, 0.5, 1.0, 0.5], dtype=np.float32),
+        )
+        self.assertEqual(users.tolist(), [3, 7])
+        self.assertEqual(tracks.tolist(), [10, 20])
+        self.assertEqual(indptr.tolist(), [0, 1, 3])
+        self.assertEqual(indices.tolist(), [0, 0, 1])
+        self.assertEqual(data.tolist(), [0.5, 1.5, 1.0])
+        self.assertEqual([list(part) for part in recommender.transpose((indptr, indices, data), 2)],
+                         [[0, 2, 3], [0, 1, 1], [0.5, 1.5, 1.0]])
+
+    def test_train_and_home_shelf(self):
+        """Tests tracks of like-minded users are recommended and shelves are cached"""
+        rock_fans = [User.objects.create_user(username=f'rock{i}', password='x')
+                     for i in range(3)]
+        jazz_fans = [User.objects.create_user(username=f'jazz{i}', password='x')
+                     for i in range(3)]
+        for fan in rock_fans:
+            self.add_playlist(fan, self.rock)
+        for fan in jazz_fans[1:]:
+            self.add_playlist(fan, self.jazz)
+        self.add_playlist(jazz_fans[0], self.jazz, added_users=[self.user])
+        self.add_playlist(self.user, self.rock[:3])
+        self.rock[4].is_published = Track.Status.UNRELEASED
+        self.rock[4].save()
+
+        self.assertEqual(recommender.shelf(self.user), [])
+        out = io.StringIO()
+        call_command('train_recommender', '--iterations', '10', '--workers', '2', stdout=out)
+        self.assertIn('взаимодействий 38', out.getvalue())
+
+        model = recommender.load_model()
+        ids = model.recommend(self.user.pk, 3)
+        self.assertEqual(ids[0], self.rock[3].pk)
+        self.assertNotIn(self.rock[0].pk, ids)
+        self.assertNotIn(self.jazz[0].pk, ids)
+
+        response = self.client.get(reverse('main'))
+        self.assertEqual(response.context['recommended_tracks'][0], self.rock[3])
+        self.assertNotIn(self.rock[4], response.context['recommended_tracks'])
+        with self.assertNumQueries(0):
+            recommender.shelf(self.user)
@@ -0,0 +1,86 @@
+"""Tests for the track search index"""
+import uuid
+from unittest.mock import patch
+from django.db import connection
+from django.test import TestCase
+from ..models import Genre, Artist, Track, Album
+from .. import search_index
+
+
+class SearchIndexTests(TestCase):
+    """Tests for search index"""
+    def setUp(self):
+        """Set up data for test"""
+        self.genre = Genre.objects.create(name=f"Rock {uuid.uuid4().hex[:6]}")
+        self.artist = Artist.objects.create(
+            name="Молодой", slug=f"artist-{uuid.uuid4().hex[:6]}", genre=self.genre
+        )
+        self.lucifer = Track.objects.create(
+            name='Люцифер', main_author=self.artist, genre=self.genre
+        )
+        self.other = Track.objects.create(
+            name='Night Drive', main_author=self.artist, genre=self.genre,
+            lyrics='люцифер в припеве'
+        )
+
+    def assert_search(self, query, expected):
+        """Checks both FTS and table index"""
+        self.assertEqual(search_index.search_track_ids(query), expected)
+        table_index = search_index.TableIndex()
+        search_index.rebuild(index=table_index)
+        self.assertEqual(table_index.search(search_index.tokenize(query), 10), expected)
+
+    def test_ranked_prefix_and_translit(self):
+        """Tests prefix matching, ranking by field and transliteration"""
+        self.assert_search('люц', [self.lucifer.id, self.other.id])
+        self.assert_search('lyucifer', [self.lucifer.id, self.other.id])
+        self.assert_search('night dr', [self.other.id])
+        self.assert_search('molodoy', [self.lucifer.id, self.other.id])
+        self.assert_search('unknown', [])
+
+    def test_partial_words_with_folds(self):
+        """Tests that a partially typed word finds words with folded spellings"""
+        cats = Track.objects.create(name='Cats', main_author=self.artist, genre=self.genre)
+        khan = Track.objects.create(name='Khan', main_author=self.artist, genre=self.genre)
+        jazz = Track.objects.create(name='Jazz', main_author=self.artist, genre=self.genre)
+        self.assert_search('cat', [cats.id])
+        self.assert_search('cats', [cats.id])
+        self.assert_search('kh', [khan.id])
+        self.assert_search('han', [khan.id])
+        self.assert_search('ja', [jazz.id])
+        self.assert_search('yazz', [jazz.id])
+        self.assert_search('lyut', [self.lucifer.id, self.other.id])
+
+    def test_table_index_follows_changes(self):
+        """Tests signals keep the table index, shared by all workers, in sync"""
+        with patch.object(connection, 'player_search_index', search_index.TableIndex(),
+                          create=True):
+            search_index.rebuild()
+            self.lucifer.name = 'Morning Star'
+            self.lucifer.save()
+            other_worker = search_index.TableIndex()
+            self.assertEqual(other_worker.search(['morning'], 10), [self.lucifer.id])
+            self.assertEqual(other_worker.search(['lyuc'], 10), [self.other.id])
+
+            self.lucifer.delete()
+            self.assertEqual(other_worker.search(['morning'], 10), [])
+
+    def test_index_follows_changes(self):
+        """Tests that signals keep index in sync"""
+        featured = Artist.objects.create(
+            name="Guest", slug=f"guest-{uuid.uuid4().hex[:6]}", genre=self.genre
+        )
+        self.other.featured_authors.add(featured)
+        self.assert_search('guest', [self.other.id])
+
+        featured.name = 'Visitor'
+        featured.save()
+        self.assert_search('guest', [])
+        self.assert_search('visitor', [self.other.id])
+
+        album = Album.objects.create(name='Dark Side', main_author=self.artist, genre=self.genre)
+        album.tracks.add(self.lucifer)
+        self.assert_search('dark side', [self.lucifer.id])
+
+        self.lucifer.delete()
+        self.assert_search('dark', [])
@@ -0,0 +1,81 @@
+"""Tests for track streaming"""
+import os
+import tempfile
+import uuid
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.core.files.uploadedfile import SimpleUploadedFile
+from ..models import Genre, Artist, Track
+
+User = get_user_model()
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class StreamingTests(TestCase):
+    """Tests for track streaming"""
+    def setUp(self):
+        """Set up data for test"""
+        self.genre = Genre.objects.create(name=f"Rock {uuid.uuid4().hex[:6]}")
+        self.artist = Artist.objects.create(
+            name=f"Test Artist {uuid.uuid4().hex[:6]}", genre=self.genre
+        )
+        self.track = Track.objects.create(
+            name='Test Track',
+            main_author=self.artist,
+            genre=self.genre,
+            mp3=SimpleUploadedFile("stream.mp3", b"0123456789")
+        )
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.login(username='testuser', password='testpass123')
+        self.url = reverse('stream_track', kwargs={'track_id': self.track.id})
+
+    def test_full_response(self):
+        """Tests streaming without Range header"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b"0123456789")
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('ETag', response)
+
+    def test_partial_response(self):
+        """Tests 206 responses for byte ranges"""
+        response = self.client.get(self.url, HTTP_RANGE='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(b''.join(response.streaming_content), b"2345")
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-3')
+        self.assertEqual(b''.join(response.streaming_content), b"789")
+
+    def test_unsatisfiable_range(self):
+        """Tests 416 response for range out of file"""
+        response = self.client.get(self.url, HTTP_RANGE='bytes=20-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+
+    def test_if_range_mismatch(self):
+        """Tests that stale If-Range returns the whole file"""
+        response = self.client.get(self.url, HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b"0123456789")
+
+    def test_not_modified(self):
+        """Tests conditional request with ETag"""
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_missing_file(self):
+        """Tests 404 response when the mp3 file is gone"""
+        os.remove(self.track.mp3.path)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    async def test_async_range_response(self):
+        """Tests ASGI requests get an async iterator over the range"""
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(self.url, headers={'Range': 'bytes=2-5'})
+        self.assertEqual(response.status_code, 206)
+        self.assertTrue(response.is_async)
+        self.assertEqual(b''.join([chunk async for chunk in response.streaming_content]),
+                         b"2345")
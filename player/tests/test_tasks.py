@@ -0,0 +1,92 @@
+"""Tests for background tasks"""
+import os
+import tempfile
+from datetime import timedelta
+from django.test import TestCase
+from django.utils import timezone
+from ..models import BackgroundTask
+from .. import tasks
+
+
+@tasks.task(max_attempts=2)
+def failing_task(path):
+    """Task failing on every run"""
+    raise OSError(path)
+
+
+@tasks.task
+def recording_task(path, text):
+    """Task appending text to file"""
+    with open(path, 'a', encoding='utf-8') as file:
+        file.write(text)
+
+
+class BackgroundTaskTests(TestCase):
+    """Tests for database-backed task queue"""
+    def setUp(self):
+        """Set up data for test"""
+        self.path = os.path.join(tempfile.mkdtemp(), 'log.txt')
+
+    def test_enqueue_and_run(self):
+        """Tests tasks run in order and are deleted when done"""
+        tasks.enqueue(recording_task, self.path, 'a')
+        tasks.enqueue_many(recording_task, [(self.path, 'b'), (self.path, 'c')])
+        tasks.enqueue(recording_task, self.path, 'later', delay=60)
+
+        self.assertEqual(tasks.run_pending(), 3)
+        with open(self.path, encoding='utf-8') as file:
+            self.assertEqual(file.read(), 'abc')
+        self.assertEqual(BackgroundTask.objects.get().args, [self.path, 'later'])
+
+    def test_retry_then_failed(self):
+        """Tests failed task is retried with backoff and kept after max_attempts"""
+        background_task = tasks.enqueue(failing_task, self.path)
+        self.assertEqual(tasks.run_pending(), 1)
+        background_task.refresh_from_db()
+        self.assertEqual(background_task.status, BackgroundTask.Status.PENDING)
+        self.assertGreater(background_task.run_after, background_task.time_created)
+        self.assertEqual(tasks.run_pending(), 0)  # not due yet
+
+        BackgroundTask.objects.update(run_after=background_task.time_created)
+        self.assertEqual(tasks.run_pending(), 1)
+        background_task.refresh_from_db()
+        self.assertEqual(background_task.status, BackgroundTask.Status.FAILED)
+        self.assertEqual(background_task.attempts, 2)
+        self.assertIn('OSError', background_task.last_error)
+
+    def test_expired_lock_is_reclaimed(self):
+        """Tests task of a crashed worker runs again after visibility timeout"""
+        tasks.enqueue(recording_task, self.path, 'x')
+        self.assertEqual(len(tasks.claim('crashed', 10)), 1)
+        self.assertEqual(tasks.claim('other', 10), [])
+
+        BackgroundTask.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(tasks.run_pending(worker='other'), 1)
+        self.assertFalse(BackgroundTask.objects.exists())
+
+    def test_expired_last_attempt_fails(self):
+        """Tests task killing its worker on every attempt ends up failed"""
+        background_task = tasks.enqueue(recording_task, self.path, 'x')
+        BackgroundTask.objects.update(max_attempts=1)
+        self.assertEqual(len(tasks.claim('crashed', 10)), 1)
+
+        BackgroundTask.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(tasks.run_pending(worker='other'), 0)
+        background_task.refresh_from_db()
+        self.assertEqual(background_task.status, BackgroundTask.Status.FAILED)
+        self.assertEqual(background_task.attempts, 1)
+
+    def test_stale_worker_leaves_reclaimed_task(self):
+        """Tests worker past its visibility timeout does not finish a reclaimed task"""
+        tasks.enqueue(recording_task, self.path, 'x')
+        [stale] = tasks.claim('slow', 10)
+        BackgroundTask.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        [reclaimed] = tasks.claim('other', 10)
+
+        self.assertTrue(tasks.execute(stale))
+        reclaimed_row = BackgroundTask.objects.get()
+        self.assertEqual(reclaimed_row.locked_by, 'other')
+        self.assertEqual(reclaimed_row.status, BackgroundTask.Status.RUNNING)
+
+        self.assertTrue(tasks.execute(reclaimed))
+        self.assertFalse(BackgroundTask.objects.exists())
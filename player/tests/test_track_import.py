@@ -0,0 +1,116 @@
+"""Tests for bulk track import"""
+import io
+import json
+import os
+import tempfile
+import uuid
+from unittest.mock import patch
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.conf import settings
+from ..models import Genre, Artist, Track, BackgroundTask
+from .. import search_index
+from ..track_import import BulkTrackImporter, Checkpoint, iter_json_array
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ImportTracksTests(TestCase):
+    """Tests for import_tracks command"""
+    def setUp(self):
+        """Set up data for test"""
+        self.genre = Genre.objects.create(name=f"Rock {uuid.uuid4().hex[:6]}")
+        self.artist = Artist.objects.create(
+            name="Main", slug=f"main-{uuid.uuid4().hex[:6]}", genre=self.genre
+        )
+        self.guest = Artist.objects.create(
+            name="Guest", slug=f"guest-{uuid.uuid4().hex[:6]}", genre=self.genre
+        )
+        mp3_path = os.path.join(settings.BASE_DIR, 'media', 'tracks', 'Outro.mp3')
+        records = [
+            {"name": "Bulk One", "main_author": self.artist.id, "genre": self.genre.id,
+             "publication_time": "2024-01-01T00:00:00", "mp3": mp3_path,
+             "featured_authors": [self.guest.id]},
+            {"name": "Bulk Two", "main_author": self.artist.id, "genre": self.genre.id,
+             "publication_time": "2024-01-02T00:00:00"},
+            {"name": "Broken", "main_author": 10 ** 6, "genre": self.genre.id,
+             "publication_time": "2024-01-03T00:00:00"},
+        ]
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False,
+                                         encoding='utf-8') as file:
+            json.dump(records, file)
+        self.json_path = file.name
+
+    def tearDown(self):
+        os.remove(self.json_path)
+
+    def test_bulk_import(self):
+        """Tests bulk import with errors summary"""
+        out, err = io.StringIO(), io.StringIO()
+        call_command('import_tracks', self.json_path, '--bulk', '--batch-size', '2',
+                     '--processes', '1', stdout=out, stderr=err)
+
+        track = Track.objects.get(name='Bulk One')
+        self.assertEqual(list(track.featured_authors.all()), [self.guest])
+        self.assertTrue(track.mp3.storage.exists(track.mp3.name))
+        self.assertNotEqual(track.duration, '0')
+        self.assertTrue(Track.objects.filter(name='Bulk Two').exists())
+        self.assertFalse(Track.objects.filter(name='Broken').exists())
+        self.assertEqual(search_index.search_track_ids('bulk one'), [track.id])
+        self.assertIn("Строка 3 ('Broken')", err.getvalue())
+        self.assertIn("Импортировано треков: 2", out.getvalue())
+
+    def test_unreadable_mp3_imported_without_duration(self):
+        """Tests an mp3 mutagen can not parse keeps duration 0 like Track.update_duration"""
+        broken_path = os.path.join(tempfile.mkdtemp(), 'broken.mp3')
+        with open(broken_path, 'wb') as file:
+            file.write(b'not an mp3 at all')
+        records = [(1, {"name": "Unreadable", "main_author": self.artist.id,
+                        "genre": self.genre.id, "publication_time": "2024-01-01T00:00:00",
+                        "mp3": broken_path})]
+        with self.assertLogs('player.track_import', 'WARNING'):
+            report = BulkTrackImporter(processes=1).run(records)
+
+        self.assertEqual((report.created, report.errors), (1, []))
+        track = Track.objects.get(name='Unreadable')
+        self.assertEqual(track.duration, 0)
+        self.assertTrue(track.mp3.storage.exists(track.mp3.name))
+
+    def test_incremental_json_array(self):
+        """Tests that array is parsed correctly across small chunks"""
+        records = [{"name": 'a, "b" ]', "n": [1, 2]}, {"name": "ю"}]
+        with open(self.json_path, 'w', encoding='utf-8') as file:
+            json.dump(records, file, ensure_ascii=False)
+        with open(self.json_path, 'r', encoding='utf-8') as file:
+            self.assertEqual(list(iter_json_array(file, chunk_size=3)), records)
+
+    def test_jsonl_resume_from_checkpoint(self):
+        """Tests JSON Lines import restarting after the checkpoint row"""
+        with open(self.json_path, 'r', encoding='utf-8') as file:
+            records = json.load(file)
+        jsonl_path = self.json_path + 'l'
+        with open(jsonl_path, 'w', encoding='utf-8') as file:
+            for record in records[1:]:
+                file.write(json.dumps(record) + "\n")
+        self.addCleanup(os.remove, jsonl_path)
+
+        checkpoint_path = os.path.join(tempfile.mkdtemp(), 'import.checkpoint')
+        Checkpoint(checkpoint_path).save(1)
+        call_command('import_tracks', jsonl_path, '--checkpoint', checkpoint_path,
+                     stdout=io.StringIO(), stderr=io.StringIO())
+
+        self.assertFalse(Track.objects.filter(name='Bulk Two').exists())
+        self.assertFalse(os.path.exists(checkpoint_path))
+
+        call_command('import_tracks', jsonl_path, '--resume-from', '1', '--bulk',
+                     '--processes', '1', stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertTrue(Track.objects.filter(name='Bulk Two').exists())
+
+    def test_deferred_media_starts_no_processes(self):
+        """Tests bulk import with deferred media queues files without a process pool"""
+        with patch('player.track_import.ProcessPoolExecutor') as process_pool:
+            call_command('import_tracks', self.json_path, '--bulk', '--defer-media',
+                         stdout=io.StringIO(), stderr=io.StringIO())
+        process_pool.assert_not_called()
+        track = Track.objects.get(name='Bulk One')
+        self.assertFalse(track.mp3)
+        self.assertEqual(BackgroundTask.objects.get().args[0], track.pk)
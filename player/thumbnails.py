@@ -0,0 +1,123 @@
+"""Module with resized derivatives of uploaded images
+
+Logos and profile photos are uploaded at any resolution, while pages show
+them at a few fixed sizes. Derivatives are generated with Pillow by the
+`thumbnail` view on first request (or ahead of time by `generate_thumbnails`)
+and stored next to the media as `thumbnails/<hash>/<hash>_<size>.<ext>`,
+where the hash is taken from the source file contents, so identical uploads
+share derivatives and a replaced file never serves a stale one. Resolved
+urls are memoised in the cache and pages link images not resolved yet to
+the view, which redirects to the derivative, so rendering never reads or
+writes image files. The cache should be shared by worker processes (see
+CACHES in ml_music/settings_production.py), so failed sources are skipped
+and urls resolved once for all of them.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.urls import reverse
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+READ_CHUNK_SIZE = 64 * 1024
+EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg', 'PNG': 'png'}
+FAILED_TIMEOUT = 300  # seconds before retrying a source which can not be resized
+
+# derivatives keep their own names, so they are not content-addressed
+derivative_storage = FileSystemStorage()
+
+
+def source_digest(name, storage=default_storage):
+    """sha256 of the stored file contents"""
+    if hasattr(storage, 'digest_of') and storage.digest_of(name):
+        # content-addressed names already are the hash
+        return storage.digest_of(name)
+    digest = hashlib.sha256()
+    with storage.open(name, 'rb') as file:
+        for chunk in iter(lambda: file.read(READ_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def derivative_name(digest, size):
+    """Storage name of a derivative"""
+    extension = EXTENSIONS[settings.THUMBNAIL_FORMAT]
+    return f'thumbnails/{digest[:2]}/{digest}_{size}.{extension}'
+
+
+def render(source, pixels):
+    """Bytes of source image fitted into a pixels x pixels square"""
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((pixels, pixels), Image.Resampling.LANCZOS)
+        if settings.THUMBNAIL_FORMAT == 'JPEG' and image.mode != 'RGB':
+            image = image.convert('RGB')
+        buffer = BytesIO()
+        image.save(buffer, settings.THUMBNAIL_FORMAT, quality=settings.THUMBNAIL_QUALITY)
+    return buffer.getvalue()
+
+
+def store(target, data):
+    """Write derivative under exactly the target name"""
+    # FileSystemStorage.save picks a suffixed name when another worker wrote
+    # target first, leaving an orphan; racing workers write identical bytes,
+    # so each renames its own temporary file over target instead
+    path = derivative_storage.path(target)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as tmp:
+        tmp.write(data)
+    if derivative_storage.file_permissions_mode is not None:
+        os.chmod(tmp.name, derivative_storage.file_permissions_mode)
+    os.replace(tmp.name, path)
+
+
+def generate(name, size, storage=default_storage):
+    """Create derivative of stored image if missing, returns its storage name"""
+    pixels = settings.THUMBNAIL_SIZES[size]
+    target = derivative_name(source_digest(name, storage), size)
+    if not derivative_storage.exists(target):
+        with storage.open(name, 'rb') as source:
+            store(target, render(source, pixels))
+    return target
+
+
+def cache_key(name, size):
+    """Cache key of resolved url of a derivative"""
+    return f'player:thumbnail:{size}:{name}'
+
+
+def resolve(name, size, storage=default_storage):
+    """Url of derivative of stored image, generated if missing; the original url
+    when it can not be resized"""
+    key = cache_key(name, size)
+    url = cache.get(key)
+    if url is not None:
+        return url
+
+    try:
+        url = derivative_storage.url(generate(name, size, storage))
+        timeout = None
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as exc:
+        logger.warning("Can not make %s thumbnail of %s: %s", size, name, exc)
+        url = storage.url(name)
+        timeout = FAILED_TIMEOUT
+    cache.set(key, url, timeout)
+    return url
+
+
+def thumbnail_url(field, size):
+    """Url of field image at size, rendering never touches storage"""
+    if not field:
+        return ''
+    url = cache.get(cache_key(field.name, size))
+    if url is None:
+        # not resolved yet, the view generates the derivative once and redirects
+        url = reverse('thumbnail', args=[size, field.name])
+    return url
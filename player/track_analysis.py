@@ -0,0 +1,80 @@
+"""Module storing waveform and loudness analysis of tracks
+
+Decoding is done by `audio_analysis` on file paths; this module picks the
+tracks whose analysis is missing or stale, runs the analysis (in a process
+pool for backfills) and stores `TrackAnalysis` rows.
+"""
+import logging
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+
+from . import audio_analysis
+from .models import Track, TrackAnalysis
+
+logger = logging.getLogger(__name__)
+
+
+def tracks_to_analyse(force=False):
+    """Tracks with an mp3 whose analysis is missing or made for another file"""
+    tracks = Track.objects.exclude(mp3='').exclude(mp3=None).select_related('analysis')
+    return [
+        track for track in tracks.only('id', 'mp3', 'analysis__mp3_name').iterator()
+        if force or not hasattr(track, 'analysis') or track.analysis.mp3_name != track.mp3.name
+    ]
+
+
+def store(track_id, mp3_name, result):
+    """Create or update analysis row of track"""
+    replay_gain = None
+    if result['method'] == audio_analysis.METHOD_PCM:
+        # frame estimates only rank tracks, they are too coarse to correct volume
+        replay_gain = audio_analysis.replay_gain(result['loudness'],
+                                                 settings.TRACK_LOUDNESS_TARGET)
+    TrackAnalysis.objects.update_or_create(track_id=track_id, defaults={
+        'mp3_name': mp3_name,
+        'peaks': result['peaks'],
+        'loudness': result['loudness'],
+        'replay_gain': replay_gain,
+        'method': result['method'],
+    })
+
+
+def analyse_tracks(tracks, processes=1):
+    """Analyse tracks, in a process pool when processes > 1; returns analysed count"""
+    jobs = [(track.pk, track.mp3.name, track.mp3.path) for track in tracks
+            if track.mp3 and track.mp3.storage.exists(track.mp3.name)]
+    points = settings.TRACK_WAVEFORM_POINTS
+    analysed = 0
+    if processes > 1:
+        with ProcessPoolExecutor(processes) as pool:
+            futures = [(track_id, name, pool.submit(audio_analysis.analyse_file, path, points))
+                       for track_id, name, path in jobs]
+            results = ((track_id, name, future.result) for track_id, name, future in futures)
+            analysed = _store_results(results)
+    else:
+        analysed = _store_results(
+            (track_id, name, lambda p=path: audio_analysis.analyse_file(p, points))
+            for track_id, name, path in jobs
+        )
+    return analysed
+
+
+def _store_results(results):
+    """Store (track id, mp3 name, result getter) items, skipping failed files"""
+    analysed = 0
+    for track_id, name, get_result in results:
+        try:
+            result = get_result()
+        except (OSError, ValueError, IndexError, RuntimeError, subprocess.SubprocessError) as exc:
+            logger.warning("Can not analyse %s: %s", name, exc)
+            continue
+        store(track_id, name, result)
+        analysed += 1
+    return analysed
+
+
+def analyse_track_ids(track_ids):
+    """Analyse tracks by ids in the current process"""
+    return analyse_tracks(Track.objects.filter(id__in=track_ids))
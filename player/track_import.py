@@ -0,0 +1,351 @@
+"""Module with bulk import of tracks
+
+Records are processed in batches. For every batch media files are copied
+into storage by a thread pool while mp3 durations are read by a process
+pool (not started with `defer_media`), then tracks and their featured authors are inserted with two
+`bulk_create` calls inside one transaction. Artist and genre ids are
+loaded once for the whole import instead of two queries per track. With
+`defer_media` only rows are inserted; files are copied by
+`attach_track_media` tasks queued in the same transaction.
+
+Input files are read lazily: JSON Lines line by line and JSON arrays with
+an incremental decoder, so only the current batch is kept in memory. A
+checkpoint file with the last processed row lets a crashed import resume.
+Resuming is cheap for JSON Lines only: skipped lines are not decoded,
+while records of a JSON array before the checkpoint are decoded again.
+"""
+import itertools
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack
+from datetime import datetime
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils.timezone import is_aware, make_aware
+from mutagen import MutagenError
+from . import artist_tracks, search_index, tasks
+from .audio_analysis import read_mp3_duration
+from .models import Artist, Genre, Track
+
+logger = logging.getLogger(__name__)
+
+
+def copy_to_storage(source_path, upload_to):
+    """Copy file into media storage in chunks, returns the stored name"""
+    with open(source_path, "rb") as source:
+        return default_storage.save(
+            os.path.join(upload_to, os.path.basename(source_path)), File(source)
+        )
+
+
+@tasks.task
+def attach_track_media(track_id, logo_path, mp3_path):
+    """Copy imported media files into storage and attach them to track"""
+    track = Track.objects.filter(pk=track_id).first()
+    if track is None:
+        return
+    if logo_path:
+        track.logo = copy_to_storage(logo_path, "tracks_logo/")
+    if mp3_path:
+        track.mp3 = copy_to_storage(mp3_path, "tracks/")
+    # saving a new mp3 queues duration and analysis tasks
+    track.save()
+
+
+READ_CHUNK_SIZE = 64 * 1024
+JSON_DECODER = json.JSONDecoder()
+
+
+def iter_json_array(file, chunk_size=READ_CHUNK_SIZE):
+    """Yield objects of a top-level JSON array without loading the whole file"""
+    buffer = ""
+    position = 0
+    eof = False
+
+    def fill():
+        nonlocal buffer, position, eof
+        chunk = file.read(chunk_size)
+        buffer = buffer[position:] + chunk
+        position = 0
+        eof = not chunk
+
+    def skip(chars):
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position] in chars:
+                position += 1
+            if position < len(buffer) or eof:
+                return
+            fill()
+
+    fill()
+    skip(" \t\r\n\ufeff")
+    if buffer[position:position + 1] != "[":
+        raise ValueError("JSON file must contain an array of tracks")
+    position += 1
+
+    while True:
+        skip(" \t\r\n,")
+        if position >= len(buffer):
+            raise ValueError("Unexpected end of JSON array")
+        if buffer[position] == "]":
+            return
+        if buffer[position] != "{":
+            raise ValueError(f"Track must be a JSON object, got {buffer[position]!r}")
+        try:
+            record, end = JSON_DECODER.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            # object continues in the next chunk
+            fill()
+            continue
+        position = end
+        yield record
+
+
+def iter_json_lines(file, start_row=1):
+    """Yield (row number, object) of a JSON Lines file, skipping rows before start_row"""
+    row = 0
+    for line in file:
+        if not line.strip():
+            continue
+        row += 1
+        if row >= start_row:
+            yield row, json.loads(line)
+
+
+def detect_format(path):
+    """'jsonl' or 'json' by extension, or by the first character of the file"""
+    if path.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    with open(path, "r", encoding="utf-8-sig") as file:
+        while True:
+            char = file.read(1)
+            if not char or not char.isspace():
+                return "json" if char == "[" else "jsonl"
+
+
+def read_records(path, input_format="auto", start_row=1):
+    """Lazily yield (row number, record) of an import file from start_row
+
+    JSON arrays are decoded from the beginning up to start_row.
+    """
+    if input_format == "auto":
+        input_format = detect_format(path)
+    with open(path, "r", encoding="utf-8-sig") as file:
+        if input_format == "jsonl":
+            yield from iter_json_lines(file, start_row)
+        else:
+            records = enumerate(iter_json_array(file), start=1)
+            yield from itertools.islice(records, start_row - 1, None)
+
+
+class Checkpoint:
+    """File with the number of the last processed row"""
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        """Last processed row, 0 when there is no checkpoint"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                return int(json.load(file)["row"])
+        except FileNotFoundError:
+            return 0
+
+    def save(self, row):
+        """Atomically store the last processed row"""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump({"row": row}, file)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        """Remove checkpoint after a finished import"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class ImportReport:
+    """Counters and per-row errors of an import"""
+    def __init__(self):
+        self.created = 0
+        self.last_row = 0
+        self.errors = []  # (row number, track name, message)
+        self.started = time.monotonic()
+
+    def add_error(self, row, track_data, message):
+        """Register failed row"""
+        name = track_data.get("name") if isinstance(track_data, dict) else None
+        self.errors.append((row, name, str(message)))
+
+    @property
+    def elapsed(self):
+        """Seconds since import started"""
+        return time.monotonic() - self.started
+
+    @property
+    def throughput(self):
+        """Imported tracks per second"""
+        return self.created / self.elapsed if self.elapsed else 0.0
+
+
+class BulkTrackImporter: # pylint: disable=R0902
+    """Batched, parallel importer of track records"""
+    def __init__(self, batch_size=500, threads=None, processes=None, on_batch=None, # pylint: disable=R0913
+                 defer_media=False):
+        self.batch_size = batch_size
+        self.defer_media = defer_media
+        self.threads = threads
+        self.processes = processes
+        self.on_batch = on_batch
+        self.artist_ids = set()
+        self.genre_ids = set()
+        self.report = ImportReport()
+
+    def run(self, records):
+        """Import iterable of (row number, record dict), returns ImportReport"""
+        self.artist_ids = set(Artist.objects.values_list("id", flat=True))
+        self.genre_ids = set(Genre.objects.values_list("id", flat=True))
+
+        with ExitStack() as pools:
+            thread_pool = pools.enter_context(ThreadPoolExecutor(self.threads))
+            # durations are read by a Django-free function, so spawned workers need no setup
+            process_pool = (None if self.defer_media
+                            else pools.enter_context(ProcessPoolExecutor(self.processes)))
+            batch = []
+            for row, track_data in records:
+                batch.append((row, track_data))
+                if len(batch) >= self.batch_size:
+                    self.import_batch(batch, thread_pool, process_pool)
+                    batch = []
+            if batch:
+                self.import_batch(batch, thread_pool, process_pool)
+        return self.report
+
+    def build_track(self, track_data):
+        """Validate record and build unsaved Track, raises on invalid data"""
+        if track_data["main_author"] not in self.artist_ids:
+            raise ValueError(f"Artist {track_data['main_author']} does not exist")
+        if track_data["genre"] not in self.genre_ids:
+            raise ValueError(f"Genre {track_data['genre']} does not exist")
+
+        publication_time = datetime.fromisoformat(track_data["publication_time"])
+        if not is_aware(publication_time):
+            publication_time = make_aware(publication_time)
+
+        for key in ("logo", "mp3"):
+            if track_data.get(key) and not os.path.isfile(track_data[key]):
+                raise FileNotFoundError(f"File {track_data[key]} not found")
+
+        return Track(
+            name=track_data["name"],
+            main_author_id=track_data["main_author"],
+            genre_id=track_data["genre"],
+            publication_time=publication_time,
+        )
+
+    def import_batch(self, batch, thread_pool, process_pool):
+        """Copy media, compute durations and insert one batch"""
+        prepared = []
+        for row, track_data in batch:
+            try:
+                prepared.append((row, track_data, self.build_track(track_data)))
+            except (KeyError, TypeError, ValueError, OSError) as exc:
+                self.report.add_error(row, track_data, exc)
+
+        if self.defer_media:
+            # files are copied later by attach_track_media tasks
+            self.insert(prepared)
+            self.report.last_row = batch[-1][0]
+            if self.on_batch:
+                self.on_batch(self.report)
+            return
+
+        futures = []
+        for row, track_data, track in prepared:
+            futures.append({
+                "logo": track_data.get("logo") and thread_pool.submit(
+                    copy_to_storage, track_data["logo"], "tracks_logo/"),
+                "mp3": track_data.get("mp3") and thread_pool.submit(
+                    copy_to_storage, track_data["mp3"], "tracks/"),
+                "duration": track_data.get("mp3") and process_pool.submit(
+                    read_mp3_duration, track_data["mp3"]),
+            })
+
+        ready = []
+        for (row, track_data, track), row_futures in zip(prepared, futures):
+            error = self.collect_media(track, track_data, row_futures)
+            if error is not None:
+                self.report.add_error(row, track_data, error)
+                self.delete_files([track])
+                continue
+            ready.append((row, track_data, track))
+
+        if ready:
+            self.insert(ready)
+        self.report.last_row = batch[-1][0]
+        if self.on_batch:
+            self.on_batch(self.report)
+
+    @staticmethod
+    def collect_media(track, track_data, row_futures):
+        """Set copied files and duration on track, returns the first error"""
+        error = None
+        for key in ("logo", "mp3", "duration"):
+            if not row_futures[key]:
+                continue
+            try:
+                result = row_futures[key].result()
+            except MutagenError:
+                # as in Track.update_duration, the track keeps an unknown duration
+                logger.warning("Can not read duration of %s", track_data["mp3"])
+                continue
+            except Exception as exc:  # pylint: disable=broad-except
+                error = error or exc
+                continue
+            setattr(track, key, result)
+        return error
+
+    def insert(self, ready):
+        """Insert tracks and featured authors of a batch in one transaction"""
+        tracks = [track for _, _, track in ready]
+        through = Track.featured_authors.through  # pylint: disable=E1101
+        try:
+            with transaction.atomic():
+                Track.objects.bulk_create(tracks)
+                through.objects.bulk_create([
+                    through(track_id=track.pk, artist_id=artist_id)
+                    for (_, track_data, track) in ready
+                    for artist_id in set(track_data.get("featured_authors") or ())
+                    if artist_id in self.artist_ids
+                ], ignore_conflicts=True)
+                # bulk_create does not send post_save signals
+                artist_tracks.sync_track_ids(track.pk for track in tracks)
+                search_index.index_track_ids(track.pk for track in tracks)
+                if self.defer_media:
+                    tasks.enqueue_many(attach_track_media, [
+                        (track.pk, track_data.get("logo"), track_data.get("mp3"))
+                        for (_, track_data, track) in ready
+                        if track_data.get("logo") or track_data.get("mp3")
+                    ])
+        except Exception as exc:  # pylint: disable=broad-except
+            for row, track_data, _ in ready:
+                self.report.add_error(row, track_data, f"Batch insert failed: {exc}")
+            self.delete_files(tracks)
+            return
+        self.report.created += len(tracks)
+
+    @staticmethod
+    def delete_files(tracks):
+        """Remove copied media of tracks which were not inserted"""
+        for track in tracks:
+            for field in (track.logo, track.mp3):
+                if field.name:
+                    default_storage.delete(field.name)
@@ -14,9 +14,21 @@ urlpatterns = [
     path('artists/<slug:artist_slug>/<slug:album_slug>',
                                         views.AlbumPage.as_view(), name='show_album'),
 
+    path('tracks/<int:track_id>/stream/', views.stream_track, name='stream_track'),
+    path('tracks/<int:track_id>/play/', views.register_play, name='register_play'),
+    path('tracks/<int:track_id>/waveform/', views.track_waveform, name='track_waveform'),
+    path('tracks/<int:track_id>/similar/', views.similar_tracks, name='similar_tracks'),
+    path('thumbnails/<slug:size>/<path:name>', views.thumbnail, name='thumbnail'),
+    path('queue/<slug:context>/', views.get_play_queue, name='play_queue'),
+    path('charts/', views.ChartPage.as_view(), name='charts'),
+    path('charts/<slug:genre_slug>/', views.ChartPage.as_view(), name='genre_chart'),
     path('search/', views.show_search_page, name='open_search_page'),
     path('search-tracks/', views.search, name='search_tracks'),
+    path('autocomplete/tracks/', views.autocomplete_tracks, name='autocomplete_tracks'),
+    path('autocomplete/users/', views.autocomplete_users, name='autocomplete_users'),
     path('playlist/<slug:slug>/', views.PlaylistPage.as_view(), name='playlist_detail'),
+    path('playlist/<slug:slug>/tracks/<slug:action>/',
+                                views.edit_playlist_tracks, name='edit_playlist_tracks'),
     path('add_playlist/', views.AddPlaylistView.as_view(), name='add_playlist'),
     path('update_playlist/<slug:slug>/',
                                 views.UpdatePlaylistView.as_view(), name='update_playlist'),
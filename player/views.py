@@ -1,17 +1,31 @@
-"""Views File"""
+"""Views File
+
+Search, play queue and streaming views are async: under ASGI a slow client
+waits on a coroutine instead of holding a worker thread.
+"""
+import json
+
+from asgiref.sync import sync_to_async
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Q
-from django.shortcuts import render, get_object_or_404
+from django.db.models import Count, Sum
+from django.shortcuts import aget_object_or_404, render, get_object_or_404
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
 from django.http import  (
+    Http404,
     HttpResponse,
+    JsonResponse,
     HttpResponseNotFound,
     HttpResponseRedirect,
     HttpResponseForbidden
 )
 from django.db.models import Prefetch
 from django.urls import reverse_lazy
+from django.utils.cache import get_conditional_response, patch_cache_control, quote_etag
+from django.views.decorators.http import require_POST, require_safe
 
 from django.views.generic import (
     TemplateView,
@@ -21,9 +35,11 @@ from django.views.generic import (
     DeleteView
 )
 
-from . import data_for_tests
+from . import (artist_tracks, autocomplete, charts, data_for_tests, home_feed, play_queue,
+               playlist_tracks, recommender, search_index, similarity, streaming, thumbnails)
+from .play_counts import play_buffer
 from .forms import PlaylistForm
-from .models import Artist, Track, Genre, Album, Playlist
+from .models import Artist, Genre, Track, TrackAnalysis, Album, Playlist
 
 @login_required
 def show_search_page(request):
@@ -53,15 +69,9 @@ class PlayerHome(LoginRequiredMixin, ListView): # pylint: disable=R0901
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        genres_for_index = Genre.objects.prefetch_related(
-            Prefetch(
-                'track_set',
-                queryset=Track.published.select_related('genre', 'main_author'),
-                to_attr='published_tracks'
-            )
-        )
-        context['albums'] = Album.objects.select_related('main_author').all()
-        context['tracks_by_genre'] = {genre: genre.published_tracks for genre in genres_for_index}
+        context.update(home_feed.get())
+        context['recommended_tracks'] = recommender.shelf(self.request.user)
+        context['queue_url'] = play_queue.get_queue_url('home')
         context['page_obj'] = data_for_tests.get_page_obj(
             self.request,
             Track.published.select_related('main_author', 'genre')
@@ -88,32 +98,82 @@ class InformationPage(LoginRequiredMixin, TemplateView):
         return context
 
 
+class ChartPage(LoginRequiredMixin, TemplateView):
+    """Trending chart page, global or of a genre"""
+    template_name = 'player/chart_page.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        genre = None
+        if 'genre_slug' in self.kwargs:
+            genre = get_object_or_404(Genre, slug=self.kwargs['genre_slug'])
+        chart = charts.chart(genre)
+        name = f"Top {settings.CHART_SIZE}" + (f" {genre.name}" if genre else "")
+        context.update({
+            'genre': genre,
+            'chart_name': name,
+            'tracks_for_column': chart['tracks'],
+            'top_artists': chart.get('artists', []),
+            'top_genres': chart.get('genres', []),
+            'title': f"{name} | ML Music",
+            'queue_url': play_queue.get_queue_url('chart', genre=genre.slug if genre else None),
+            # ranked tracks are paginated by position, not by a column
+            'page_obj': data_for_tests.get_page_obj(self.request, chart['tracks'], ordering=None),
+        })
+        return context
+
+
 class ArtistPage(LoginRequiredMixin, ListView): # pylint: disable=R0901
-    """Artist Page view"""
+    """Artist Page view
+
+    Ids and sort keys of all artist tracks are read once per request; the
+    latest tracks, the trending top (by chart score, then play count) and
+    the player page are picked from them and loaded with a single query.
+    """
     template_name = 'player/artist_card.html'
     context_object_name = 'all_author_tracks'
+    row_size = 7
+    column_size = 5
+
+    def get_track_keys(self):
+        """(id, publication_time, play_count, trend) of artist tracks, newest first"""
+        return sorted(
+            charts.with_trend(artist_tracks.tracks_of(self.artist))
+            .values_list('id', 'publication_time', 'play_count', 'trend'),
+            key=lambda row: (row[1], row[0]), reverse=True
+        )
 
     def get_queryset(self):
         self.artist = get_object_or_404(Artist, slug=self.kwargs['artist_slug']) # pylint: disable=W0201
-        return (Track.published.filter(
-            Q(main_author=self.artist) | Q(featured_authors=self.artist)
-        ).distinct().select_related('main_author', 'genre')
-          .prefetch_related('featured_authors')
-            .order_by('-publication_time'))
+        keys = self.get_track_keys()
+        self.track_ids = [row[0] for row in keys] # pylint: disable=W0201
+        self.top_track_ids = [row[0] for row in sorted( # pylint: disable=W0201
+            keys, key=lambda row: (-row[3], -row[2], -row[0])
+        )[:self.column_size]]
+        self.page_obj = data_for_tests.get_page_obj(self.request, self.track_ids) # pylint: disable=W0201
+
+        self.tracks = (Track.objects # pylint: disable=W0201
+                       .select_related('main_author', 'genre')
+                       .prefetch_related('featured_authors')
+                       .in_bulk({*self.track_ids[:self.row_size], *self.top_track_ids,
+                                 *self.page_obj.object_list}))
+        return [self.tracks[pk] for pk in self.track_ids[:self.row_size]]
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        self.page_obj.object_list = [self.tracks[pk] for pk in self.page_obj]
 
-        context['tracks_for_column'] = self.get_queryset().order_by('-play_count')[:5]
+        context['tracks_for_column'] = [self.tracks[pk] for pk in self.top_track_ids]
 
         context['all_author_albums'] = Album.objects.filter(
             main_author=self.artist
-        ).prefetch_related('tracks')
+        ).select_related('main_author')
 
         context.update({
             'artist': self.artist,
             'title': f"{self.artist.name} | ML Music",
-            'page_obj': data_for_tests.get_page_obj(self.request, self.get_queryset()),
+            'queue_url': play_queue.get_queue_url('artist', slug=self.artist.slug),
+            'page_obj': self.page_obj,
         })
 
         return context
@@ -141,11 +201,18 @@ class AlbumPage(LoginRequiredMixin, ListView): # pylint: disable=R0901
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        context.update(self.album.tracks.aggregate(
+            tracks_count=Count('id'), total_duration=Sum('duration')
+        ))
         context.update({
             'album': self.album,
             'title': f"{self.album.name} | ML Music",
-            'page_obj': data_for_tests
-                            .get_page_obj(self.request, self.get_queryset()),
+            'queue_url': play_queue.get_queue_url(
+                'album', artist_slug=self.album.main_author.slug, slug=self.album.slug
+            ),
+            'page_obj': data_for_tests.get_page_obj(
+                self.request, Track.objects.filter(albums=self.album).select_related('main_author')
+            ),
         })
         return context
 
@@ -156,26 +223,26 @@ class PlaylistPage(LoginRequiredMixin, ListView): # pylint: disable=R0901
 
     def get_queryset(self):
         self.playlist = get_object_or_404( # pylint: disable=W0201
-            Playlist.objects
-            .select_related('owner')
-            .prefetch_related(
-                Prefetch(
-                    'tracks',
-                    queryset=Track.objects
-                        .select_related('main_author')
-                        .prefetch_related('featured_authors')
-                )
-            ),
-            slug=self.kwargs['slug']
+            Playlist.objects.select_related('owner'), slug=self.kwargs['slug']
         )
-        return self.playlist.tracks.all()
+        return (playlist_tracks.ordered_tracks(self.playlist)
+                .select_related('main_author')
+                .prefetch_related('featured_authors')
+                .order_by(*playlist_tracks.TRACK_ORDERING))
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['playlist'] = self.playlist
-        context['page_obj'] = (data_for_tests
-                                    .get_page_obj(self.request, self.get_queryset()))
+        context.update(self.playlist.tracks.aggregate(
+            tracks_count=Count('id'), total_duration=Sum('duration')
+        ))
+        context['page_obj'] = data_for_tests.get_page_obj(
+            self.request,
+            playlist_tracks.ordered_tracks(self.playlist).select_related('main_author'),
+            playlist_tracks.TRACK_ORDERING,
+        )
         context['title'] = f"{self.playlist.name} | ML Music"
+        context['queue_url'] = play_queue.get_queue_url('playlist', slug=self.playlist.slug)
         return context
 
 class AddPlaylistView(LoginRequiredMixin, CreateView): # pylint: disable=R0901
@@ -272,22 +339,191 @@ class DeletePlaylistView(LoginRequiredMixin, DeleteView): # pylint: disable=R090
         return HttpResponseRedirect(success_url)
 
 @login_required
-def search(request):
+async def search(request):
     """Search Page view"""
     query = request.GET.get('query', '').strip()
 
+    tracks = []
     if query:
-        tracks = Track.objects.select_related('main_author').filter(
-            Q(name__icontains=query) | Q(main_author__name__icontains=query)
-        ).order_by('id')
-    else:
-        tracks = Track.objects.none()
+        track_ids = await sync_to_async(search_index.search_track_ids)(query)
+        found = await Track.objects.select_related('main_author').ain_bulk(track_ids)
+        tracks = [found[pk] for pk in track_ids if pk in found]
 
     context = {
         'tracks': tracks,
         'title': 'Search | ML Music',
         'marker': 'search_page',
-        'page_obj': data_for_tests.get_page_obj(request, tracks),
+        'queue_url': play_queue.get_queue_url('search', query=query),
+        # ranked results are paginated by position, not by a column
+        'page_obj': data_for_tests.get_page_obj(request, tracks, ordering=None),
     }
 
-    return render(request, 'player/search_page.html', context)
+    # context processors query the database, so the template is rendered in a thread
+    return await sync_to_async(render)(request, 'player/search_page.html', context)
+
+@require_safe
+@login_required
+async def stream_track(request, track_id):
+    """Track mp3 streaming view with HTTP Range support"""
+    track = await aget_object_or_404(Track.published, pk=track_id)
+    if not track.mp3:
+        raise Http404("Track file not found")
+    try:
+        return await streaming.aranged_file_response(request, track.mp3,
+                                                     content_type='audio/mpeg')
+    except FileNotFoundError as exc:
+        raise Http404("Track file not found") from exc
+
+@require_safe
+@login_required
+def track_waveform(request, track_id):
+    """Waveform peaks and loudness of track, JSON or raw uint8 with ?format=bin"""
+    analysis = get_object_or_404(
+        TrackAnalysis.objects.filter(track__is_published=Track.Status.PUBLISHED),
+        track_id=track_id,
+    )
+    etag = quote_etag(f'{analysis.pk}-{analysis.time_updated.timestamp():.0f}')
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        if request.GET.get('format') == 'bin':
+            response = HttpResponse(bytes(analysis.peaks), content_type='application/octet-stream')
+            for header, value in (('X-Loudness', analysis.loudness),
+                                  ('X-Replay-Gain', analysis.replay_gain)):
+                if value is not None:
+                    response[header] = value
+        else:
+            response = JsonResponse({
+                'peaks': list(bytes(analysis.peaks)),
+                'loudness': analysis.loudness,
+                'replay_gain': analysis.replay_gain,
+                'method': analysis.method,
+            })
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, max_age=settings.TRACK_WAVEFORM_MAX_AGE)
+    return response
+
+@require_safe
+def thumbnail(request, size, name): # pylint: disable=W0613
+    """Redirect to derivative of uploaded image, generated on first request"""
+    if size not in settings.THUMBNAIL_SIZES:
+        raise Http404("Unknown thumbnail size")
+    try:
+        if not default_storage.exists(name):
+            raise Http404("Image not found")
+    except SuspiciousFileOperation as exc:
+        raise Http404("Image not found") from exc
+    return HttpResponseRedirect(thumbnails.resolve(name, size))
+
+@require_POST
+@login_required
+def register_play(request, track_id): # pylint: disable=W0613
+    """Play event view, counts are buffered and written to db in batches"""
+    play_buffer.add(track_id)
+    return JsonResponse({'status': 'queued'}, status=202)
+
+@require_safe
+@login_required
+async def get_play_queue(request, context):
+    """Play queue view, JSON pages of tracks of the player context"""
+    try:
+        limit = int(request.GET.get('limit', settings.PLAY_QUEUE_PAGE_SIZE))
+        start = int(request.GET['start']) if request.GET.get('start') else None
+        if not 0 < limit <= settings.PLAY_QUEUE_MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be in 1..{settings.PLAY_QUEUE_MAX_PAGE_SIZE}")
+        page = await play_queue.aget_queue_page(
+            context, request.GET, request.GET.get('cursor'), start, limit
+        )
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    return JsonResponse(page)
+
+@require_safe
+@login_required
+def similar_tracks(request, track_id):
+    """Similar tracks view, JSON list of tracks most similar to the track"""
+    track = get_object_or_404(Track.published, pk=track_id)
+    try:
+        limit = int(request.GET.get('limit', settings.SIMILARITY_PAGE_SIZE))
+        if not 0 < limit <= settings.SIMILARITY_MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be in 1..{settings.SIMILARITY_MAX_PAGE_SIZE}")
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+
+    scores = dict(similarity.similar_track_ids(track.pk, limit))
+    found = Track.objects.select_related('main_author').in_bulk(scores)
+    return JsonResponse({'tracks': [
+        dict(play_queue.track_payload(found[pk]), score=round(score, 4))
+        for pk, score in scores.items() if pk in found
+    ]})
+
+def autocomplete_limit(request):
+    """Page size of an autocomplete request, raises ValueError"""
+    limit = int(request.GET.get('limit', settings.AUTOCOMPLETE_PAGE_SIZE))
+    if not 0 < limit <= settings.AUTOCOMPLETE_MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be in 1..{settings.AUTOCOMPLETE_MAX_PAGE_SIZE}")
+    return limit
+
+@require_safe
+@login_required
+def autocomplete_tracks(request):
+    """Track picker view, JSON pages of tracks matching ?q="""
+    try:
+        page = autocomplete.track_results(
+            request.GET.get('q', '').strip(), request.GET.get('cursor'), autocomplete_limit(request)
+        )
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    return JsonResponse(page)
+
+@require_safe
+@login_required
+def autocomplete_users(request):
+    """User picker view, JSON pages of other users whose username starts with ?q="""
+    try:
+        page = autocomplete.user_results(
+            request.user, request.GET.get('q', '').strip(), request.GET.get('cursor'),
+            autocomplete_limit(request)
+        )
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    return JsonResponse(page)
+
+def playlist_edit_payload(request):
+    """(track ids, before track id or None) of a JSON playlist edit, raises ValueError"""
+    payload = json.loads(request.body or b'{}')
+    if not isinstance(payload, dict):
+        raise ValueError("body must be a JSON object")
+    ids, before = payload.get('track_ids'), payload.get('before')
+    if not isinstance(ids, list) or not ids or not all(isinstance(pk, int) for pk in ids):
+        raise ValueError("track_ids must be a non-empty list of track ids")
+    if len(ids) > settings.PLAYLIST_EDIT_MAX_TRACKS:
+        raise ValueError(f"at most {settings.PLAYLIST_EDIT_MAX_TRACKS} tracks per request")
+    if before is not None and not isinstance(before, int):
+        raise ValueError("before must be a track id")
+    return ids, before
+
+@require_POST
+@login_required
+def edit_playlist_tracks(request, slug, action):
+    """Playlist tracks view: append, insert, remove or move tracks of a JSON body"""
+    playlist = get_object_or_404(Playlist, slug=slug)
+    if playlist.owner_id != request.user.pk:
+        return HttpResponseForbidden("You cannot edit this playlist")
+    if action not in ('append', 'insert', 'remove', 'move'):
+        raise Http404(f"Unknown playlist action {action}")
+
+    try:
+        ids, before = playlist_edit_payload(request)
+        if action == 'append':
+            changed = playlist_tracks.append(playlist, ids)
+        elif action == 'insert':
+            if before is None:
+                raise ValueError("before is required")
+            changed = playlist_tracks.insert(playlist, ids, before)
+        elif action == 'remove':
+            changed = playlist_tracks.remove(playlist, ids)
+        else:
+            changed = playlist_tracks.move(playlist, ids, before)
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    return JsonResponse({'action': action, 'track_ids': changed})
@@ -0,0 +1,49 @@
+"""Module with form widgets of player"""
+from django import forms
+from django.core.exceptions import ValidationError
+from django.urls import reverse
+
+
+class AutocompleteSelectMultiple(forms.SelectMultiple):
+    """Multiple select which renders only the chosen options
+
+    Other options are looked up by the client through the JSON endpoint
+    named `url_name`, so the page size does not depend on the number of
+    choices. Labels of chosen options are loaded with one `pk__in` query.
+    """
+    template_name = 'player/widgets/autocomplete.html'
+
+    def __init__(self, url_name, attrs=None, placeholder=''):
+        super().__init__(attrs)
+        self.url_name = url_name
+        self.placeholder = placeholder
+
+    def chosen_objects(self, value):
+        """Model instances of chosen values, in the order they were chosen"""
+        field = getattr(self.choices, 'field', None)
+        values = [str(item) for item in value if item not in (None, '')]
+        if field is None or not values:
+            return []
+        key = field.to_field_name or 'pk'
+        try:
+            objects = {str(getattr(obj, key)): obj
+                       for obj in field.queryset.filter(**{f'{key}__in': values})}
+        except (ValueError, TypeError, ValidationError):
+            # malformed ids of an invalid submission are reported by the field
+            return []
+        return [objects[item] for item in dict.fromkeys(values) if item in objects]
+
+    def optgroups(self, name, value, attrs=None):
+        field = self.choices.field
+        options = [
+            self.create_option(name, field.prepare_value(obj), field.label_from_instance(obj),
+                               True, index, attrs=attrs)
+            for index, obj in enumerate(self.chosen_objects(value))
+        ]
+        return [(None, options, 0)] if options else []
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['url'] = reverse(self.url_name)
+        context['widget']['placeholder'] = self.placeholder
+        return context
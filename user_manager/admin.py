@@ -1,6 +1,15 @@
 """Module with settings of admin-panel"""
 
 from django.contrib import admin
-from .models import PasswordReset
+from .models import OutboxEmail, PasswordReset
+
+class OutboxEmailAdmin(admin.ModelAdmin):
+    """class for changing viewing of queued emails in admin panel"""
+    list_display = ('id', 'subject', 'status', 'attempts', 'next_attempt', 'sent_when')
+    list_display_links = ('id', 'subject')
+    list_filter = ('status',)
+    list_per_page = 20
+    readonly_fields = ['created_when', 'sent_when', 'last_error']
 
 admin.site.register(PasswordReset)
+admin.site.register(OutboxEmail, OutboxEmailAdmin)
@@ -0,0 +1,29 @@
+"""
+Django management command sending queued emails.
+"""
+
+from django.core.management.base import BaseCommand
+from user_manager import outbox
+
+
+class Command(BaseCommand):
+    """Command to send due OutboxEmail rows and report the outbox state."""
+
+    help = "Отправка писем из очереди и статистика очереди"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=None,
+                            help="Максимальное количество писем")
+        parser.add_argument("--stats", action="store_true",
+                            help="Только показать состояние очереди")
+
+    def handle(self, *args, **kwargs):
+        if not kwargs["stats"]:
+            stats = outbox.send_pending(kwargs["limit"])
+            self.stdout.write(self.style.SUCCESS(  # pylint: disable=E1101
+                f"Отправлено: {stats['sent']}, повторная попытка: {stats['retried']}, "
+                f"ошибок: {stats['failed']}, соединений: {stats['connections']}, "
+                f"время: {stats['seconds']} с"
+            ))
+        for name, value in outbox.queue_stats().items():
+            self.stdout.write(f"{name}: {value}")  # pylint: disable=no-member
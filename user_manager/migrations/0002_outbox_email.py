@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:36
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_manager', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEmail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=255)),
+                ('body', models.TextField()),
+                ('from_email', models.CharField(blank=True, max_length=255)),
+                ('recipients', models.JSONField(default=list)),
+                ('status', models.PositiveSmallIntegerField(choices=[(0, 'Ожидает'), (1, 'Отправлено'), (2, 'Ошибка')], default=0)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_until', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_when', models.DateTimeField(auto_now_add=True)),
+                ('sent_when', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['next_attempt', 'id'],
+                'indexes': [models.Index(fields=['status', 'next_attempt'], name='user_manage_status_0fe061_idx')],
+            },
+        ),
+    ]
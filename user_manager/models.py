@@ -2,6 +2,7 @@
 import uuid
 
 from django.db import models
+from django.utils import timezone
 from player.models import PlayerUser as User
 from ml_music import settings
 
@@ -15,3 +16,37 @@ class PasswordReset(models.Model):
 
     def __str__(self):
         return f"Password reset for {self.user.username} at {self.created_when}"
+
+class OutboxEmail(models.Model):
+    """Email waiting to be sent by the outbox sender, see user_manager/outbox.py"""
+    class Status(models.IntegerChoices): # pylint: disable=R0901
+        """Choices for email status"""
+        PENDING = 0, 'Ожидает'
+        SENT = 1, 'Отправлено'
+        FAILED = 2, 'Ошибка'
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255, blank=True)
+    recipients = models.JSONField(default=list)
+    status = models.PositiveSmallIntegerField(choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True) # claimed by a sender
+    last_error = models.TextField(blank=True)
+
+    created_when = models.DateTimeField(auto_now_add=True)
+    sent_when = models.DateTimeField(null=True, blank=True)
+
+    # Models Managers
+    objects = models.Manager()
+
+    def __str__(self):
+        return f"{self.subject} to {', '.join(self.recipients)} ({self.get_status_display()})"
+
+    class Meta: # pylint: disable=R0903
+        """Ordering params"""
+        ordering = ['next_attempt', 'id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt']),  # claiming due emails
+        ]
@@ -0,0 +1,175 @@
+"""Module with outbox of emails
+
+Views never talk to the mail server: `queue` inserts an `OutboxEmail` row
+and makes sure a `flush_outbox` background task is scheduled a couple of
+seconds later, so emails queued meanwhile are sent together. The sender
+claims due emails in batches and sends a whole batch over one connection
+of the email backend (one SMTP login instead of one per message). Failed
+emails are retried with exponential backoff and kept as FAILED after
+OUTBOX_MAX_ATTEMPTS, with the last error, for the admin to inspect.
+
+Counters of sent, retried and failed emails are accumulated per process in
+`metrics`; `queue_stats` reports the state of the table itself.
+"""
+import logging
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+
+from player.models import BackgroundTask
+from player.tasks import enqueue, task
+from .models import OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+metrics = Counter()
+
+
+def queue(subject, body, recipients, from_email=None):
+    """Store email to be sent by a worker, returns OutboxEmail"""
+    email = OutboxEmail.objects.create(
+        subject=subject, body=body, recipients=list(recipients),
+        from_email=settings.EMAIL_HOST_USER if from_email is None else from_email,
+    )
+    schedule_flush(settings.OUTBOX_FLUSH_DELAY)
+    return email
+
+
+def schedule_flush(delay):
+    """Enqueue flush_outbox in delay seconds unless one runs by then anyway"""
+    run_after = timezone.now() + timedelta(seconds=delay)
+    if not BackgroundTask.objects.filter(
+        name=flush_outbox.task_name, status=BackgroundTask.Status.PENDING,
+        run_after__lte=run_after,
+    ).exists():
+        enqueue(flush_outbox, delay=delay)
+
+
+def due_emails(now):
+    """Condition of emails ready to be claimed"""
+    return (Q(status=OutboxEmail.Status.PENDING, next_attempt__lte=now)
+            & (Q(locked_until__isnull=True) | Q(locked_until__lt=now)))
+
+
+def claim(limit):
+    """Lock up to limit due emails for this sender, returns them"""
+    now = timezone.now()
+    ids = list(OutboxEmail.objects.filter(due_emails(now))
+               .values_list('id', flat=True)[:limit])
+    if not ids:
+        return []
+    # the lock time doubles as the claim token, the UPDATE re-checks the condition
+    locked_until = now + timedelta(seconds=settings.OUTBOX_LOCK_TIMEOUT)
+    OutboxEmail.objects.filter(due_emails(now), id__in=ids).update(locked_until=locked_until)
+    return list(OutboxEmail.objects.filter(id__in=ids, locked_until=locked_until))
+
+
+def retry_delay(attempts):
+    """Seconds before next attempt after attempts failed ones"""
+    return settings.OUTBOX_RETRY_DELAY * 2 ** (attempts - 1)
+
+
+def record_failure(email, error, stats):
+    """Schedule retry of email or mark it failed"""
+    attempts = email.attempts + 1
+    fields = {'attempts': attempts, 'locked_until': None, 'last_error': repr(error)}
+    if attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+        fields['status'] = OutboxEmail.Status.FAILED
+        stats['failed'] += 1
+        logger.error("Email %s failed after %s attempts: %r", email.pk, attempts, error)
+    else:
+        fields['next_attempt'] = timezone.now() + timedelta(seconds=retry_delay(attempts))
+        stats['retried'] += 1
+        logger.warning("Email %s failed, attempt %s: %r", email.pk, attempts, error)
+    OutboxEmail.objects.filter(pk=email.pk).update(**fields)
+
+
+def send_batch(emails, stats):
+    """Send emails over one backend connection"""
+    sent_ids = []
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as exc:  # pylint: disable=broad-except
+        # server unreachable: every email of the batch waits for the next attempt
+        for email in emails:
+            record_failure(email, exc, stats)
+        return
+    stats['connections'] += 1
+    try:
+        for email in emails:
+            message = EmailMessage(email.subject, email.body, email.from_email,
+                                   email.recipients, connection=connection)
+            try:
+                message.send()
+            except Exception as exc:  # pylint: disable=broad-except
+                record_failure(email, exc, stats)
+            else:
+                sent_ids.append(email.pk)
+    finally:
+        connection.close()
+
+    OutboxEmail.objects.filter(pk__in=sent_ids).update(
+        status=OutboxEmail.Status.SENT, sent_when=timezone.now(), locked_until=None,
+        attempts=F('attempts') + 1, last_error='',
+    )
+    stats['sent'] += len(sent_ids)
+
+
+def send_pending(limit=None):
+    """Send due emails in batches until none is left, returns counters of this run"""
+    stats = Counter()
+    started = time.monotonic()
+    while limit is None or stats['claimed'] < limit:
+        size = settings.OUTBOX_BATCH_SIZE
+        if limit is not None:
+            size = min(size, limit - stats['claimed'])
+        emails = claim(size)
+        if not emails:
+            break
+        stats['claimed'] += len(emails)
+        stats['batches'] += 1
+        send_batch(emails, stats)
+    stats['seconds'] = round(time.monotonic() - started, 3)
+
+    metrics.update(stats)
+    if stats['claimed']:
+        logger.info("Outbox: %s", dict(stats))
+    return stats
+
+
+def queue_stats():
+    """Emails by status, number of due ones and age in seconds of the oldest pending one"""
+    now = timezone.now()
+    counts = dict(OutboxEmail.objects.values_list('status').annotate(count=Count('id'))
+                  .order_by())
+    oldest = OutboxEmail.objects.filter(status=OutboxEmail.Status.PENDING).aggregate(
+        oldest=Min('created_when'))['oldest']
+    return {
+        'pending': counts.get(OutboxEmail.Status.PENDING, 0),
+        'sent': counts.get(OutboxEmail.Status.SENT, 0),
+        'failed': counts.get(OutboxEmail.Status.FAILED, 0),
+        'due': OutboxEmail.objects.filter(due_emails(now)).count(),
+        'oldest_pending_age': (now - oldest).total_seconds() if oldest else 0,
+    }
+
+
+def next_attempt():
+    """Time of the earliest pending retry, None when nothing waits"""
+    return OutboxEmail.objects.filter(status=OutboxEmail.Status.PENDING).aggregate(
+        next_attempt=Min('next_attempt'))['next_attempt']
+
+
+@task
+def flush_outbox():
+    """Send queued emails, then schedule the next pending retry"""
+    send_pending()
+    retry_time = next_attempt()
+    if retry_time is not None:
+        delay = (retry_time - timezone.now()).total_seconds()
+        schedule_flush(max(delay, settings.OUTBOX_FLUSH_DELAY))
@@ -1,4 +1,73 @@
 """Tests for Service"""
-#from django.test import TestCase
+import smtplib
+from datetime import timedelta
+from unittest.mock import patch
 
-# Create your tests here.
+from django.core import mail
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from player import tasks
+from player.models import BackgroundTask, PlayerUser as User
+from .models import OutboxEmail
+from . import outbox
+
+
+class OutboxTests(TestCase):
+    """Tests for email outbox"""
+    def test_forgot_password_queues_email(self):
+        """Tests reset email is sent by a worker, not by the request"""
+        User.objects.create_user(username='testuser', password='testpass123',
+                                 email='user@example.com')
+        self.client.post(reverse('forgot-password'), {'email': 'user@example.com'})
+        self.client.post(reverse('forgot-password'), {'email': 'user@example.com'})
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutboxEmail.objects.count(), 2)
+        self.assertEqual(BackgroundTask.objects.count(), 1)  # one flush for both
+
+        BackgroundTask.objects.update(run_after=timezone.now())
+        tasks.run_pending()
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(mail.outbox[0].to, ['user@example.com'])
+        self.assertEqual(OutboxEmail.objects.filter(status=OutboxEmail.Status.SENT).count(), 2)
+        self.assertFalse(BackgroundTask.objects.exists())
+
+    @override_settings(OUTBOX_BATCH_SIZE=2)
+    def test_batches_share_connection(self):
+        """Tests one backend connection is opened per batch"""
+        for index in range(5):
+            outbox.queue(f'Subject {index}', 'Body', [f'user{index}@example.com'])
+        stats = outbox.send_pending()
+        self.assertEqual((stats['sent'], stats['batches'], stats['connections']), (5, 3, 3))
+        self.assertEqual([message.subject for message in mail.outbox],
+                         [f'Subject {index}' for index in range(5)])
+        self.assertEqual(outbox.queue_stats()['sent'], 5)
+
+    @override_settings(OUTBOX_MAX_ATTEMPTS=2)
+    def test_retry_then_failed(self):
+        """Tests failed email is retried with backoff and kept after max attempts"""
+        email = outbox.queue('Subject', 'Body', ['user@example.com'])
+        error = smtplib.SMTPRecipientsRefused({'user@example.com': (550, b'No such user')})
+        with patch('user_manager.outbox.EmailMessage.send', side_effect=error):
+            self.assertEqual(outbox.send_pending()['retried'], 1)
+            email.refresh_from_db()
+            self.assertEqual(email.status, OutboxEmail.Status.PENDING)
+            self.assertGreater(email.next_attempt, timezone.now())
+            self.assertEqual(outbox.send_pending()['claimed'], 0)  # not due yet
+
+            OutboxEmail.objects.update(next_attempt=timezone.now() - timedelta(seconds=1))
+            self.assertEqual(outbox.send_pending()['failed'], 1)
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboxEmail.Status.FAILED)
+        self.assertIn('SMTPRecipientsRefused', email.last_error)
+
+    def test_unreachable_server_retries_batch(self):
+        """Tests a failed connection postpones every email of the batch"""
+        outbox.queue('First', 'Body', ['a@example.com'])
+        outbox.queue('Second', 'Body', ['b@example.com'])
+        with patch('django.core.mail.backends.locmem.EmailBackend.open',
+                   side_effect=ConnectionRefusedError, create=True):
+            stats = outbox.send_pending()
+        self.assertEqual((stats['retried'], stats['connections']), (2, 0))
+        self.assertEqual(outbox.queue_stats()['due'], 0)
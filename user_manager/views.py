@@ -3,12 +3,11 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
-from django.conf import settings
-from django.core.mail import EmailMessage
 from django.utils import timezone
 from django.urls import reverse
 
 from player.models import PlayerUser as User
+from user_manager import outbox
 from user_manager.models import PasswordReset
 
 
@@ -94,7 +93,7 @@ def forgot_password_view(request):
         email = request.POST.get('email')
 
         try:
-            user = PlayerUser.objects.get(email=email)
+            user = User.objects.get(email=email)
 
             new_password_reset = PasswordReset(user=user)
             new_password_reset.save()
@@ -106,15 +105,8 @@ def forgot_password_view(request):
 
             email_body = f'Reset your password using the link below:\n\n\n{full_password_reset_url}'
 
-            email_message = EmailMessage(
-                'Reset your password',  # email subject
-                email_body,
-                settings.EMAIL_HOST_USER,  # email sender
-                [email]  # email  receiver
-            )
-
-            email_message.fail_silently = True
-            email_message.send()
+            # sent by a background worker, SMTP latency stays out of the request
+            outbox.queue('Reset your password', email_body, [email])
 
             return redirect('password-reset-sent', reset_id=new_password_reset.reset_id)
 